@@ -0,0 +1,238 @@
+# bandit/arm_store.py
+import sys
+from collections.abc import Mapping
+import numpy as np
+
+_EMPTY = 0  # slot marker; real hashes of 0 are remapped to 1
+
+
+def _hash_id(item_id):
+    """hash(item_id) folded to a non-zero signed 32-bit value"""
+    h = hash(item_id)
+    h = (h ^ (h >> 32)) & 0xFFFFFFFF
+    h = h - (1 << 32) if h >= (1 << 31) else h
+    return h if h != _EMPTY else 1
+
+
+class _HashIndex:
+    """
+    Open-addressing (linear probing) table from hash(item_id) to row, held in two
+    NumPy arrays. A Python dict would cost a dict slot plus a boxed int per arm;
+    this costs 8 bytes per slot at a load factor of at most one half.
+    Lookups are verified against the stored id, so hash collisions are harmless.
+    """
+
+    def __init__(self, capacity=32):
+        self.keys = np.zeros(capacity, dtype=np.int32)
+        self.rows = np.full(capacity, -1, dtype=np.int32)
+        self.size = 0
+
+    def find(self, h, item_id, ids):
+        mask = len(self.keys) - 1
+        slot = h & mask
+        while True:
+            key = self.keys[slot]
+            if key == _EMPTY:
+                return -1
+            if key == h:
+                row = int(self.rows[slot])
+                if ids[row] == item_id:
+                    return row
+            slot = (slot + 1) & mask
+
+    def insert(self, h, row):
+        if 2 * (self.size + 1) > len(self.keys):
+            self._rehash(2 * len(self.keys))
+        mask = len(self.keys) - 1
+        slot = h & mask
+        while self.keys[slot] != _EMPTY:
+            slot = (slot + 1) & mask
+        self.keys[slot] = h
+        self.rows[slot] = row
+        self.size += 1
+
+    def _rehash(self, capacity):
+        occupied = self.keys != _EMPTY
+        old_keys, old_rows = self.keys[occupied], self.rows[occupied]
+        self.keys = np.zeros(capacity, dtype=np.int32)
+        self.rows = np.full(capacity, -1, dtype=np.int32)
+        mask = capacity - 1
+        # Place all entries in vectorized rounds: the first claimant of a free slot wins,
+        # everyone else moves one slot further and tries again.
+        slots = old_keys & mask
+        pending = np.arange(len(old_keys))
+        while len(pending):
+            free = self.keys[slots] == _EMPTY
+            candidates = pending[free]
+            _, first = np.unique(slots[free], return_index=True)
+            winners = candidates[first]
+            self.keys[slots[free][first]] = old_keys[winners]
+            self.rows[slots[free][first]] = old_rows[winners]
+            placed = np.zeros(len(pending), dtype=bool)
+            placed[np.flatnonzero(free)[first]] = True
+            pending, slots = pending[~placed], (slots[~placed] + 1) & mask
+
+    def find_many(self, hashes):
+        """Candidate rows for many hashes at once (-1 where absent); callers verify ids"""
+        mask = len(self.keys) - 1
+        result = np.full(len(hashes), -1, dtype=np.int64)
+        active = np.arange(len(hashes))
+        slots = hashes & mask
+        while len(active):
+            keys = self.keys[slots]
+            hit = keys == hashes[active]
+            result[active[hit]] = self.rows[slots[hit]]
+            keep = ~hit & (keys != _EMPTY)
+            active, slots = active[keep], (slots[keep] + 1) & mask
+        return result
+
+    def nbytes(self):
+        return self.keys.nbytes + self.rows.nbytes
+
+
+class ArmStore:
+    """
+    Compact per-user arm statistics: an item_id → row interning table plus
+    contiguous float32 reward sums and int32 pull counts. Arrays grow by
+    doubling, so adding an arm is amortized O(1). Item id strings are
+    interned process-wide, so users who rated the same tracks share them.
+    """
+
+    def __init__(self, capacity=16):
+        self._index = _HashIndex(2 * capacity)
+        self.ids = []     # row -> item_id
+        self._sums = np.zeros(capacity, dtype=np.float32)
+        self._counts = np.zeros(capacity, dtype=np.int32)
+        self._best_row = -1  # arm with the highest mean reward, kept up to date by add()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, item_id):
+        return self.row(item_id) >= 0
+
+    @property
+    def sums(self):
+        return self._sums[:len(self.ids)]
+
+    @property
+    def counts(self):
+        return self._counts[:len(self.ids)]
+
+    def _grow(self):
+        capacity = max(16, 2 * len(self._sums))
+        self._sums = np.resize(self._sums, capacity)
+        self._counts = np.resize(self._counts, capacity)
+        self._sums[len(self.ids):] = 0.0
+        self._counts[len(self.ids):] = 0
+
+    def row(self, item_id):
+        """Row of an existing arm, or -1"""
+        return self._index.find(_hash_id(item_id), item_id, self.ids)
+
+    def intern(self, item_id):
+        """Return the row for item_id, allocating one if the arm is new"""
+        h = _hash_id(item_id)
+        row = self._index.find(h, item_id, self.ids)
+        if row < 0:
+            row = len(self.ids)
+            if row == len(self._sums):
+                self._grow()
+            # The same popular "Track - Artist" ids show up for many users; share one string object
+            self.ids.append(sys.intern(item_id))
+            self._index.insert(h, row)
+        return row
+
+    def add(self, item_id, reward, count=1):
+        row = self.intern(item_id)
+        previous_mean = self._mean(row)
+        self._sums[row] += reward
+        self._counts[row] += count
+        self._update_best(row, previous_mean)
+        return row
+
+    def _mean(self, row):
+        count = self._counts[row]
+        return float(self._sums[row]) / count if count > 0 else 0.0
+
+    def _update_best(self, row, previous_mean):
+        best = self._best_row
+        if best < 0:
+            self._best_row = row
+        elif row == best:
+            # The leader's mean went down, so another arm may have overtaken it
+            if self._mean(row) < previous_mean:
+                self._best_row = self._argmax_mean()
+        elif self._mean(row) > self._mean(best):
+            self._best_row = row
+
+    def _argmax_mean(self):
+        if not self.ids:
+            return -1
+        counts = self.counts
+        means = np.divide(self.sums, counts, out=np.zeros(len(counts), dtype=np.float32), where=counts > 0)
+        return int(np.argmax(means))
+
+    def best_id(self):
+        """Id of the arm with the highest mean reward, or None when there are no arms"""
+        return self.ids[self._best_row] if self._best_row >= 0 else None
+
+    def get(self, item_id, default=(0.0, 0)):
+        row = self.row(item_id)
+        if row < 0:
+            return default
+        return float(self._sums[row]), int(self._counts[row])
+
+    def rows(self, item_ids):
+        """Rows for many ids at once; unknown ids map to -1"""
+        hashes = np.fromiter((_hash_id(item_id) for item_id in item_ids), dtype=np.int32, count=len(item_ids))
+        rows = self._index.find_many(hashes)
+        # Drop the (astronomically rare) hash matches that belong to a different id
+        ids = self.ids
+        for i in np.flatnonzero(rows >= 0):
+            if ids[rows[i]] != item_ids[i]:
+                rows[i] = self.row(item_ids[i])
+        return rows
+
+    def gather(self, item_ids, default_sum=0.0, default_count=0):
+        """(sums, counts) float64 arrays aligned with item_ids, with defaults for unknown arms"""
+        item_ids = list(item_ids)
+        rows = self.rows(item_ids)
+        known = rows >= 0
+        safe_rows = np.where(known, rows, 0)
+        if len(self.ids) == 0:
+            sums = np.full(len(rows), default_sum, dtype=np.float64)
+            counts = np.full(len(rows), default_count, dtype=np.float64)
+        else:
+            sums = np.where(known, self._sums[safe_rows], default_sum).astype(np.float64)
+            counts = np.where(known, self._counts[safe_rows], default_count).astype(np.float64)
+        return sums, counts
+
+    def items(self):
+        for row, item_id in enumerate(self.ids):
+            yield item_id, (float(self._sums[row]), int(self._counts[row]))
+
+    def nbytes(self):
+        return self._sums.nbytes + self._counts.nbytes + self._index.nbytes() + sys.getsizeof(self.ids)
+
+
+class ArmStatsView(Mapping):
+    """Read-only {item_id: (reward_sum, count)} view, for code written against the old dicts"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, item_id):
+        row = self._store.row(item_id)
+        if row < 0:
+            raise KeyError(item_id)
+        return self._store.get(item_id)
+
+    def __iter__(self):
+        return iter(list(self._store.ids))
+
+    def __len__(self):
+        return len(self._store)
+
+    def items(self):
+        return list(self._store.items())
@@ -1,6 +1,33 @@
+import logging
+import random
 from abc import ABC, abstractmethod
+from config import BANDIT_SCORE_LOG_SAMPLE_RATE
+
+
+def should_log_score(logger):
+    """Per-arm score logs are DEBUG-only and sampled: logging every scored candidate is slow"""
+    return logger.isEnabledFor(logging.DEBUG) and random.random() < BANDIT_SCORE_LOG_SAMPLE_RATE
+
 
 class Bandit(ABC):
+    # Contextual bandits featurize tracks by their artist's Last.fm tags (see bandit/linear.py)
+    uses_artist_tags = False
+
     @abstractmethod
     def update(self, item_id: str, reward: float):
         pass
+
+    def register_candidates(self, candidates):
+        """
+        Called with the candidate track dicts (each with an "id") before they are scored.
+        Contextual bandits read item features here; per-arm bandits ignore it.
+        """
+        pass
+
+    def score_many(self, item_ids):
+        """Score a whole candidate set at once. Subclasses override this with a vectorized draw."""
+        return [self.get_score(item_id) for item_id in item_ids]
+
+    def restore_arms(self, rows):
+        """Load [(item_id, reward_sum, count), ...]: the per-arm totals kept in storage (see WriteBehindQueue.put_arm)"""
+        pass
@@ -1,25 +1,52 @@
-from bandit.base import Bandit
+from bandit.base import Bandit, should_log_score
+from bandit.arm_store import ArmStatsView, ArmStore
+import numpy as np
+import logging
 import random
 
+logger = logging.getLogger(__name__)
+
 class EpsilonGreedy(Bandit):
-    def __init__(self):
-        self.values = {}
+    def __init__(self, rng=None):
+        self.arms = ArmStore()
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    @property
+    def values(self):
+        """Read-only {item_id: (total, count)} view over the arm store"""
+        return ArmStatsView(self.arms)
+
+    def best_arm(self):
+        """Arm with the highest mean reward so far (O(1), maintained on update)"""
+        return self.arms.best_id()
+
+    def restore_arms(self, rows):
+        for item_id, reward_sum, count in rows:
+            self.arms.add(item_id, reward_sum, count)
 
     def update(self, item_id, reward):
-        total, count = self.values.get(item_id, (0.0, 0))
-        self.values[item_id] = (total + reward, count + 1)
+        self.arms.add(item_id, reward)
 
     def get_value(self, item_id):
-        total, count = self.values.get(item_id, (0.0, 0))
+        total, count = self.arms.get(item_id, (0.0, 0))
         return total / count if count > 0 else 0.0
 
     def get_score(self, item_id, epsilon=0.2):
         if random.random() < epsilon:
             score = random.uniform(0, 1)
-            print(f"🎲 탐험 {item_id} | score={score:.2f}")
+            if should_log_score(logger):
+                logger.debug("🎲 탐험 %s | score=%.2f", item_id, score)
             return score
         else:
-            total, count = self.values.get(item_id, (0.0, 0))
+            total, count = self.arms.get(item_id, (0.0, 0))
             score = total / count if count > 0 else 0.0
-            print(f"👉 이용 {item_id} | score={score:.2f} (total={total}, count={count})")
+            if should_log_score(logger):
+                logger.debug("👉 이용 %s | score=%.2f (total=%s, count=%s)", item_id, score, total, count)
             return score
+
+    def score_many(self, item_ids, epsilon=0.2):
+        """Vectorized get_score: each item explores with probability epsilon"""
+        totals, counts = self.arms.gather(item_ids)
+        means = np.divide(totals, counts, out=np.zeros(len(counts)), where=counts > 0)
+        explore = self.rng.random(len(counts)) < epsilon
+        return np.where(explore, self.rng.random(len(counts)), means)
@@ -0,0 +1,159 @@
+# bandit/linear.py
+from bandit.base import Bandit, should_log_score
+from bandit.thompson_sampling import artist_of
+from cache import MISSING, TTLCache
+from config import (
+    LINEAR_BANDIT_ALPHA, LINEAR_BANDIT_ARTIST_TAG_CACHE_SIZE, LINEAR_BANDIT_ARTIST_TAG_TTL,
+    LINEAR_BANDIT_DIM, LINEAR_BANDIT_REGULARIZATION,
+)
+import numpy as np
+import logging
+import math
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Top Last.fm tags of each artist, shared by every user's bandit (see remember_artist_tags).
+# Features depend on nothing but the artist and its tags, so a track has the same vector for
+# every user and seed, when scored and when rated, and the stored (reward_sum, count) rows
+# rebuild A and b exactly once the tags of the rated artists are loaded back.
+artist_tags = TTLCache(max_size=LINEAR_BANDIT_ARTIST_TAG_CACHE_SIZE, default_ttl=LINEAR_BANDIT_ARTIST_TAG_TTL)
+
+_RESTORE_CHUNK = 65536  # rows featurized at a time in restore_arms
+
+
+def _bucket(kind, value, dim):
+    # crc32 rather than hash(): buckets must agree across workers and restarts
+    return 1 + zlib.crc32(f"{kind}:{value.casefold()}".encode()) % (dim - 1)
+
+
+def _artist_features(artist, tags, dim):
+    x = np.zeros(dim, dtype=np.float64)
+    x[0] = 1.0
+    if artist:
+        x[_bucket("artist", artist, dim)] += 1.0
+    for tag in tags:
+        x[_bucket("tag", tag, dim)] += 1.0 / len(tags)
+    return x
+
+
+def remember_artist_tags(tags_by_artist):
+    """Record {artist: [tag, ...]} (an empty list for an artist without tags)"""
+    for artist, tags in tags_by_artist.items():
+        tags = list(tags)
+        artist_tags.set(artist.casefold(), (tags, _artist_features(artist, tags, LINEAR_BANDIT_DIM)))
+
+
+def missing_artist_tags(artists):
+    """The artists, out of these, whose tags are not known"""
+    return [artist for artist in artists if artist_tags.get(artist.casefold()) is MISSING]
+
+
+def track_features(item_id, dim=LINEAR_BANDIT_DIM):
+    """
+    Hashed feature vector of a "Track - Artist" arm:
+    [bias, artist bucket, artist tag buckets (weights summing to 1)].
+    """
+    artist = artist_of(item_id)
+    cached = artist_tags.get(artist.casefold())
+    if cached is MISSING:
+        return _artist_features(artist, [], dim)
+    tags, x = cached
+    return x if len(x) == dim else _artist_features(artist, tags, dim)
+
+
+class LinearBandit(Bandit):
+    """
+    Ridge regression of reward on track features, shared by all of a user's arms:
+    feedback on one track moves the score of every track with the same artist or tags,
+    and the state is a dim x dim matrix however many tracks the user has rated.
+    Artist tags come from remember_artist_tags(), filled by whoever gathers candidates.
+    A^-1 is kept directly and updated with Sherman–Morrison, so update() is O(dim^2)
+    and scoring a batch is one (n x dim) matrix product.
+    """
+
+    uses_artist_tags = True
+
+    def __init__(self, dim=LINEAR_BANDIT_DIM, regularization=LINEAR_BANDIT_REGULARIZATION, rng=None):
+        self.dim = dim
+        self.regularization = regularization
+        self.A_inv = np.eye(dim) / regularization
+        self.b = np.zeros(dim)
+        self.theta = np.zeros(dim)
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def nbytes(self):
+        return self.A_inv.nbytes + self.b.nbytes + self.theta.nbytes
+
+    def _add(self, x, reward_sum, count=1):
+        # count identical observations of x: A += count * x x^T, one rank-1 Sherman–Morrison step
+        u = math.sqrt(count) * x
+        A_inv_u = self.A_inv @ u
+        self.A_inv -= np.outer(A_inv_u, A_inv_u) / (1.0 + u @ A_inv_u)
+        self.b += reward_sum * x
+        self.theta = self.A_inv @ self.b
+
+    def update(self, item_id, reward):
+        self._add(track_features(item_id, self.dim), reward)  # reward ∈ [0.0, 1.0]
+
+    def restore_arms(self, rows):
+        """
+        Storage keeps per-arm (reward_sum, count) rows, which are sufficient statistics here:
+        A = λI + Σ count·x xᵀ and b = Σ reward_sum·x. Rebuilt in bulk with one inversion.
+        """
+        A = np.linalg.inv(self.A_inv)
+        rows = list(rows)
+        for start in range(0, len(rows), _RESTORE_CHUNK):
+            chunk = rows[start:start + _RESTORE_CHUNK]
+            X = np.array([track_features(item_id, self.dim) for item_id, _, _ in chunk])
+            sums = np.array([reward_sum for _, reward_sum, _ in chunk], dtype=np.float64)
+            counts = np.array([count for _, _, count in chunk], dtype=np.float64)
+            A += X.T @ (counts[:, None] * X)
+            self.b += X.T @ sums
+        if rows:
+            self.A_inv = np.linalg.inv(A)
+            self.theta = self.A_inv @ self.b
+
+    def _matrix(self, item_ids):
+        return np.array([track_features(item_id, self.dim) for item_id in item_ids]).reshape(len(item_ids), self.dim)
+
+    def get_value(self, item_id):
+        return float(track_features(item_id, self.dim) @ self.theta)
+
+    def get_score(self, item_id):
+        return float(self.score_many([item_id])[0])
+
+
+class LinUCB(LinearBandit):
+    """Upper confidence bound: x·θ + α·sqrt(xᵀ A^-1 x)"""
+
+    def __init__(self, alpha=LINEAR_BANDIT_ALPHA, **kwargs):
+        super().__init__(**kwargs)
+        self.alpha = alpha
+
+    def score_many(self, item_ids):
+        X = self._matrix(item_ids)
+        means = X @ self.theta
+        widths = np.sqrt(np.einsum("ij,ij->i", X @ self.A_inv, X))
+        scores = means + self.alpha * widths
+        if len(item_ids) and should_log_score(logger):
+            logger.debug("🎯 LinUCB %s | mean=%.2f width=%.2f → score=%.2f", item_ids[0], means[0], widths[0], scores[0])
+        return scores
+
+
+class LinearThompsonSampling(LinearBandit):
+    """One draw θ ~ N(θ̂, scale²·A^-1) per batch, then x·θ for every candidate"""
+
+    def __init__(self, scale=LINEAR_BANDIT_ALPHA, **kwargs):
+        super().__init__(**kwargs)
+        self.scale = scale
+
+    def score_many(self, item_ids):
+        X = self._matrix(item_ids)
+        # A^-1 is symmetric positive definite; symmetrize against rounding drift before factoring
+        L = np.linalg.cholesky((self.A_inv + self.A_inv.T) / 2)
+        theta = self.theta + self.scale * (L @ self.rng.standard_normal(self.dim))
+        scores = X @ theta
+        if len(item_ids) and should_log_score(logger):
+            logger.debug("🎯 linear Thompson %s → score=%.2f", item_ids[0], scores[0])
+        return scores
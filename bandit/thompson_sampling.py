@@ -1,25 +1,110 @@
 # bandit/thompson_sampling.py
-from bandit.base import Bandit
+from bandit.base import Bandit, should_log_score
+from bandit.arm_store import ArmStatsView, ArmStore
+from config import THOMPSON_ARTIST_PRIOR_STRENGTH
+import numpy as np
+import logging
 import random
 
+logger = logging.getLogger(__name__)
+
 class ThompsonSampling(Bandit):
-    def __init__(self):
-        self.rewards = {}
+    def __init__(self, rng=None):
+        self.arms = ArmStore()
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    @property
+    def rewards(self):
+        """Read-only {item_id: (total_reward, total_count)} view over the arm store"""
+        return ArmStatsView(self.arms)
+
+    def best_arm(self):
+        """Arm with the highest mean reward so far (O(1), maintained on update)"""
+        return self.arms.best_id()
+
+    def restore_arms(self, rows):
+        for item_id, reward_sum, count in rows:
+            self.arms.add(item_id, reward_sum, count)
 
     def update(self, item_id, reward):
-        total_reward, total_count = self.rewards.get(item_id, (0.0, 0))
-        total_reward += reward  # reward ∈ [0.0, 1.0]
-        total_count += 1
-        self.rewards[item_id] = (total_reward, total_count)
+        self.arms.add(item_id, reward)  # reward ∈ [0.0, 1.0]
 
     def get_value(self, item_id):
-        total_reward, total_count = self.rewards.get(item_id, (0.0, 1))
+        total_reward, total_count = self.arms.get(item_id, (0.0, 1))
         return total_reward / total_count
 
     def get_score(self, item_id):
-        total_reward, total_count = self.rewards.get(item_id, (0.0, 1))
+        total_reward, total_count = self.arms.get(item_id, (0.0, 1))
         alpha = 1.0 + total_reward
         beta = 1.0 + total_count - total_reward
         score = random.betavariate(alpha, beta)
-        print(f"🎯 탐험/이용 {item_id} | Beta({alpha:.1f},{beta:.1f}) → score={score:.2f}")
-        return score
\ No newline at end of file
+        if should_log_score(logger):
+            logger.debug("🎯 탐험/이용 %s | Beta(%.1f,%.1f) → score=%.2f", item_id, alpha, beta, score)
+        return score
+
+    def score_many(self, item_ids):
+        """
+        One Beta draw per item, done as a single NumPy call.
+        Unseen items use the same default as get_score: (reward=0, count=1).
+        """
+        sums, counts = self.arms.gather(item_ids, default_sum=0.0, default_count=1)
+        return self.rng.beta(1.0 + sums, 1.0 + counts - sums)
+
+
+def artist_of(item_id):
+    """Artist part of a "Track - Artist" id"""
+    return item_id.rsplit(" - ", 1)[-1]
+
+
+class HierarchicalThompsonSampling(ThompsonSampling):
+    """
+    Thompson sampling whose Beta prior comes from the user's ratings of the same artist.
+    A track's own stats are left out of its artist's aggregate, and the artist adds at most
+    prior_strength pseudo-observations, so a track's own ratings take over as they accumulate.
+    """
+
+    def __init__(self, prior_strength=THOMPSON_ARTIST_PRIOR_STRENGTH, rng=None):
+        super().__init__(rng=rng)
+        self.artists = ArmStore()  # {artist: (reward_sum, count)}, kept alongside the tracks
+        self.prior_strength = prior_strength
+
+    def restore_arms(self, rows):
+        for item_id, reward_sum, count in rows:
+            self.arms.add(item_id, reward_sum, count)
+            self.artists.add(artist_of(item_id), reward_sum, count)
+
+    def update(self, item_id, reward):
+        self.arms.add(item_id, reward)
+        self.artists.add(artist_of(item_id), reward)
+
+    def _beta_params(self, item_ids):
+        own_sums, own_counts = self.arms.gather(item_ids)
+        # One artist lookup per distinct artist in the batch, not per track
+        artist_rows = {}
+        codes = np.fromiter(
+            (artist_rows.setdefault(artist_of(item_id), len(artist_rows)) for item_id in item_ids),
+            dtype=np.intp, count=len(item_ids),
+        )
+        artist_sums, artist_counts = self.artists.gather(artist_rows)
+        # Leave-one-out: the track's own ratings are counted below, not in its prior
+        prior_sums = artist_sums[codes] - own_sums
+        prior_counts = artist_counts[codes] - own_counts
+        prior_mean = np.divide(prior_sums, prior_counts, out=np.zeros(len(codes)), where=prior_counts > 0)
+        weight = np.minimum(prior_counts, self.prior_strength)
+        # Unseen tracks keep ThompsonSampling's default of (reward=0, count=1) under the prior
+        counts = np.where(own_counts > 0, own_counts, 1.0)
+        alpha = 1.0 + own_sums + weight * prior_mean
+        beta = 1.0 + counts - own_sums + weight * (1.0 - prior_mean)
+        return alpha, beta
+
+    def get_score(self, item_id):
+        alpha, beta = self._beta_params([item_id])
+        score = random.betavariate(float(alpha[0]), float(beta[0]))
+        if should_log_score(logger):
+            logger.debug("🎯 탐험/이용 %s | Beta(%.1f,%.1f) → score=%.2f", item_id, alpha[0], beta[0], score)
+        return score
+
+    def score_many(self, item_ids):
+        item_ids = list(item_ids)
+        alpha, beta = self._beta_params(item_ids)
+        return self.rng.beta(alpha, beta)
@@ -0,0 +1,278 @@
+"""
+Offline benchmark and replay for the bandit layer: no Last.fm, Spotify or server needed.
+Run from the repository root:
+
+    python -m benchmarks.bandit_replay                               # 10^2 .. 10^6 arms, every bandit
+    python -m benchmarks.bandit_replay --arms 1000,100000 --bandits thompson
+    python -m benchmarks.bandit_replay --arms 10000 --bandits random --write-log feedback.jsonl
+    python -m benchmarks.bandit_replay --replay feedback.jsonl
+
+For every catalogue size and bandit it reports:
+  regret/rec   best achievable like-probability minus the chosen one, per recommended slot,
+               averaged over simulated users (late = last quarter of the rounds)
+  recs/s       recommendations per second through Recommender.recommend_bulk + give_feedback
+               for a user whose bandit already holds n arms
+  scores/s     candidates per second through bandit.score_many on that user
+  hydrate/s    arms per second through restore_arms (the cost of loading a user from storage)
+  bytes/user   ArmStore footprint of that user (item id strings are interned and shared),
+               plus per-artist aggregates, or the parameter matrices of a linear bandit
+
+--replay evaluates the bandits against a recorded feedback log with the replay method:
+only events whose logged track is among the bandit's own top-k count, and their rewards
+are fed back. This is unbiased when the log was written by --bandits random.
+"""
+import argparse
+import json
+import random
+import time
+import numpy as np
+from bandit.base import Bandit
+from bandit.epsilon_greedy import EpsilonGreedy
+from bandit.linear import LinearThompsonSampling, LinUCB, remember_artist_tags
+from bandit.thompson_sampling import HierarchicalThompsonSampling, ThompsonSampling
+from benchmarks.synthetic import SimulatedUser, SyntheticCatalogue, SyntheticLastFM
+from candidate_sources import build_sources
+from recommender import Recommender
+
+
+class RandomBandit(Bandit):
+    """Uniform scores: the baseline, and the logging policy for replay"""
+
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def update(self, item_id, reward):
+        pass
+
+    def get_score(self, item_id):
+        return self.rng.random()
+
+    def score_many(self, item_ids):
+        return self.rng.random(len(item_ids))
+
+
+BANDITS = {
+    "thompson": ThompsonSampling,
+    "hierarchical_thompson": HierarchicalThompsonSampling,
+    "epsilon": EpsilonGreedy,
+    "linucb": LinUCB,
+    "linear_thompson": LinearThompsonSampling,
+    "random": RandomBandit,
+}
+
+# Track seeds only: tag seeds would need a tag per simulated session
+SOURCES = ["similar_tracks", "artist_top_tracks"]
+
+
+def make_recommender(lastfm, bandit_name, seed):
+    if BANDITS[bandit_name].uses_artist_tags:
+        # What the server fetches with artist.getTopTags while gathering candidates
+        remember_artist_tags(lastfm.catalogue.artist_tags())
+    return Recommender(lastfm, BANDITS[bandit_name](rng=np.random.default_rng(seed)), sources=build_sources(SOURCES))
+
+
+def seed_request(catalogue, track_index):
+    return catalogue.track_name(track_index), catalogue.artist_name_of(track_index)
+
+
+def simulate(catalogue, bandit_name, users, rounds, k, seed, log=None):
+    """Simulated users rate every recommended track; regret is measured against their true like-probabilities"""
+    lastfm = SyntheticLastFM(catalogue)
+    regret = np.zeros(rounds)
+    slots = np.zeros(rounds)
+    reward_total = 0.0
+    recommend_seconds = 0.0
+
+    for u in range(users):
+        user = SimulatedUser(catalogue, f"user{u}", seed=seed + u)
+        recommender = make_recommender(lastfm, bandit_name, seed + u)
+        seeds = [user.pick_seed() for _ in range(3)]
+        for r in range(rounds):
+            track_name, artist_name = seed_request(catalogue, seeds[r % len(seeds)])
+            candidates = [catalogue.index_of(t["id"]) for t in recommender.gather_candidates(track_name, artist_name)]
+            if not candidates:
+                continue
+
+            started = time.perf_counter()
+            chosen = recommender.recommend_bulk("track", track_name, artist_name, limit=k)
+            recommend_seconds += time.perf_counter() - started
+
+            chosen_indices = [catalogue.index_of(t["id"]) for t in chosen]
+            best = np.sort(user.like_probability(candidates))[::-1][:len(chosen)].sum()
+            regret[r] += best - user.like_probability(chosen_indices).sum()
+            slots[r] += len(chosen)
+
+            for track, track_index in zip(chosen, chosen_indices):
+                rating = user.rate(track_index)
+                reward = rating / 5.0
+                recommender.give_feedback(track["id"], reward)
+                reward_total += reward
+                if log is not None:
+                    log.write(json.dumps({
+                        "type": "feedback", "user_id": user.user_id, "seed_track": track_name,
+                        "seed_artist": artist_name, "track_id": track["id"], "rating": rating,
+                    }) + "\n")
+
+    late = slice(rounds - max(1, rounds // 4), rounds)
+    total_slots = slots.sum()
+    return {
+        "regret_per_rec": regret.sum() / total_slots if total_slots else 0.0,
+        "late_regret_per_rec": regret[late].sum() / slots[late].sum() if slots[late].sum() else 0.0,
+        "reward_per_rec": reward_total / total_slots if total_slots else 0.0,
+        "sim_recommend_calls_per_sec": users * rounds / recommend_seconds if recommend_seconds else 0.0,
+    }
+
+
+def _timed_loop(fn, min_seconds):
+    """Call fn() until min_seconds have passed; returns (calls, seconds)"""
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return calls, elapsed
+
+
+def bandit_nbytes(bandit):
+    if hasattr(bandit, "nbytes"):
+        return bandit.nbytes()
+    stores = [getattr(bandit, name) for name in ("arms", "artists") if hasattr(bandit, name)]
+    return sum(store.nbytes() for store in stores)
+
+
+def measure_scale(catalogue, bandit_name, n_arms, k, seed, min_seconds=0.5):
+    """Hydration, memory, scoring and recommendation throughput for one user holding n_arms arms"""
+    rng = np.random.default_rng(seed)
+    lastfm = SyntheticLastFM(catalogue)
+    recommender = make_recommender(lastfm, bandit_name, seed)
+    bandit = recommender.bandit
+
+    history = rng.choice(catalogue.n_tracks, size=min(n_arms, catalogue.n_tracks), replace=False)
+    rows = [(catalogue.track_id(int(i)), float(rng.integers(0, 2)), 1) for i in history]
+    started = time.perf_counter()
+    bandit.restore_arms(rows)
+    hydrate_seconds = time.perf_counter() - started
+    arms = getattr(bandit, "arms", None)
+
+    batch = [catalogue.track_id(int(i)) for i in rng.choice(catalogue.n_tracks, size=min(1000, catalogue.n_tracks))]
+    calls, seconds = _timed_loop(lambda: bandit.score_many(batch), min_seconds)
+    scores_per_sec = calls * len(batch) / seconds
+
+    seeds = [seed_request(catalogue, int(i)) for i in rng.choice(catalogue.n_tracks, size=64)]
+    recommended = [0]
+
+    def recommend_and_rate():
+        track_name, artist_name = seeds[recommended[0] % len(seeds)]
+        chosen = recommender.recommend_bulk("track", track_name, artist_name, limit=k)
+        for track in chosen:
+            recommender.give_feedback(track["id"], float(rng.integers(0, 2)))
+        recommended[0] += 1
+        return chosen
+
+    calls, seconds = _timed_loop(recommend_and_rate, min_seconds)
+    return {
+        "recs_per_sec": calls * k / seconds,
+        "scores_per_sec": scores_per_sec,
+        "hydrate_arms_per_sec": len(rows) / hydrate_seconds if rows and hydrate_seconds else 0.0,
+        "bytes_per_user": bandit_nbytes(bandit),
+        "stored_arms": len(arms) if arms is not None else 0,
+    }
+
+
+def replay(log_path, bandit_names, k, seed):
+    with open(log_path) as f:
+        header = json.loads(f.readline())
+        events = [json.loads(line) for line in f if line.strip()]
+    catalogue = SyntheticCatalogue(header["tracks"], seed=header["seed"])
+    lastfm = SyntheticLastFM(catalogue)
+
+    results = {}
+    for bandit_name in bandit_names:
+        recommenders = {}
+        matched = 0
+        reward_total = 0.0
+        started = time.perf_counter()
+        for event in events:
+            recommender = recommenders.get(event["user_id"])
+            if recommender is None:
+                recommender = recommenders[event["user_id"]] = make_recommender(lastfm, bandit_name, seed)
+            chosen = recommender.recommend_bulk("track", event["seed_track"], event["seed_artist"], limit=k)
+            if any(track["id"] == event["track_id"] for track in chosen):
+                reward = event["rating"] / 5.0
+                recommender.give_feedback(event["track_id"], reward)
+                matched += 1
+                reward_total += reward
+        elapsed = time.perf_counter() - started
+        results[bandit_name] = {
+            "events": len(events),
+            "matched": matched,
+            "replay_reward": reward_total / matched if matched else 0.0,
+            "events_per_sec": len(events) / elapsed if elapsed else 0.0,
+        }
+    return results
+
+
+def print_table(rows, columns):
+    widths = [max(len(name), *(len(f"{row[key]:.4g}" if isinstance(row[key], float) else str(row[key])) for row in rows))
+              for name, key in columns]
+    print("  ".join(name.rjust(width) for (name, _), width in zip(columns, widths)))
+    for row in rows:
+        cells = [f"{row[key]:.4g}" if isinstance(row[key], float) else str(row[key]) for _, key in columns]
+        print("  ".join(cell.rjust(width) for cell, width in zip(cells, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline bandit benchmark and replay")
+    parser.add_argument("--arms", default="100,1000,10000,100000,1000000", help="comma-separated catalogue sizes")
+    parser.add_argument("--bandits", default=",".join(BANDITS), help=f"comma-separated, from {', '.join(BANDITS)}")
+    parser.add_argument("--users", type=int, default=10, help="simulated users per run")
+    parser.add_argument("--rounds", type=int, default=30, help="recommendation rounds per user")
+    parser.add_argument("--k", type=int, default=10, help="recommendations per round")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--write-log", help="write the simulated feedback as a replay log (one catalogue size only)")
+    parser.add_argument("--replay", help="replay a feedback log instead of simulating")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # Recommender.rank_candidates draws from the global generators
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    bandit_names = [name.strip() for name in args.bandits.split(",") if name.strip()]
+
+    if args.replay:
+        results = replay(args.replay, bandit_names, args.k, args.seed)
+        rows = [{"bandit": name, **result} for name, result in results.items()]
+        print_table(rows, [("bandit", "bandit"), ("events", "events"), ("matched", "matched"),
+                           ("reward/match", "replay_reward"), ("events/s", "events_per_sec")])
+    else:
+        sizes = [int(float(size)) for size in args.arms.split(",")]
+        if args.write_log and (len(sizes) != 1 or len(bandit_names) != 1):
+            parser.error("--write-log needs exactly one --arms size and one bandit")
+        log = open(args.write_log, "w") if args.write_log else None
+        rows = []
+        for n_tracks in sizes:
+            catalogue = SyntheticCatalogue(n_tracks, seed=args.seed)
+            if log is not None:
+                log.write(json.dumps({"type": "catalogue", "tracks": n_tracks, "seed": args.seed}) + "\n")
+            for bandit_name in bandit_names:
+                row = {"arms": n_tracks, "bandit": bandit_name}
+                row.update(simulate(catalogue, bandit_name, args.users, args.rounds, args.k, args.seed, log))
+                row.update(measure_scale(catalogue, bandit_name, n_tracks, args.k, args.seed))
+                rows.append(row)
+                print(f"[Benchmark] {bandit_name} with {n_tracks} arms done", flush=True)
+        if log is not None:
+            log.close()
+        print_table(rows, [("arms", "arms"), ("bandit", "bandit"), ("regret/rec", "regret_per_rec"),
+                           ("late", "late_regret_per_rec"), ("reward/rec", "reward_per_rec"),
+                           ("recs/s", "recs_per_sec"), ("scores/s", "scores_per_sec"),
+                           ("hydrate/s", "hydrate_arms_per_sec"), ("bytes/user", "bytes_per_user")])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
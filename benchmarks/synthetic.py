@@ -0,0 +1,156 @@
+"""
+Synthetic stand-ins for Last.fm and for listeners, so the bandit layer can be
+exercised offline.
+
+SyntheticCatalogue  n tracks spread over artists and genres, each with a latent
+                    taste vector. Track i is "Track i" by "Artist a".
+SyntheticLastFM     answers the LastFMClient methods the candidate sources call
+                    (similar tracks, artist/tag top tracks, similar artists) and
+                    artist top tags from the catalogue, in Last.fm's response shape.
+SimulatedUser       a listener with a latent preference vector; like_probability()
+                    is the ground truth that regret is measured against.
+"""
+import numpy as np
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class SyntheticCatalogue:
+    def __init__(self, n_tracks, n_genres=None, tracks_per_artist=20, dim=8, seed=0):
+        rng = np.random.default_rng(seed)
+        self.n_tracks = n_tracks
+        self.n_genres = n_genres or max(2, min(50, n_tracks // 200))
+        self.n_artists = max(1, n_tracks // tracks_per_artist)
+        self.dim = dim
+
+        self.genre_vectors = rng.normal(size=(self.n_genres, dim)).astype(np.float32)
+        self.artist_genre = rng.integers(0, self.n_genres, size=self.n_artists)
+        self.track_artist = rng.integers(0, self.n_artists, size=n_tracks)
+        self.track_genre = self.artist_genre[self.track_artist]
+        self.vectors = (self.genre_vectors[self.track_genre]
+                        + 0.5 * rng.normal(size=(n_tracks, dim)).astype(np.float32))
+        self.popularity = rng.pareto(1.5, size=n_tracks).astype(np.float32)
+
+        # Tracks of each artist / genre, most popular first (what "top tracks" returns)
+        by_popularity = np.argsort(-self.popularity, kind="stable")
+        self.artist_tracks = self._group(by_popularity, self.track_artist, self.n_artists)
+        self.genre_tracks = self._group(by_popularity, self.track_genre, self.n_genres)
+
+    @staticmethod
+    def _group(order, labels, n_groups):
+        # Stable sort by group keeps the popularity order inside each group
+        grouped = order[np.argsort(labels[order], kind="stable")]
+        bounds = np.searchsorted(labels[grouped], np.arange(n_groups + 1))
+        return [grouped[bounds[g]:bounds[g + 1]] for g in range(n_groups)]
+
+    def track_name(self, i):
+        return f"Track {i}"
+
+    def artist_name_of(self, i):
+        return f"Artist {self.track_artist[i]}"
+
+    def track_id(self, i):
+        """The "Track - Artist" id the recommender and the bandits use"""
+        return f"{self.track_name(i)} - {self.artist_name_of(i)}"
+
+    def index_of(self, track_id):
+        return int(track_id.split(" - ", 1)[0][len("Track "):])
+
+    def artist_tags(self):
+        """{artist: [tag]}: each artist is tagged with its genre, as "genre<g>" (what tag seeds use)"""
+        return {f"Artist {a}": [f"genre{g}"] for a, g in enumerate(self.artist_genre)}
+
+    def as_lastfm_track(self, i, match=None):
+        track = {"name": self.track_name(i), "artist": {"name": self.artist_name_of(i)}}
+        if match is not None:
+            track["match"] = f"{match:.4f}"
+        return track
+
+
+class SyntheticLastFM:
+    """Duck-typed LastFMClient over a SyntheticCatalogue; every answer is deterministic per query"""
+
+    def __init__(self, catalogue, similar_pool=200):
+        self.catalogue = catalogue
+        self.similar_pool = similar_pool  # how many same-genre tracks "similar" is picked from
+
+    def _artist_index(self, artist_name):
+        return int(artist_name[len("Artist "):])
+
+    def get_similar_tracks(self, track_name, artist_name, limit=10):
+        catalogue = self.catalogue
+        seed = int(track_name[len("Track "):])
+        genre_tracks = catalogue.genre_tracks[catalogue.track_genre[seed]][:self.similar_pool]
+        rng = np.random.default_rng(seed)
+        picked = rng.choice(genre_tracks, size=min(limit, len(genre_tracks)), replace=False)
+        seed_vector = catalogue.vectors[seed]
+        matches = sigmoid(catalogue.vectors[picked] @ seed_vector / catalogue.dim)
+        return [catalogue.as_lastfm_track(int(i), match) for i, match in zip(picked, matches) if i != seed]
+
+    def get_top_tracks_by_artist(self, artist_name, limit=10):
+        tracks = self.catalogue.artist_tracks[self._artist_index(artist_name)][:limit]
+        return [self.catalogue.as_lastfm_track(int(i)) for i in tracks]
+
+    def get_similar_artists(self, artist_name, limit=10):
+        catalogue = self.catalogue
+        artist = self._artist_index(artist_name)
+        same_genre = np.flatnonzero(catalogue.artist_genre == catalogue.artist_genre[artist])
+        return [{"name": f"Artist {a}", "match": "0.5"} for a in same_genre[:limit + 1] if a != artist][:limit]
+
+    def get_top_tracks_by_tag(self, tag, limit=10):
+        genre = int(tag[len("genre"):]) % self.catalogue.n_genres
+        return [self.catalogue.as_lastfm_track(int(i)) for i in self.catalogue.genre_tracks[genre][:limit]]
+
+    def get_artist_top_tags(self, artist_name):
+        genre = self.catalogue.artist_genre[self._artist_index(artist_name)]
+        return [{"name": f"genre{genre}", "count": 100}]
+
+    async def get_similar_tracks_async(self, track_name, artist_name, limit=10):
+        return self.get_similar_tracks(track_name, artist_name, limit)
+
+    async def get_top_tracks_by_artist_async(self, artist_name, limit=10):
+        return self.get_top_tracks_by_artist(artist_name, limit)
+
+    async def get_similar_artists_async(self, artist_name, limit=10):
+        return self.get_similar_artists(artist_name, limit)
+
+    async def get_top_tracks_by_tag_async(self, tag, limit=10):
+        return self.get_top_tracks_by_tag(tag, limit)
+
+    async def get_artist_top_tags_async(self, artist_name):
+        return self.get_artist_top_tags(artist_name)
+
+
+class SimulatedUser:
+    """
+    Likes track i with probability sigmoid(sharpness * <preference, vector_i> / dim + bias).
+    The preference leans towards a few favourite genres, which is where seeds come from.
+    """
+
+    def __init__(self, catalogue, user_id, n_favourite_genres=2, sharpness=3.0, bias=-1.0, seed=0):
+        self.catalogue = catalogue
+        self.user_id = user_id
+        self.rng = np.random.default_rng(seed)
+        favourites = self.rng.choice(catalogue.n_genres, size=min(n_favourite_genres, catalogue.n_genres), replace=False)
+        self.preference = (catalogue.genre_vectors[favourites].mean(axis=0)
+                           + 0.3 * self.rng.normal(size=catalogue.dim)).astype(np.float32)
+        self.favourites = favourites
+        self.sharpness = sharpness
+        self.bias = bias
+
+    def like_probability(self, track_indices):
+        scores = self.catalogue.vectors[track_indices] @ self.preference / self.catalogue.dim
+        return sigmoid(self.sharpness * scores + self.bias)
+
+    def pick_seed(self):
+        """A popular track from one of the favourite genres"""
+        genre = self.rng.choice(self.favourites)
+        tracks = self.catalogue.genre_tracks[genre][:20]
+        return int(self.rng.choice(tracks))
+
+    def rate(self, track_index):
+        """Star rating 0-5 drawn from the like probability"""
+        liked = self.rng.random() < self.like_probability([track_index])[0]
+        return 5 if liked else 0
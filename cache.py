@@ -0,0 +1,195 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Returned by get() when a key is absent or expired, so that None can be cached as a value
+MISSING = object()
+
+
+class TTLCache:
+    """In-process LRU cache with a per-entry time-to-live"""
+
+    def __init__(self, max_size=1024, default_ttl=3600):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # {key: (value, expires_at)}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_with_expiry(self, key):
+        """Like get(), but returns (value, expires_at) so callers can copy the remaining TTL"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                return MISSING, 0
+            return entry
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def purge_expired(self):
+        """Drop every expired entry and return how many were removed"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+    def items(self):
+        """Snapshot of the live (key, value) pairs, least recently used first"""
+        now = time.time()
+        with self._lock:
+            return [(key, value) for key, (value, expires_at) in self._entries.items() if expires_at > now]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+class SQLiteCache:
+    """On-disk cache tier for JSON-serializable values, bounded by row count"""
+
+    def __init__(self, path, max_rows=50000):
+        self.path = path
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " stored_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_stored_at ON cache (stored_at)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_with_expiry(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= time.time():
+                self.misses += 1
+                return MISSING, 0
+            self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def get(self, key):
+        return self.get_with_expiry(key)[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, stored_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now),
+            )
+            self._writes_since_trim += 1
+            # Trimming needs a COUNT(*), so only do it every few hundred writes
+            if self._writes_since_trim >= 256:
+                self._trim(now)
+            self._conn.commit()
+
+    def _trim(self, now):
+        self._writes_since_trim = 0
+        removed = self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,)).rowcount
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self.max_rows:
+            removed += self._conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY stored_at LIMIT ?)",
+                (count - self.max_rows,),
+            ).rowcount
+        self.evictions += removed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "path": self.path,
+            "max_rows": self.max_rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+class TieredCache:
+    """Memory LRU in front of an optional SQLite tier. Disk hits are promoted back into memory."""
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not MISSING or self.disk is None:
+            return value
+        value, expires_at = self.disk.get_with_expiry(key)
+        if value is not MISSING:
+            self.memory.set(key, value, ttl=expires_at - time.time())
+        return value
+
+    def set(self, key, value, ttl):
+        self.memory.set(key, value, ttl=ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl)
+
+    def stats(self):
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
@@ -0,0 +1,116 @@
+import asyncio
+import time
+from cache import MISSING, TTLCache
+from singleflight import SingleFlight
+from spotify_player import normalize_search_key
+from config import CANDIDATE_POOL_FRESH_TTL, CANDIDATE_POOL_MAX_STALE, CANDIDATE_POOL_SIZE
+
+
+def seed_key(mode, track_name="", artist_name="", tag=""):
+    return f"{mode}:{normalize_search_key(track_name or '', artist_name or '')}:{(tag or '').casefold()}"
+
+
+class CandidatePool:
+    """Spotify-enriched candidates for one seed: [{"id": "Track - Artist", "card": {...}}, ...]"""
+
+    def __init__(self, seed, candidates, fresh_ttl):
+        self.seed = seed  # (mode, track_name, artist_name, tag)
+        self.candidates = candidates
+        self.built_at = time.time()
+        self.fresh_until = self.built_at + fresh_ttl
+        self.hits = 0  # requests served since the last build
+
+    def is_fresh(self):
+        return time.time() < self.fresh_until
+
+
+class CandidatePoolStore:
+    """
+    Candidate pools keyed by seed (mode + track/artist/tag), so a request for a warm
+    seed only has to score and filter a ready list.
+
+    A pool is served fresh for fresh_ttl seconds. After that it is still served for up
+    to max_stale seconds while a background rebuild replaces it (stale-while-revalidate);
+    refresh_expiring() rebuilds busy pools before they even go stale. Cold seeds are
+    built on the request path, once per seed no matter how many requests are waiting.
+
+    builder is a coroutine function (mode, track_name, artist_name, tag, access_token)
+    returning the candidate list; access_token is None for background rebuilds.
+    """
+
+    def __init__(self, builder, max_pools=CANDIDATE_POOL_SIZE, fresh_ttl=CANDIDATE_POOL_FRESH_TTL,
+                 max_stale=CANDIDATE_POOL_MAX_STALE):
+        self.builder = builder
+        self.fresh_ttl = fresh_ttl
+        self.max_stale = max_stale
+        self.pools = TTLCache(max_size=max_pools, default_ttl=fresh_ttl + max_stale)
+        self._flight = SingleFlight("candidate_pool")
+        self._refreshing = {}  # {key: task}
+        self.refreshes = 0
+
+    async def _build(self, key, seed, access_token):
+        candidates = await self.builder(*seed, access_token)
+        previous = self.pools.get(key)
+        if not candidates and previous is not MISSING and previous.candidates:
+            # Upstream hiccup: keep serving the old pool rather than an empty one
+            print(f"[Recommender] Empty rebuild for {key}, keeping the previous pool")
+            return previous
+        # An empty pool (unknown seed, or no Spotify token) is only trusted briefly
+        pool = CandidatePool(seed, candidates, self.fresh_ttl if candidates else min(self.fresh_ttl, 60))
+        self.pools.set(key, pool)
+        return pool
+
+    def _schedule_refresh(self, key, seed):
+        if key in self._refreshing:
+            return
+        task = asyncio.ensure_future(self._flight.do_async(key, lambda: self._build(key, seed, None)))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda t: self._finish_refresh(key, t))
+        self.refreshes += 1
+
+    def _finish_refresh(self, key, task):
+        self._refreshing.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[Recommender] Background refresh of candidate pool {key} failed: {task.exception()}")
+
+    def peek(self, mode, track_name="", artist_name="", tag=""):
+        """The pool for a seed if one is ready (stale ones start a refresh), else None; never builds"""
+        seed = (mode, track_name, artist_name, tag)
+        key = seed_key(*seed)
+        pool = self.pools.get(key)
+        if pool is MISSING:
+            return None
+        if not pool.is_fresh():
+            self._schedule_refresh(key, seed)
+        pool.hits += 1
+        return pool
+
+    async def get(self, mode, track_name="", artist_name="", tag="", access_token=None):
+        """The pool for a seed, building it now if there is none"""
+        pool = self.peek(mode, track_name, artist_name, tag)
+        if pool is None:
+            seed = (mode, track_name, artist_name, tag)
+            key = seed_key(*seed)
+            pool = await self._flight.do_async(key, lambda: self._build(key, seed, access_token))
+            pool.hits += 1
+        return pool
+
+    def refresh_expiring(self, margin):
+        """Start background rebuilds for pools that were used and go stale within margin seconds"""
+        deadline = time.time() + margin
+        started = 0
+        for key, pool in self.pools.items():
+            if pool.hits and pool.fresh_until <= deadline:
+                pool.hits = 0
+                self._schedule_refresh(key, pool.seed)
+                started += 1
+        return started
+
+    async def aclose(self):
+        for task in list(self._refreshing.values()):
+            task.cancel()
+
+    def stats(self):
+        return {"pools": len(self.pools), "refreshing": len(self._refreshing), "refreshes": self.refreshes,
+                **{f"cache_{name}": value for name, value in self.pools.stats().items()},
+                **{f"flight_{name}": value for name, value in self._flight.stats().items()}}
@@ -0,0 +1,186 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from config import CANDIDATE_SOURCE_TIMEOUT, CANDIDATE_SOURCES
+from metrics import candidate_source_seconds
+
+# Used by the sync gather path only; the async path runs on the event loop
+_source_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="candidate-source")
+
+
+class CandidateSource(ABC):
+    """
+    One independent Last.fm query that contributes candidates for a seed.
+    Subclasses implement fetch() and fetch_async(); a source that is not
+    relevant for a seed returns False from applies().
+    """
+
+    name = "base"
+
+    def __init__(self, limit=20, timeout=CANDIDATE_SOURCE_TIMEOUT):
+        self.limit = limit
+        self.timeout = timeout
+
+    def applies(self, track_name, artist_name, tag):
+        return True
+
+    @abstractmethod
+    def fetch(self, lastfm, track_name, artist_name, tag):
+        pass
+
+    @abstractmethod
+    async def fetch_async(self, lastfm, track_name, artist_name, tag):
+        pass
+
+
+class SimilarTracksSource(CandidateSource):
+    name = "similar_tracks"
+
+    def __init__(self, limit=30, timeout=CANDIDATE_SOURCE_TIMEOUT):
+        super().__init__(limit, timeout)
+
+    def applies(self, track_name, artist_name, tag):
+        return bool(track_name)
+
+    def fetch(self, lastfm, track_name, artist_name, tag):
+        return lastfm.get_similar_tracks(track_name, artist_name, limit=self.limit)
+
+    async def fetch_async(self, lastfm, track_name, artist_name, tag):
+        return await lastfm.get_similar_tracks_async(track_name, artist_name, limit=self.limit)
+
+
+class ArtistTopTracksSource(CandidateSource):
+    name = "artist_top_tracks"
+
+    def applies(self, track_name, artist_name, tag):
+        return bool(artist_name)
+
+    def fetch(self, lastfm, track_name, artist_name, tag):
+        return lastfm.get_top_tracks_by_artist(artist_name, limit=self.limit)
+
+    async def fetch_async(self, lastfm, track_name, artist_name, tag):
+        return await lastfm.get_top_tracks_by_artist_async(artist_name, limit=self.limit)
+
+
+class TagTopTracksSource(CandidateSource):
+    name = "tag_top_tracks"
+
+    def applies(self, track_name, artist_name, tag):
+        return bool(tag)
+
+    def fetch(self, lastfm, track_name, artist_name, tag):
+        return lastfm.get_top_tracks_by_tag(tag, limit=self.limit)
+
+    async def fetch_async(self, lastfm, track_name, artist_name, tag):
+        return await lastfm.get_top_tracks_by_tag_async(tag, limit=self.limit)
+
+
+class SimilarArtistsTopTracksSource(CandidateSource):
+    """artist.getSimilar, then the top tracks of each similar artist (fetched concurrently)"""
+
+    name = "similar_artists_top_tracks"
+
+    def __init__(self, limit=20, timeout=CANDIDATE_SOURCE_TIMEOUT, num_artists=5):
+        super().__init__(limit, timeout)
+        self.num_artists = num_artists
+
+    def applies(self, track_name, artist_name, tag):
+        return bool(artist_name)
+
+    def _per_artist_limit(self):
+        return max(1, self.limit // self.num_artists)
+
+    def fetch(self, lastfm, track_name, artist_name, tag):
+        artists = lastfm.get_similar_artists(artist_name, limit=self.num_artists)
+        tracks = []
+        for artist in artists:
+            tracks.extend(lastfm.get_top_tracks_by_artist(artist["name"], limit=self._per_artist_limit()))
+        return tracks
+
+    async def fetch_async(self, lastfm, track_name, artist_name, tag):
+        artists = await lastfm.get_similar_artists_async(artist_name, limit=self.num_artists)
+        results = await asyncio.gather(*(
+            lastfm.get_top_tracks_by_artist_async(artist["name"], limit=self._per_artist_limit())
+            for artist in artists
+        ))
+        return [track for tracks in results for track in tracks]
+
+
+SOURCE_TYPES = {
+    source_type.name: source_type
+    for source_type in (SimilarTracksSource, ArtistTopTracksSource, TagTopTracksSource, SimilarArtistsTopTracksSource)
+}
+
+
+def source_queue_depth():
+    """Sync-path source fetches waiting for a free thread"""
+    return _source_executor._work_queue.qsize()
+
+
+def build_sources(names=None):
+    """Instantiate sources by name, in order (defaults to config.CANDIDATE_SOURCES)"""
+    return [SOURCE_TYPES[name]() for name in (names or CANDIDATE_SOURCES)]
+
+
+def fetch_all(sources, lastfm, track_name, artist_name, tag):
+    """
+    Run every applicable source concurrently on the source pool.
+    Returns one track list per source, in source order; a source that fails
+    or misses its timeout contributes an empty list instead of blocking the rest.
+    """
+    sources = [s for s in sources if s.applies(track_name, artist_name, tag)]
+    started = time.monotonic()
+    futures = [_source_executor.submit(s.fetch, lastfm, track_name, artist_name, tag) for s in sources]
+
+    results = []
+    for source, future in zip(sources, futures):
+        remaining = max(0.0, source.timeout - (time.monotonic() - started))
+        try:
+            results.append(future.result(timeout=remaining))
+            outcome = "ok"
+        except FutureTimeoutError:
+            print(f"[Recommender] Candidate source {source.name} timed out after {source.timeout}s")
+            results.append([])
+            outcome = "timeout"
+        except Exception as e:
+            print(f"[Recommender] Candidate source {source.name} failed: {e}")
+            results.append([])
+            outcome = "error"
+        candidate_source_seconds.observe(time.monotonic() - started, source=source.name, outcome=outcome)
+    return results
+
+
+async def _timed_fetch(source, lastfm, track_name, artist_name, tag):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        result = await asyncio.wait_for(source.fetch_async(lastfm, track_name, artist_name, tag), source.timeout)
+        outcome = "ok"
+        return result
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise
+    finally:
+        candidate_source_seconds.observe(time.perf_counter() - started, source=source.name, outcome=outcome)
+
+
+async def fetch_all_async(sources, lastfm, track_name, artist_name, tag):
+    """Async counterpart of fetch_all()"""
+    sources = [s for s in sources if s.applies(track_name, artist_name, tag)]
+    results = await asyncio.gather(
+        *(_timed_fetch(s, lastfm, track_name, artist_name, tag) for s in sources),
+        return_exceptions=True,
+    )
+
+    tracks_per_source = []
+    for source, result in zip(sources, results):
+        if isinstance(result, asyncio.TimeoutError):
+            print(f"[Recommender] Candidate source {source.name} timed out after {source.timeout}s")
+            result = []
+        elif isinstance(result, Exception):
+            print(f"[Recommender] Candidate source {source.name} failed: {result}")
+            result = []
+        tracks_per_source.append(result)
+    return tracks_per_source
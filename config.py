@@ -16,3 +16,127 @@ else:
     SPOTIPY_REDIRECT_URI = os.getenv("SPOTIPY_REDIRECT_URI", "http://localhost:8000/callback")
 
 SPOTIPY_SCOPE = "user-read-playback-state user-modify-playback-state user-read-currently-playing app-remote-control streaming user-read-email user-read-private"
+
+# 외부 API 주소 (부하 테스트 때는 loadtest/mock_upstream.py 주소로 바꿔서 실제 API를 호출하지 않음)
+LASTFM_API_URL = os.getenv("LASTFM_API_URL", "http://ws.audioscrobbler.com/2.0/")
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1").rstrip("/")
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com").rstrip("/")
+SPOTIFY_TOKEN_URL = f"{SPOTIFY_ACCOUNTS_URL}/api/token"
+
+# Last.fm 응답 캐시 (메모리 LRU + 선택적 SQLite 디스크 캐시)
+LASTFM_CACHE_SIZE = int(os.getenv("LASTFM_CACHE_SIZE", "2048"))
+LASTFM_CACHE_DB = os.getenv("LASTFM_CACHE_DB")  # 비워두면 디스크 캐시 사용 안 함
+LASTFM_CACHE_DB_MAX_ROWS = int(os.getenv("LASTFM_CACHE_DB_MAX_ROWS", "50000"))
+LASTFM_CACHE_TTLS = {
+    "track.getSimilar": 24 * 60 * 60,
+    "artist.getTopTracks": 12 * 60 * 60,
+    "tag.getTopTracks": 6 * 60 * 60,
+    "artist.getSimilar": 24 * 60 * 60,
+    "artist.getTopTags": 7 * 24 * 60 * 60,
+}
+LASTFM_CACHE_DEFAULT_TTL = 60 * 60
+
+# Spotify 검색 결과 캐시 (사용자 공용, 검색 실패도 짧게 캐시)
+SPOTIFY_SEARCH_CACHE_SIZE = int(os.getenv("SPOTIFY_SEARCH_CACHE_SIZE", "10000"))
+SPOTIFY_SEARCH_CACHE_TTL = int(os.getenv("SPOTIFY_SEARCH_CACHE_TTL", str(24 * 60 * 60)))
+SPOTIFY_SEARCH_NEGATIVE_TTL = int(os.getenv("SPOTIFY_SEARCH_NEGATIVE_TTL", str(60 * 60)))
+# Spotify track id는 거의 바뀌지 않으므로 (track, artist) → id 매핑은 더 오래 보관
+SPOTIFY_ID_INDEX_SIZE = int(os.getenv("SPOTIFY_ID_INDEX_SIZE", "50000"))
+SPOTIFY_ID_INDEX_TTL = int(os.getenv("SPOTIFY_ID_INDEX_TTL", str(30 * 24 * 60 * 60)))
+
+# 외부 API용 공용 HTTP 커넥션 풀 (호스트별 keep-alive)
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+# 추천 후보 수집 소스 (동시에 조회, 소스별 타임아웃)
+CANDIDATE_SOURCES = [
+    name.strip()
+    for name in os.getenv("CANDIDATE_SOURCES", "similar_tracks,artist_top_tracks,tag_top_tracks").split(",")
+    if name.strip()
+]
+CANDIDATE_SOURCE_TIMEOUT = float(os.getenv("CANDIDATE_SOURCE_TIMEOUT", "2.0"))
+
+# 추천 후보 보강 조회 (Spotify 곡 검색, Last.fm 아티스트 태그) 동시 요청 수와 요청당 전체 시간 예산(초)
+ENRICHMENT_MAX_CONCURRENCY = int(os.getenv("ENRICHMENT_MAX_CONCURRENCY", "8"))
+ENRICHMENT_BUDGET_SECONDS = float(os.getenv("ENRICHMENT_BUDGET_SECONDS", "3.0"))
+
+# 사용자 상태 영구 저장 (밴딧 arm, 평점 플레이리스트, 세션). "none"이면 메모리에만 보관
+# 주의: sqlite 백엔드는 세션의 Spotify refresh token을 STORAGE_PATH에 평문으로 저장함 (파일 권한 관리 필요)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+STORAGE_PATH = os.getenv("STORAGE_PATH", "webplayer.db")
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "1.0"))
+
+# 워커/노드 간 공유 상태 (세션, rate limit, 앱 토큰, 사용자 버전)
+# memory:// (단일 워커), sqlite:///shared_state.db (한 서버의 여러 워커), redis://host:6379/0 (여러 노드)
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "memory://")
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(24 * 60 * 60)))
+# 사용자 버전 키 수명 (생성 시점 기준). 만료되면 해당 사용자를 한 번 더 불러올 뿐이지만 USER_IDLE_TIMEOUT보다 길어야 함
+USER_VERSION_TTL = int(os.getenv("USER_VERSION_TTL", str(7 * 24 * 60 * 60)))
+# 백그라운드 정리 작업: 만료 세션/토큰 정리, 유휴 사용자 내보내기, 메모리 상한 (LRU)
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", "60"))
+USER_IDLE_TIMEOUT = float(os.getenv("USER_IDLE_TIMEOUT", str(24 * 60 * 60)))
+MAX_RESIDENT_USERS = int(os.getenv("MAX_RESIDENT_USERS", "10000"))
+
+# 경로별 요청 제한 (sliding window): "경로=최대요청수/초" 목록, default는 나머지 모든 경로
+def _parse_rate_limits(value):
+    limits = {}
+    for entry in value.split(","):
+        if "=" not in entry:
+            continue
+        route, limit = entry.split("=", 1)
+        max_requests, window_seconds = limit.split("/")
+        limits[route.strip()] = (int(max_requests), int(window_seconds))
+    return limits
+
+RATE_LIMITS = _parse_rate_limits(os.getenv("RATE_LIMITS", "default=1000/3600,/recommendations=60/60,/recommendations/next=300/60,/feedback=300/60"))
+# 여러 워커/노드가 같은 카운터를 쓰도록 공유 상태에 저장 (SHARED_STATE_URL이 memory://가 아니면 기본값 true)
+RATE_LIMIT_SHARED = os.getenv("RATE_LIMIT_SHARED", str(not SHARED_STATE_URL.startswith("memory")).lower()) == "true"
+# X-Forwarded-For를 믿을 프록시 (IP 또는 CIDR, 쉼표 구분). 비어 있으면 헤더를 무시하고 접속 IP로 제한
+# 예: 로드밸런서 뒤에서는 TRUSTED_PROXIES="10.0.0.0/8"
+# Render는 사설 IP의 내부 로드밸런서를 거쳐 요청을 전달하므로, 지정하지 않으면 사설 대역을 프록시로 간주
+_DEFAULT_TRUSTED_PROXIES = "10.0.0.0/8,172.16.0.0/12,192.168.0.0/16" if os.getenv("RENDER") else ""
+TRUSTED_PROXIES = [entry.strip() for entry in os.getenv("TRUSTED_PROXIES", _DEFAULT_TRUSTED_PROXIES).split(",") if entry.strip()]
+# IP별 요청 제한 미들웨어 사용 여부. 프록시 뒤에서 TRUSTED_PROXIES 없이 켜면 모든 사용자가 프록시 IP 하나의 한도를 나눠 씀
+# 그래서 기본값은 TRUSTED_PROXIES가 있을 때만 true (프록시 없이 직접 서비스한다면 RATE_LIMIT_ENABLED=true)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", str(bool(TRUSTED_PROXIES)).lower()) == "true"
+
+# 시드별 후보 풀 (Spotify 정보까지 붙인 후보를 미리 만들어 두고 만료 전에 백그라운드 갱신)
+CANDIDATE_POOL_SIZE = int(os.getenv("CANDIDATE_POOL_SIZE", "1000"))
+CANDIDATE_POOL_FRESH_TTL = int(os.getenv("CANDIDATE_POOL_FRESH_TTL", str(30 * 60)))
+CANDIDATE_POOL_MAX_STALE = int(os.getenv("CANDIDATE_POOL_MAX_STALE", str(6 * 60 * 60)))
+
+# 피드백 직후 다음 추천 묶음을 미리 계산 (/recommendations/next에서 바로 응답)
+PREFETCH_BATCH_SIZE = int(os.getenv("PREFETCH_BATCH_SIZE", "8"))
+# /recommendations/next가 진행 중인 미리 계산을 기다리는 최대 시간 (초), 넘으면 직접 계산
+PREFETCH_WAIT_TIMEOUT = float(os.getenv("PREFETCH_WAIT_TIMEOUT", "0.5"))
+
+# Spotify API 호출: 토큰별 동시 요청 수 제한, 429 Retry-After 준수, 지터 백오프 재시도
+SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", "2"))
+SPOTIFY_BACKOFF_BASE = float(os.getenv("SPOTIFY_BACKOFF_BASE", "0.25"))
+SPOTIFY_MAX_RETRY_WAIT = float(os.getenv("SPOTIFY_MAX_RETRY_WAIT", "5"))
+SPOTIFY_MAX_CONCURRENCY_PER_TOKEN = int(os.getenv("SPOTIFY_MAX_CONCURRENCY_PER_TOKEN", "10"))
+# 만료 이 시간(초) 전에 백그라운드에서 토큰 갱신
+SPOTIFY_TOKEN_REFRESH_MARGIN = float(os.getenv("SPOTIFY_TOKEN_REFRESH_MARGIN", "300"))
+SPOTIFY_TOKEN_REFRESH_INTERVAL = float(os.getenv("SPOTIFY_TOKEN_REFRESH_INTERVAL", "60"))
+
+# 로그 레벨 (DEBUG로 두면 밴딧 점수 로그가 샘플링되어 출력됨)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+# 점수 계산마다 로그를 남기면 그 자체가 느려지므로 이 비율만큼만 기록
+BANDIT_SCORE_LOG_SAMPLE_RATE = float(os.getenv("BANDIT_SCORE_LOG_SAMPLE_RATE", "0.01"))
+
+# 밴딧 종류: thompson / epsilon_greedy (트랙마다 독립된 arm),
+# hierarchical_thompson (같은 아티스트의 평가를 처음 보는 트랙의 사전분포로 사용),
+# linucb / linear_thompson (아티스트와 아티스트 태그 특징을 공유하는 선형 모델, 사용자당 메모리 고정)
+BANDIT_MODE = os.getenv("BANDIT_MODE", "thompson")
+THOMPSON_ARTIST_PRIOR_STRENGTH = float(os.getenv("THOMPSON_ARTIST_PRIOR_STRENGTH", "5"))  # 아티스트 사전분포의 최대 가상 관측 수
+LINEAR_BANDIT_DIM = int(os.getenv("LINEAR_BANDIT_DIM", "64"))  # 해시 특징 차원
+LINEAR_BANDIT_REGULARIZATION = float(os.getenv("LINEAR_BANDIT_REGULARIZATION", "1.0"))
+LINEAR_BANDIT_ALPHA = float(os.getenv("LINEAR_BANDIT_ALPHA", "0.5"))  # LinUCB 신뢰구간 폭 / linear Thompson 분산 배율
+# 아티스트별 Last.fm 상위 태그 (사용자 공용, 선형 밴딧 특징). 저장소에도 보관해 재시작 후 같은 특징으로 복원
+LINEAR_BANDIT_ARTIST_TAGS = int(os.getenv("LINEAR_BANDIT_ARTIST_TAGS", "5"))  # 아티스트당 사용할 태그 수
+LINEAR_BANDIT_ARTIST_TAG_CACHE_SIZE = int(os.getenv("LINEAR_BANDIT_ARTIST_TAG_CACHE_SIZE", "50000"))
+LINEAR_BANDIT_ARTIST_TAG_TTL = int(os.getenv("LINEAR_BANDIT_ARTIST_TAG_TTL", str(7 * 24 * 3600)))
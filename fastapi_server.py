@@ -1,12 +1,23 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from urllib.parse import urlencode
-import httpx
 import os
 from pydantic import BaseModel
+from spotify_player import TrackBatchResolver
+from config import SPOTIFY_ACCOUNTS_URL, SPOTIFY_API_URL, SPOTIFY_TOKEN_URL
+from http_clients import http_clients
+from spotify_client import spotify_client
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared keep-alive pools for Spotify, reused by every request
+    http_clients.startup()
+    yield
+    await http_clients.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # In-memory storage for local playlists (for demonstration purposes)
 # In a real application, this would be stored in a database.
@@ -37,7 +48,7 @@ async def spotify_login():
         "scope": scope,
         "redirect_uri": SPOTIPY_REDIRECT_URI,
     }
-    return RedirectResponse(f"https://accounts.spotify.com/authorize?{urlencode(params)}")
+    return RedirectResponse(f"{SPOTIFY_ACCOUNTS_URL}/authorize?{urlencode(params)}")
 
 @app.get("/callback")
 async def spotify_callback(request: Request):
@@ -45,7 +56,7 @@ async def spotify_callback(request: Request):
     if not code:
         return JSONResponse(status_code=400, content={"error": "Authorization code not found"})
 
-    token_url = "https://accounts.spotify.com/api/token"
+    token_url = SPOTIFY_TOKEN_URL
     payload = {
         "grant_type": "authorization_code",
         "code": code,
@@ -55,8 +66,8 @@ async def spotify_callback(request: Request):
     }
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(token_url, data=payload, headers=headers)
+    # Client credentials are in the payload, so no bearer token
+    response = await spotify_client.post(token_url, None, data=payload, headers=headers)
 
     if response.status_code != 200:
         return JSONResponse(status_code=response.status_code, content=response.json())
@@ -123,46 +134,54 @@ async def export_playlist(request: Request, export_request: ExportPlaylistReques
         return JSONResponse(status_code=401, content={"detail": "Access token not found. Please log in to Spotify."})
 
     # Get user ID
-    async with httpx.AsyncClient() as client:
-        user_profile_response = await client.get(
-            "https://api.spotify.com/v1/me",
-            headers={
-                "Authorization": f"Bearer {access_token}"
-            }
-        )
-        if user_profile_response.status_code != 200:
-            return JSONResponse(status_code=user_profile_response.status_code, content={"detail": "Failed to get user profile from Spotify."})
-        user_id = user_profile_response.json()["id"]
+    user_profile_response = await spotify_client.get(
+        f"{SPOTIFY_API_URL}/me",
+        access_token
+    )
+    if user_profile_response.status_code != 200:
+        return JSONResponse(status_code=user_profile_response.status_code, content={"detail": "Failed to get user profile from Spotify."})
+    user_id = user_profile_response.json()["id"]
 
     # Create playlist
-    async with httpx.AsyncClient() as client:
-        create_playlist_response = await client.post(
-            f"https://api.spotify.com/v1/users/{user_id}/playlists",
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "name": export_request.playlist_name,
-                "public": False, # You can make it public if you want
-                "description": "Playlist exported from Music Recommender"
-            }
-        )
-        if create_playlist_response.status_code != 201:
-            return JSONResponse(status_code=create_playlist_response.status_code, content={"detail": "Failed to create playlist on Spotify."})
-        playlist_id = create_playlist_response.json()["id"]
-
-    # Add tracks to playlist
-    track_uris = [f"spotify:track:{track_id}" for track_id in export_request.track_ids]
-    async with httpx.AsyncClient() as client:
-        add_tracks_response = await client.post(
-            f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks",
+    create_playlist_response = await spotify_client.post(
+        f"{SPOTIFY_API_URL}/users/{user_id}/playlists",
+        access_token,
+        headers={
+            "Content-Type": "application/json"
+        },
+        json={
+            "name": export_request.playlist_name,
+            "public": False, # You can make it public if you want
+            "description": "Playlist exported from Music Recommender"
+        }
+    )
+    if create_playlist_response.status_code != 201:
+        return JSONResponse(status_code=create_playlist_response.status_code, content={"detail": "Failed to create playlist on Spotify."})
+    playlist_id = create_playlist_response.json()["id"]
+
+    # Resolve all tracks in batches of 50 so ids Spotify no longer knows are skipped
+    resolver = TrackBatchResolver(access_token)
+    for track_id in export_request.track_ids:
+        resolver.add(track_id)
+    resolved_tracks = await resolver.resolve_async()
+    # A batch that could not be checked is exported as given, like before the lookup existed
+    unchecked = set(resolver.failed)
+    track_uris = [
+        resolved_tracks[track_id]["uri"] if track_id in resolved_tracks else f"spotify:track:{track_id}"
+        for track_id in export_request.track_ids
+        if track_id in resolved_tracks or track_id in unchecked
+    ]
+
+    # Add tracks to playlist (Spotify accepts at most 100 URIs per request)
+    for i in range(0, len(track_uris), 100):
+        add_tracks_response = await spotify_client.post(
+            f"{SPOTIFY_API_URL}/playlists/{playlist_id}/tracks",
+            access_token,
             headers={
-                "Authorization": f"Bearer {access_token}",
                 "Content-Type": "application/json"
             },
             json={
-                "uris": track_uris
+                "uris": track_uris[i:i + 100]
             }
         )
         if add_tracks_response.status_code != 201:
@@ -215,64 +234,59 @@ async def add_single_track_to_spotify_playlist(add_request: AddSingleTrackToSpot
     user_id = None
     playlist_id = None
 
-    async with httpx.AsyncClient() as client:
-        # Get user ID
-        user_profile_response = await client.get(
-            "https://api.spotify.com/v1/me",
-            headers={
-                "Authorization": f"Bearer {access_token}"
-            }
-        )
-        if user_profile_response.status_code != 200:
-            return JSONResponse(status_code=user_profile_response.status_code, content={"detail": "Failed to get user profile from Spotify."})
-        user_id = user_profile_response.json()["id"]
-
-        # Check if playlist already exists
-        playlists_response = await client.get(
-            f"https://api.spotify.com/v1/users/{user_id}/playlists",
-            headers={
-                "Authorization": f"Bearer {access_token}"
-            }
-        )
-        if playlists_response.status_code == 200:
-            for pl in playlists_response.json()["items"]:
-                if pl["name"] == playlist_name:
-                    playlist_id = pl["id"]
-                    break
-
-        # If playlist doesn't exist, create it
-        if not playlist_id:
-            create_playlist_response = await client.post(
-                f"https://api.spotify.com/v1/users/{user_id}/playlists",
-                headers={
-                    "Authorization": f"Bearer {access_token}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "name": playlist_name,
-                    "public": False, # Set to True if you want it public by default
-                    "description": "Tracks recommended by Music Recommender"
-                }
-            )
-            if create_playlist_response.status_code != 201:
-                return JSONResponse(status_code=create_playlist_response.status_code, content={"detail": "Failed to create playlist on Spotify."})
-            playlist_id = create_playlist_response.json()["id"]
-
-        # Add track to playlist (check for duplicates first if desired, Spotify API handles duplicates by default)
-        # To prevent duplicates, you would fetch playlist items and check before adding.
-        # For simplicity, we'll just add it. Spotify API usually handles adding existing tracks gracefully (no error, just not added again).
-        add_track_response = await client.post(
-            f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks",
+    # Get user ID
+    user_profile_response = await spotify_client.get(
+        f"{SPOTIFY_API_URL}/me",
+        access_token
+    )
+    if user_profile_response.status_code != 200:
+        return JSONResponse(status_code=user_profile_response.status_code, content={"detail": "Failed to get user profile from Spotify."})
+    user_id = user_profile_response.json()["id"]
+
+    # Check if playlist already exists
+    playlists_response = await spotify_client.get(
+        f"{SPOTIFY_API_URL}/users/{user_id}/playlists",
+        access_token
+    )
+    if playlists_response.status_code == 200:
+        for pl in playlists_response.json()["items"]:
+            if pl["name"] == playlist_name:
+                playlist_id = pl["id"]
+                break
+
+    # If playlist doesn't exist, create it
+    if not playlist_id:
+        create_playlist_response = await spotify_client.post(
+            f"{SPOTIFY_API_URL}/users/{user_id}/playlists",
+            access_token,
             headers={
-                "Authorization": f"Bearer {access_token}",
                 "Content-Type": "application/json"
             },
             json={
-                "uris": [track_uri]
+                "name": playlist_name,
+                "public": False, # Set to True if you want it public by default
+                "description": "Tracks recommended by Music Recommender"
             }
         )
-        if add_track_response.status_code not in [200, 201]: # 200 for success, 201 for created (sometimes returned)
-            return JSONResponse(status_code=add_track_response.status_code, content={"detail": "Failed to add track to Spotify playlist."})
+        if create_playlist_response.status_code != 201:
+            return JSONResponse(status_code=create_playlist_response.status_code, content={"detail": "Failed to create playlist on Spotify."})
+        playlist_id = create_playlist_response.json()["id"]
+
+    # Add track to playlist (check for duplicates first if desired, Spotify API handles duplicates by default)
+    # To prevent duplicates, you would fetch playlist items and check before adding.
+    # For simplicity, we'll just add it. Spotify API usually handles adding existing tracks gracefully (no error, just not added again).
+    add_track_response = await spotify_client.post(
+        f"{SPOTIFY_API_URL}/playlists/{playlist_id}/tracks",
+        access_token,
+        headers={
+            "Content-Type": "application/json"
+        },
+        json={
+            "uris": [track_uri]
+        }
+    )
+    if add_track_response.status_code not in [200, 201]: # 200 for success, 201 for created (sometimes returned)
+        return JSONResponse(status_code=add_track_response.status_code, content={"detail": "Failed to add track to Spotify playlist."})
 
     return JSONResponse(content={"message": "Track added to Spotify playlist successfully!", "playlist_id": playlist_id})
 
@@ -284,23 +298,22 @@ async def delete_track_from_playlist(request: Request, delete_request: DeleteTra
 
     track_uri = f"spotify:track:{delete_request.track_id}"
 
-    async with httpx.AsyncClient() as client:
-        response = await client.request(
-            "DELETE",
-            f"https://api.spotify.com/v1/playlists/{delete_request.playlist_id}/tracks",
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "tracks": [{
-                    "uri": track_uri
-                }]
-            }
-        )
+    response = await spotify_client.request(
+        "DELETE",
+        f"{SPOTIFY_API_URL}/playlists/{delete_request.playlist_id}/tracks",
+        access_token,
+        headers={
+            "Content-Type": "application/json"
+        },
+        json={
+            "tracks": [{
+                "uri": track_uri
+            }]
+        }
+    )
 
-        if response.status_code != 200:
-            return JSONResponse(status_code=response.status_code, content={"detail": "Failed to delete track from playlist."})
+    if response.status_code != 200:
+        return JSONResponse(status_code=response.status_code, content={"detail": "Failed to delete track from playlist."})
 
     return JSONResponse(content={"message": "Track deleted successfully!"})
 
@@ -326,64 +339,59 @@ async def delete_track_from_playlist(request: Request, delete_request: DeleteTra
     user_id = None
     playlist_id = None
 
-    async with httpx.AsyncClient() as client:
-        # Get user ID
-        user_profile_response = await client.get(
-            "https://api.spotify.com/v1/me",
-            headers={
-                "Authorization": f"Bearer {access_token}"
-            }
-        )
-        if user_profile_response.status_code != 200:
-            return JSONResponse(status_code=user_profile_response.status_code, content={"detail": "Failed to get user profile from Spotify."})
-        user_id = user_profile_response.json()["id"]
-
-        # Check if playlist already exists
-        playlists_response = await client.get(
-            f"https://api.spotify.com/v1/users/{user_id}/playlists",
-            headers={
-                "Authorization": f"Bearer {access_token}"
-            }
-        )
-        if playlists_response.status_code == 200:
-            for pl in playlists_response.json()["items"]:
-                if pl["name"] == playlist_name:
-                    playlist_id = pl["id"]
-                    break
-
-        # If playlist doesn't exist, create it
-        if not playlist_id:
-            create_playlist_response = await client.post(
-                f"https://api.spotify.com/v1/users/{user_id}/playlists",
-                headers={
-                    "Authorization": f"Bearer {access_token}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "name": playlist_name,
-                    "public": False, # Set to True if you want it public by default
-                    "description": "Tracks recommended by Music Recommender"
-                }
-            )
-            if create_playlist_response.status_code != 201:
-                return JSONResponse(status_code=create_playlist_response.status_code, content={"detail": "Failed to create playlist on Spotify."})
-            playlist_id = create_playlist_response.json()["id"]
-
-        # Add track to playlist (check for duplicates first if desired, Spotify API handles duplicates by default)
-        # To prevent duplicates, you would fetch playlist items and check before adding.
-        # For simplicity, we'll just add it. Spotify API usually handles adding existing tracks gracefully (no error, just not added again).
-        add_track_response = await client.post(
-            f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks",
+    # Get user ID
+    user_profile_response = await spotify_client.get(
+        f"{SPOTIFY_API_URL}/me",
+        access_token
+    )
+    if user_profile_response.status_code != 200:
+        return JSONResponse(status_code=user_profile_response.status_code, content={"detail": "Failed to get user profile from Spotify."})
+    user_id = user_profile_response.json()["id"]
+
+    # Check if playlist already exists
+    playlists_response = await spotify_client.get(
+        f"{SPOTIFY_API_URL}/users/{user_id}/playlists",
+        access_token
+    )
+    if playlists_response.status_code == 200:
+        for pl in playlists_response.json()["items"]:
+            if pl["name"] == playlist_name:
+                playlist_id = pl["id"]
+                break
+
+    # If playlist doesn't exist, create it
+    if not playlist_id:
+        create_playlist_response = await spotify_client.post(
+            f"{SPOTIFY_API_URL}/users/{user_id}/playlists",
+            access_token,
             headers={
-                "Authorization": f"Bearer {access_token}",
                 "Content-Type": "application/json"
             },
             json={
-                "uris": [track_uri]
+                "name": playlist_name,
+                "public": False, # Set to True if you want it public by default
+                "description": "Tracks recommended by Music Recommender"
             }
         )
-        if add_track_response.status_code not in [200, 201]: # 200 for success, 201 for created (sometimes returned)
-            return JSONResponse(status_code=add_track_response.status_code, content={"detail": "Failed to add track to Spotify playlist."})
+        if create_playlist_response.status_code != 201:
+            return JSONResponse(status_code=create_playlist_response.status_code, content={"detail": "Failed to create playlist on Spotify."})
+        playlist_id = create_playlist_response.json()["id"]
+
+    # Add track to playlist (check for duplicates first if desired, Spotify API handles duplicates by default)
+    # To prevent duplicates, you would fetch playlist items and check before adding.
+    # For simplicity, we'll just add it. Spotify API usually handles adding existing tracks gracefully (no error, just not added again).
+    add_track_response = await spotify_client.post(
+        f"{SPOTIFY_API_URL}/playlists/{playlist_id}/tracks",
+        access_token,
+        headers={
+            "Content-Type": "application/json"
+        },
+        json={
+            "uris": [track_uri]
+        }
+    )
+    if add_track_response.status_code not in [200, 201]: # 200 for success, 201 for created (sometimes returned)
+        return JSONResponse(status_code=add_track_response.status_code, content={"detail": "Failed to add track to Spotify playlist."})
 
     return JSONResponse(content={"message": "Track added to Spotify playlist successfully!", "playlist_id": playlist_id})
 
@@ -395,23 +403,22 @@ async def delete_track_from_playlist(request: Request, delete_request: DeleteTra
 
     track_uri = f"spotify:track:{delete_request.track_id}"
 
-    async with httpx.AsyncClient() as client:
-        response = await client.request(
-            "DELETE",
-            f"https://api.spotify.com/v1/playlists/{delete_request.playlist_id}/tracks",
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "tracks": [{
-                    "uri": track_uri
-                }]
-            }
-        )
+    response = await spotify_client.request(
+        "DELETE",
+        f"{SPOTIFY_API_URL}/playlists/{delete_request.playlist_id}/tracks",
+        access_token,
+        headers={
+            "Content-Type": "application/json"
+        },
+        json={
+            "tracks": [{
+                "uri": track_uri
+            }]
+        }
+    )
 
-        if response.status_code != 200:
-            return JSONResponse(status_code=response.status_code, content={"detail": "Failed to delete track from playlist."})
+    if response.status_code != 200:
+        return JSONResponse(status_code=response.status_code, content={"detail": "Failed to delete track from playlist."})
 
     return JSONResponse(content={"message": "Track deleted successfully!"})
 
@@ -0,0 +1,134 @@
+import importlib.util
+import threading
+import time
+from urllib.parse import urlparse
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    HTTP2_ENABLED,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_POOL_MAXSIZE,
+    HTTP_READ_TIMEOUT,
+    LASTFM_API_URL,
+    SPOTIFY_ACCOUNTS_URL,
+    SPOTIFY_API_URL,
+)
+from metrics import record_upstream
+
+# Pool keys; host:port so a local stand-in for every upstream still gets its own pools
+LASTFM_HOST = urlparse(LASTFM_API_URL).netloc
+SPOTIFY_API_HOST = urlparse(SPOTIFY_API_URL).netloc
+SPOTIFY_ACCOUNTS_HOST = urlparse(SPOTIFY_ACCOUNTS_URL).netloc
+UPSTREAM_HOSTS = tuple(dict.fromkeys((LASTFM_HOST, SPOTIFY_API_HOST, SPOTIFY_ACCOUNTS_HOST)))
+
+
+class TimeoutSession(requests.Session):
+    """requests.Session that applies a default timeout to every call"""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.default_timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.default_timeout)
+        host = urlparse(url).hostname
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, **kwargs)
+        except Exception:
+            record_upstream(host, "error", time.perf_counter() - started)
+            raise
+        record_upstream(host, response.status_code, time.perf_counter() - started)
+        return response
+
+
+class InstrumentedAsyncClient(httpx.AsyncClient):
+    """httpx.AsyncClient that counts and times every request it sends"""
+
+    async def send(self, request, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await super().send(request, **kwargs)
+        except Exception:
+            record_upstream(request.url.host, "error", time.perf_counter() - started)
+            raise
+        record_upstream(request.url.host, response.status_code, time.perf_counter() - started)
+        return response
+
+
+class HTTPClientRegistry:
+    """
+    One keep-alive connection pool per upstream host, shared by the whole process.
+    Sync code (requests) uses session(host); async code (httpx) uses async_client(host).
+    Call startup() when the app starts and shutdown()/aclose() when it stops.
+    """
+
+    def __init__(self, pool_maxsize=HTTP_POOL_MAXSIZE, max_keepalive=HTTP_MAX_KEEPALIVE,
+                 keepalive_expiry=HTTP_KEEPALIVE_EXPIRY, connect_timeout=HTTP_CONNECT_TIMEOUT,
+                 read_timeout=HTTP_READ_TIMEOUT, http2=HTTP2_ENABLED):
+        self.pool_maxsize = pool_maxsize
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = (connect_timeout, read_timeout)
+        # httpx only speaks HTTP/2 when the optional h2 package is installed
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self._sessions = {}
+        self._async_clients = {}
+        self._lock = threading.Lock()
+
+    def session(self, host):
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = TimeoutSession(self.timeout)
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._sessions[host] = session
+        return session
+
+    def async_client(self, host):
+        client = self._async_clients.get(host)
+        if client is None or client.is_closed:
+            client = InstrumentedAsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.pool_maxsize,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+            )
+            self._async_clients[host] = client
+        return client
+
+    def startup(self):
+        """Create the pools for every known upstream up front"""
+        for host in UPSTREAM_HOSTS:
+            self.session(host)
+            self.async_client(host)
+        print(f"[HTTP] Connection pools ready for {', '.join(UPSTREAM_HOSTS)} (http2={self.http2})")
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+    async def aclose(self):
+        clients, self._async_clients = self._async_clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    async def shutdown(self):
+        self.close()
+        await self.aclose()
+        print("[HTTP] Connection pools closed")
+
+
+http_clients = HTTPClientRegistry()
@@ -1,19 +1,93 @@
-import requests
-from config import LASTFM_API_KEY
+import json
+from cache import MISSING, SQLiteCache, TTLCache, TieredCache
+from http_clients import LASTFM_HOST, http_clients
+from singleflight import SingleFlight
+from config import (
+    LASTFM_API_KEY,
+    LASTFM_API_URL,
+    LASTFM_CACHE_DB,
+    LASTFM_CACHE_DB_MAX_ROWS,
+    LASTFM_CACHE_DEFAULT_TTL,
+    LASTFM_CACHE_SIZE,
+    LASTFM_CACHE_TTLS,
+)
+
+# Shared by every LastFMClient instance: responses are not user-specific,
+# so one user's seed warms the cache for everyone else.
+response_cache = TieredCache(
+    TTLCache(max_size=LASTFM_CACHE_SIZE, default_ttl=LASTFM_CACHE_DEFAULT_TTL),
+    SQLiteCache(LASTFM_CACHE_DB, max_rows=LASTFM_CACHE_DB_MAX_ROWS) if LASTFM_CACHE_DB else None,
+)
+
+# Identical requests in flight at the same time (a trending seed asked for by many
+# users at once) share one upstream call; keyed by the same normalized cache key
+lastfm_flight = SingleFlight("lastfm")
+
+def tag_list(result):
+    """Tags of a getTopTags response, most used first; Last.fm collapses a one-tag list into a dict"""
+    tags = result.get("toptags", {}).get("tag", [])
+    return [tags] if isinstance(tags, dict) else tags
+
+def make_cache_key(method, params):
+    """Normalize (method, params) so that case and whitespace variants share an entry"""
+    normalized = sorted(
+        (name, " ".join(str(value).split()).casefold())
+        for name, value in params.items()
+    )
+    return json.dumps([method, normalized], ensure_ascii=False)
 
 class LastFMClient:
-    def __init__(self):
+    def __init__(self, cache=response_cache):
         self.api_key = LASTFM_API_KEY
-        self.base_url = "http://ws.audioscrobbler.com/2.0/"
+        self.base_url = LASTFM_API_URL
+        self.cache = cache
 
-    def _make_request(self, method, params):
+    def _lookup_cache(self, method, params):
+        cache_key = make_cache_key(method, params)
+        if self.cache is None:
+            return cache_key, MISSING
+        return cache_key, self.cache.get(cache_key)
+
+    def _request_params(self, method, params):
         params.update({
             "method": method,
             "api_key": self.api_key,
             "format": "json"
         })
-        response = requests.get(self.base_url, params=params)
-        return response.json()
+        return params
+
+    def _store_response(self, cache_key, method, status_code, result):
+        # Errors (bad key, rate limit, unknown track) must not be cached
+        if self.cache is not None and status_code == 200 and "error" not in result:
+            self.cache.set(cache_key, result, LASTFM_CACHE_TTLS.get(method, LASTFM_CACHE_DEFAULT_TTL))
+
+    def _fetch(self, cache_key, method, params):
+        response = http_clients.session(LASTFM_HOST).get(self.base_url, params=self._request_params(method, params))
+        result = response.json()
+        self._store_response(cache_key, method, response.status_code, result)
+        return result
+
+    async def _fetch_async(self, cache_key, method, params):
+        client = http_clients.async_client(LASTFM_HOST)
+        response = await client.get(self.base_url, params=self._request_params(method, params))
+        result = response.json()
+        self._store_response(cache_key, method, response.status_code, result)
+        return result
+
+    def _make_request(self, method, params):
+        cache_key, cached = self._lookup_cache(method, params)
+        if cached is not MISSING:
+            return cached
+        return lastfm_flight.do(cache_key, lambda: self._fetch(cache_key, method, params))
+
+    async def _make_request_async(self, method, params):
+        cache_key, cached = self._lookup_cache(method, params)
+        if cached is not MISSING:
+            return cached
+        return await lastfm_flight.do_async(cache_key, lambda: self._fetch_async(cache_key, method, params))
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache is not None else None
 
     def get_similar_tracks(self, track_name, artist_name, limit=10):
         result = self._make_request("track.getSimilar", {
@@ -30,9 +104,57 @@ class LastFMClient:
         })
         return result.get("toptracks", {}).get("track", [])
 
+    def get_similar_artists(self, artist_name, limit=10):
+        result = self._make_request("artist.getSimilar", {
+            "artist": artist_name,
+            "limit": limit
+        })
+        return result.get("similarartists", {}).get("artist", [])
+
     def get_top_tracks_by_tag(self, tag, limit=10):
         result = self._make_request("tag.getTopTracks", {
             "tag": tag,
             "limit": limit
         })
         return result.get("tracks", {}).get("track", [])
+
+    def get_artist_top_tags(self, artist_name):
+        result = self._make_request("artist.getTopTags", {
+            "artist": artist_name
+        })
+        return tag_list(result)
+
+    async def get_similar_tracks_async(self, track_name, artist_name, limit=10):
+        result = await self._make_request_async("track.getSimilar", {
+            "track": track_name,
+            "artist": artist_name,
+            "limit": limit
+        })
+        return result.get("similartracks", {}).get("track", [])
+
+    async def get_top_tracks_by_artist_async(self, artist_name, limit=10):
+        result = await self._make_request_async("artist.getTopTracks", {
+            "artist": artist_name,
+            "limit": limit
+        })
+        return result.get("toptracks", {}).get("track", [])
+
+    async def get_similar_artists_async(self, artist_name, limit=10):
+        result = await self._make_request_async("artist.getSimilar", {
+            "artist": artist_name,
+            "limit": limit
+        })
+        return result.get("similarartists", {}).get("artist", [])
+
+    async def get_top_tracks_by_tag_async(self, tag, limit=10):
+        result = await self._make_request_async("tag.getTopTracks", {
+            "tag": tag,
+            "limit": limit
+        })
+        return result.get("tracks", {}).get("track", [])
+
+    async def get_artist_top_tags_async(self, artist_name):
+        result = await self._make_request_async("artist.getTopTags", {
+            "artist": artist_name
+        })
+        return tag_list(result)
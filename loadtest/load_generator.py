@@ -0,0 +1,149 @@
+"""
+Drives a running app with N concurrent logged-in sessions and reports latency
+percentiles and throughput per endpoint. Meant to run against main.py pointed at
+loadtest/mock_upstream.py (see that module), all on one box:
+
+    python -m loadtest.load_generator --base-url http://127.0.0.1:8000 --sessions 50 --duration 60
+
+Each session logs in through /callback (the mock accounts server accepts any code),
+then loops: POST /recommendations for one of --seeds seeds, POST /feedback for
+--feedback-per-rec of the returned tracks, and GET /playlists every --playlists-every
+rounds, pausing --think-time ms between calls.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+import httpx
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)   # {endpoint: [seconds, ...]}
+        self.statuses = defaultdict(Counter)  # {endpoint: {status: count}}
+
+    def record(self, endpoint, seconds, status):
+        self.latencies[endpoint].append(seconds)
+        self.statuses[endpoint][status] += 1
+
+    def summary(self, elapsed):
+        rows = []
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            statuses = self.statuses[endpoint]
+            rows.append({
+                "endpoint": endpoint,
+                "requests": len(values),
+                # Transport failures are recorded under the exception name instead of a status code
+                "errors": sum(count for status, count in statuses.items() if not isinstance(status, int) or status >= 400),
+                "rps": len(values) / elapsed,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000,
+                "statuses": dict(statuses),
+            })
+        return rows
+
+
+async def timed(recorder, endpoint, call):
+    started = time.perf_counter()
+    try:
+        response = await call()
+        status = response.status_code
+    except httpx.HTTPError as e:
+        response, status = None, type(e).__name__
+    recorder.record(endpoint, time.perf_counter() - started, status)
+    return response
+
+
+async def run_session(index, args, recorder, deadline, seeds):
+    rng = random.Random(index)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        login = await timed(recorder, "GET /callback", lambda: client.get("/callback", params={"code": f"session{index}"}))
+        if login is None or "session_id" not in login.cookies:
+            print(f"[LoadTest] Session {index} could not log in")
+            return
+        client.cookies.set("session_id", login.cookies["session_id"])
+
+        rounds = 0
+        while time.monotonic() < deadline:
+            track_name, artist_name = rng.choice(seeds)
+            response = await timed(recorder, "POST /recommendations", lambda: client.post(
+                "/recommendations", json={"track_name": track_name, "artist_name": artist_name}
+            ))
+            tracks = response.json().get("recommendations", []) if response is not None and response.status_code == 200 else []
+
+            for track in rng.sample(tracks, min(args.feedback_per_rec, len(tracks))):
+                await asyncio.sleep(args.think_time / 1000)
+                await timed(recorder, "POST /feedback", lambda: client.post("/feedback", json={
+                    "track_id": track["id"],
+                    "rating": rng.randint(0, 5),
+                    "seed_track_name": track_name,
+                    "seed_artist_name": artist_name,
+                    "track_info": track,
+                }))
+
+            rounds += 1
+            if rounds % args.playlists_every == 0:
+                await timed(recorder, "GET /playlists", lambda: client.get("/playlists"))
+            await asyncio.sleep(args.think_time / 1000)
+
+
+async def run(args):
+    # Seeds the mock upstream knows; a small set means warm candidate pools, a large one cold seeds
+    seeds = [(f"Song {i}", f"Artist {i % 250}") for i in range(args.seeds)]
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + args.duration
+    sessions = []
+    for index in range(args.sessions):
+        sessions.append(asyncio.create_task(run_session(index, args, recorder, deadline, seeds)))
+        await asyncio.sleep(args.ramp_up / max(args.sessions, 1))
+    await asyncio.gather(*sessions)
+    return recorder.summary(time.monotonic() - started)
+
+
+def print_summary(rows):
+    print(f"{'endpoint':<24}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for row in rows:
+        print(f"{row['endpoint']:<24}{row['requests']:>9}{row['errors']:>8}{row['rps']:>9.1f}"
+              f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+    for row in rows:
+        if row["errors"]:
+            print(f"[LoadTest] {row['endpoint']} statuses: {row['statuses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the recommendation API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent logged-in sessions")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run after the first session starts")
+    parser.add_argument("--ramp-up", type=float, default=2, help="seconds over which sessions are started")
+    parser.add_argument("--seeds", type=int, default=50, help="distinct seed tracks to request")
+    parser.add_argument("--feedback-per-rec", type=int, default=3)
+    parser.add_argument("--playlists-every", type=int, default=5, help="GET /playlists every n rounds")
+    parser.add_argument("--think-time", type=float, default=100, help="pause between calls of a session, ms")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+    print_summary(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
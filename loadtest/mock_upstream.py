@@ -0,0 +1,278 @@
+"""
+Local stand-in for Last.fm and the Spotify Web/Accounts APIs, so main.py can be
+load-tested without touching the real services. One server answers all three:
+
+    python -m loadtest.mock_upstream --port 9100 \
+        --lastfm-latency lognormal:120:0.5 --spotify-latency lognormal:60:0.6 --spotify-429 0.01
+
+then start the app against it:
+
+    LASTFM_API_URL=http://127.0.0.1:9100/2.0/ \
+    SPOTIFY_API_URL=http://127.0.0.1:9100/v1 \
+    SPOTIFY_ACCOUNTS_URL=http://127.0.0.1:9100 \
+    RATE_LIMITS="default=1000000/60" \
+    uvicorn main:app --port 8000
+
+(every simulated session comes from one IP, so the per-IP rate limits must be lifted).
+
+Latency specs (milliseconds): "0", "fixed:50", "uniform:20:80", "lognormal:<median>:<sigma>".
+Answers are deterministic per query over a catalogue of --catalogue tracks
+("Song n" by "Artist n % --artists"), so caches behave as they would for real seeds.
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import random
+import uuid
+from urllib.parse import parse_qs
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+settings = {
+    "lastfm_latency": "0",
+    "spotify_latency": "0",
+    "accounts_latency": "0",
+    "lastfm_429": 0.0,
+    "spotify_429": 0.0,
+    "retry_after": 1,
+    "search_miss": 0.1,
+    "catalogue": 5000,
+    "artists": 250,
+}
+
+
+def parse_latency(spec):
+    """Latency spec -> function returning a delay in seconds"""
+    kind, *params = spec.split(":")
+    params = [float(p) for p in params]
+    if kind in ("0", "none"):
+        return lambda: 0.0
+    if kind == "fixed":
+        return lambda: params[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(params[0], params[1]) / 1000
+    if kind == "lognormal":
+        median, sigma = params
+        return lambda: random.lognormvariate(math.log(median), sigma) / 1000
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+latency = {}
+
+
+def configure(**overrides):
+    settings.update(overrides)
+    for upstream in ("lastfm", "spotify", "accounts"):
+        latency[upstream] = parse_latency(settings[f"{upstream}_latency"])
+
+
+configure()
+
+
+def stable_int(*parts):
+    return int(hashlib.sha1("|".join(parts).encode()).hexdigest()[:12], 16)
+
+
+def spotify_id(track_name, artist_name):
+    return hashlib.sha1(f"{track_name}|{artist_name}".casefold().encode()).hexdigest()[:22]
+
+
+def song(n, match=None):
+    track = {"name": f"Song {n}", "artist": {"name": f"Artist {n % settings['artists']}"}}
+    if match is not None:
+        track["match"] = f"{match:.3f}"
+    return track
+
+
+def sample_songs(key, limit):
+    rng = random.Random(key)
+    return rng.sample(range(settings["catalogue"]), min(limit, settings["catalogue"]))
+
+
+def spotify_track(track_name, artist_name):
+    track_id = spotify_id(track_name, artist_name)
+    return {
+        "id": track_id,
+        "uri": f"spotify:track:{track_id}",
+        "name": track_name,
+        "artists": [{"id": spotify_id(artist_name, ""), "name": artist_name}],
+        "album": {"images": [{"url": f"https://example.invalid/cover/{track_id}.jpg"}]},
+        "preview_url": None,
+    }
+
+
+app = FastAPI()
+# Tracks behind the ids handed out by /v1/search, for /v1/tracks lookups
+known_tracks = {}
+stats = {"requests": 0, "rate_limited": 0}
+
+
+async def upstream_call(upstream):
+    """Sleep for the configured latency; returns a 429 response when one is injected"""
+    stats["requests"] += 1
+    await asyncio.sleep(latency[upstream]())
+    if random.random() < settings.get(f"{upstream}_429", 0.0):
+        stats["rate_limited"] += 1
+        body = {"error": 29, "message": "Rate Limit Exceeded"} if upstream == "lastfm" else {"error": {"status": 429, "message": "API rate limit exceeded"}}
+        return JSONResponse(body, status_code=429, headers={"Retry-After": str(settings["retry_after"])})
+    return None
+
+
+# --- Last.fm ---
+@app.get("/2.0/")
+async def lastfm(request: Request):
+    rate_limited = await upstream_call("lastfm")
+    if rate_limited:
+        return rate_limited
+    params = request.query_params
+    method = params.get("method")
+    limit = int(params.get("limit", 10))
+
+    if method == "track.getSimilar":
+        key = stable_int(params.get("track", ""), params.get("artist", ""))
+        return {"similartracks": {"track": [song(n, 1 - i / max(limit, 1)) for i, n in enumerate(sample_songs(key, limit))]}}
+    if method == "artist.getTopTracks":
+        artist = params.get("artist", "")
+        index = int(artist[len("Artist "):]) if artist.startswith("Artist ") and artist[7:].isdigit() else stable_int(artist) % settings["artists"]
+        songs = range(index, settings["catalogue"], settings["artists"])
+        return {"toptracks": {"track": [song(n) for n in list(songs)[:limit]]}}
+    if method == "tag.getTopTracks":
+        return {"tracks": {"track": [song(n) for n in sample_songs(stable_int("tag", params.get("tag", "")), limit)]}}
+    if method == "artist.getSimilar":
+        rng = random.Random(stable_int("similar", params.get("artist", "")))
+        artists = rng.sample(range(settings["artists"]), min(limit, settings["artists"]))
+        return {"similarartists": {"artist": [{"name": f"Artist {a}", "match": "0.5"} for a in artists]}}
+    if method == "artist.getTopTags":
+        rng = random.Random(stable_int("tags", params.get("artist", "")))
+        return {"toptags": {"tag": [{"name": f"tag {t}", "count": 100 - i} for i, t in enumerate(rng.sample(range(50), 5))]}}
+    return {"error": 3, "message": "Invalid Method"}
+
+
+# --- Spotify Web API ---
+@app.get("/v1/search")
+async def search(q: str):
+    rate_limited = await upstream_call("spotify")
+    if rate_limited:
+        return rate_limited
+    track_name, _, artist_name = q.partition(" artist:")
+    track_name = track_name.removeprefix("track:")
+    if stable_int("miss", track_name, artist_name) % 1000 < settings["search_miss"] * 1000:
+        return {"tracks": {"items": []}}
+    track = spotify_track(track_name, artist_name)
+    known_tracks[track["id"]] = track
+    return {"tracks": {"items": [track]}}
+
+
+@app.get("/v1/tracks")
+async def tracks(ids: str):
+    rate_limited = await upstream_call("spotify")
+    if rate_limited:
+        return rate_limited
+    return {"tracks": [known_tracks.get(track_id) for track_id in ids.split(",")]}
+
+
+@app.get("/v1/tracks/{track_id}")
+async def track(track_id: str):
+    rate_limited = await upstream_call("spotify")
+    if rate_limited:
+        return rate_limited
+    if track_id not in known_tracks:
+        return JSONResponse({"error": {"status": 404, "message": "Non existing id"}}, status_code=404)
+    return known_tracks[track_id]
+
+
+@app.get("/v1/me")
+async def me(request: Request):
+    rate_limited = await upstream_call("spotify")
+    if rate_limited:
+        return rate_limited
+    token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    # One Spotify user per login code, see /api/token
+    user_id = "loadtest-" + token.split(":", 1)[-1] if token.startswith("user:") else "loadtest-app"
+    return {"id": user_id, "display_name": user_id, "product": "premium", "email": f"{user_id}@example.invalid"}
+
+
+@app.post("/v1/users/{user_id}/playlists")
+async def create_playlist(user_id: str):
+    rate_limited = await upstream_call("spotify")
+    if rate_limited:
+        return rate_limited
+    return JSONResponse({"id": uuid.uuid4().hex[:22], "owner": {"id": user_id}}, status_code=201)
+
+
+@app.get("/v1/me/playlists")
+async def my_playlists():
+    rate_limited = await upstream_call("spotify")
+    if rate_limited:
+        return rate_limited
+    return {"items": [], "total": 0}
+
+
+@app.post("/v1/playlists/{playlist_id}/tracks")
+async def add_playlist_tracks(playlist_id: str):
+    rate_limited = await upstream_call("spotify")
+    if rate_limited:
+        return rate_limited
+    return JSONResponse({"snapshot_id": uuid.uuid4().hex}, status_code=201)
+
+
+# --- Spotify Accounts ---
+@app.post("/api/token")
+async def token(request: Request):
+    await upstream_call("accounts")
+    # Parsed by hand: request.form() would need python-multipart just for this
+    form = {key: values[0] for key, values in parse_qs((await request.body()).decode()).items()}
+    grant_type = form.get("grant_type")
+    if grant_type == "authorization_code":
+        access_token = f"user:{form.get('code')}"
+    elif grant_type == "refresh_token":
+        access_token = f"user:{form.get('refresh_token', '').removeprefix('refresh:')}"
+    else:
+        access_token = "app:client-credentials"
+    return {
+        "access_token": access_token,
+        "token_type": "Bearer",
+        "expires_in": 3600,
+        "refresh_token": "refresh:" + access_token.split(":", 1)[-1],
+        "scope": form.get("scope", ""),
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "known_tracks": len(known_tracks), "settings": settings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Last.fm / Spotify upstream for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--lastfm-latency", default="lognormal:120:0.5")
+    parser.add_argument("--spotify-latency", default="lognormal:60:0.6")
+    parser.add_argument("--accounts-latency", default="fixed:80")
+    parser.add_argument("--lastfm-429", type=float, default=0.0, help="probability of a 429 per Last.fm call")
+    parser.add_argument("--spotify-429", type=float, default=0.0, help="probability of a 429 per Spotify API call")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--search-miss", type=float, default=0.1, help="share of searches with no result")
+    parser.add_argument("--catalogue", type=int, default=5000)
+    parser.add_argument("--artists", type=int, default=250)
+    args = parser.parse_args()
+
+    configure(
+        lastfm_latency=args.lastfm_latency,
+        spotify_latency=args.spotify_latency,
+        accounts_latency=args.accounts_latency,
+        lastfm_429=args.lastfm_429,
+        spotify_429=args.spotify_429,
+        retry_after=args.retry_after,
+        search_miss=args.search_miss,
+        catalogue=args.catalogue,
+        artists=args.artists,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
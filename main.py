@@ -20,18 +20,70 @@ if os.getenv("RENDER"):
 from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, Any
 import time
 import uuid
+import json
+import asyncio
+import heapq
+import logging
+from contextlib import asynccontextmanager
 
 # Local module imports (환경변수 로드 후에 import)
-from lastfm_client import LastFMClient
-from recommender import Recommender
-from bandit.thompson_sampling import ThompsonSampling
-from spotify_player import search_track_on_spotify
+from lastfm_client import LastFMClient, lastfm_flight, response_cache
+from recommender import BANDIT_TYPES, Recommender, build_bandit, dedupe_candidates, track_arm_id
+from bandit.base import should_log_score
+from bandit.linear import missing_artist_tags, remember_artist_tags
+from bandit.thompson_sampling import artist_of
+from candidate_sources import build_sources, fetch_all_async, source_queue_depth
+from candidate_pool import CandidatePoolStore
+from cache import MISSING
+from spotify_player import (
+    TrackBatchResolver,
+    find_cached_track,
+    get_user_profile_async,
+    remember_track,
+    search_cache,
+    search_flight,
+    search_track_on_spotify_async,
+    spotify_id_index,
+)
 from spotify_auth import SpotifyAuthManager
+from http_clients import SPOTIFY_ACCOUNTS_HOST, http_clients
+from storage import WriteBehindQueue, create_storage
+from shared_state import shared_state
+from sessions import SessionStore
+from security import TokenRefreshError, rate_limit_middleware, refresh_spotify_token, sweep_rate_limiters
+from spotify_client import spotify_client
+from metrics import http_request_seconds, http_requests, registry, span
+from config import (
+    BANDIT_MODE,
+    CANDIDATE_SOURCE_TIMEOUT,
+    ENRICHMENT_BUDGET_SECONDS,
+    ENRICHMENT_MAX_CONCURRENCY,
+    LINEAR_BANDIT_ARTIST_TAGS,
+    LOG_LEVEL,
+    MAINTENANCE_INTERVAL,
+    MAX_RESIDENT_USERS,
+    PREFETCH_BATCH_SIZE,
+    PREFETCH_WAIT_TIMEOUT,
+    RATE_LIMIT_ENABLED,
+    SESSION_TTL,
+    SPOTIFY_TOKEN_REFRESH_INTERVAL,
+    SPOTIFY_TOKEN_REFRESH_MARGIN,
+    SPOTIFY_TOKEN_URL,
+    STORAGE_BACKEND,
+    STORAGE_PATH,
+    USER_IDLE_TIMEOUT,
+    USER_VERSION_TTL,
+    WRITE_BEHIND_INTERVAL,
+)
+
+logging.basicConfig(level=LOG_LEVEL, format="[%(name)s] %(levelname)s %(message)s")
+# Per-track Spotify lookup logs are DEBUG-only and sampled, like the bandits' score logs
+enrichment_logger = logging.getLogger("enrichment")
 
 # Initialize SpotifyAuthManager using variables we just loaded
 spotify_auth_manager = SpotifyAuthManager(
@@ -41,24 +93,56 @@ spotify_auth_manager = SpotifyAuthManager(
     scope=SPOTIPY_SCOPE
 )
 
+# Search-only Client Credentials token, shared by every worker until it expires
+CLIENT_CREDENTIALS_KEY = "spotify_auth:client_credentials"  # {access_token, expires_at}
+
 # User session management
-user_sessions = {}  # {session_id: {user_id, access_token, refresh_token, expires_at}}
-user_data = {}      # {user_id: {playlists, recommender, created_at, last_active}}
+# Sessions live in shared state so any worker behind the load balancer can serve any request.
+# user_data is a per-worker cache of live recommenders, kept in sync through per-user versions.
+session_store = SessionStore(shared_state, ttl=SESSION_TTL)
+user_sessions = session_store.sessions  # {session_id: {user_id, access_token, refresh_token, expires_at}}
+user_data = {}      # {user_id: {playlists, recommender, version, created_at, last_active}}
+
+def user_version_key(user_id):
+    return f"user_version:{user_id}"
 
-def get_spotify_access_token_for_sdk():
+def bump_user_versions(user_ids):
+    """
+    write_behind on_flush hook: tell every worker these users changed in storage.
+    If nobody else bumped the version since this worker loaded the user, the flushed
+    change came from here and the cached copy is still current.
+    """
+    for user_id in user_ids:
+        version = shared_state.incr(user_version_key(user_id), ttl=USER_VERSION_TTL)
+        entry = user_data.get(user_id)
+        if entry is not None and entry.get("version") == version - 1:
+            entry["version"] = version
+
+# Durable storage for bandit arms, playlists and sessions; writes are batched off the request path
+storage = create_storage(STORAGE_BACKEND, STORAGE_PATH)
+write_behind = WriteBehindQueue(storage, interval=WRITE_BEHIND_INTERVAL, on_flush=bump_user_versions) if storage else None
+
+async def get_spotify_access_token_for_sdk():
     """
     Provides the access token for the Spotify Web Playback SDK.
     This will trigger the OAuth flow if no token is available.
     For search purposes, use Client Credentials flow.
     """
-    # First try to get user token from OAuth flow
-    if spotify_auth_manager.get_access_token():
-        return spotify_auth_manager.get_access_token()
+    # First try to get user token from OAuth flow (kept fresh by token_refresh_loop)
+    access_token = await spotify_auth_manager.get_access_token_async()
+    if access_token:
+        return access_token
     
-    # Fallback: Get Client Credentials token for search-only access
+    # Client Credentials tokens are valid for an hour, so reuse one until shortly before it expires
+    client_credentials_token = await shared_state.run(shared_state.get, CLIENT_CREDENTIALS_KEY) or {}
+    if client_credentials_token.get("expires_at", 0) > time.time() + 60:
+        return client_credentials_token["access_token"]
+    return await fetch_client_credentials_token()
+
+async def fetch_client_credentials_token():
+    """Get a Client Credentials token for search-only access and share it with every worker"""
     try:
         import base64
-        import requests
         
         # Client Credentials Flow
         auth_str = f"{SPOTIFY_CLIENT_ID}:{SPOTIFY_CLIENT_SECRET}"
@@ -70,11 +154,17 @@ def get_spotify_access_token_for_sdk():
         }
         data = {"grant_type": "client_credentials"}
         
-        response = requests.post("https://accounts.spotify.com/api/token", headers=headers, data=data)
+        client = http_clients.async_client(SPOTIFY_ACCOUNTS_HOST)
+        response = await client.post(SPOTIFY_TOKEN_URL, headers=headers, data=data)
         
         if response.status_code == 200:
             token_data = response.json()
             print(f"[Backend] Got Client Credentials token for search")
+            expires_in = token_data.get("expires_in", 3600)
+            await shared_state.run(shared_state.set, CLIENT_CREDENTIALS_KEY, {
+                "access_token": token_data.get("access_token"),
+                "expires_at": time.time() + expires_in
+            }, ttl=expires_in)
             return token_data.get("access_token")
         else:
             print(f"[Backend] Failed to get Client Credentials token: {response.status_code}")
@@ -84,25 +174,33 @@ def get_spotify_access_token_for_sdk():
         print(f"[Backend] Error getting Client Credentials token: {e}")
         return None
 
-def get_user_from_request(request: Request):
+def find_session_user(auth_header, session_id):
+    """user_id behind a Bearer token or a session cookie, or None. Blocking (shared state)."""
+    # Try to get from Authorization header first
+    if auth_header and auth_header.startswith("Bearer "):
+        token = auth_header.split(" ")[1]
+        # Find user by token through the token -> session index
+        session_data = session_store.get(session_store.session_id_for_token(token))
+        if session_data:
+            return session_data.get("user_id")
+
+    # Try to get from session cookie
+    session_data = session_store.get(session_id)
+    if session_data:
+        return session_data.get("user_id")
+    return None
+
+async def get_user_from_request(request: Request):
     """Extract user info from request session/token"""
     try:
-        # Try to get from Authorization header first
-        auth_header = request.headers.get("Authorization")
-        if auth_header and auth_header.startswith("Bearer "):
-            token = auth_header.split(" ")[1]
-            # Find user by token
-            for session_id, session_data in user_sessions.items():
-                if session_data.get("access_token") == token:
-                    return session_data.get("user_id")
-        
-        # Try to get from session cookie
-        session_id = request.cookies.get("session_id")
-        if session_id and session_id in user_sessions:
-            return user_sessions[session_id].get("user_id")
+        user_id = await shared_state.run(
+            find_session_user, request.headers.get("Authorization"), request.cookies.get("session_id")
+        )
+        if user_id:
+            return user_id
         
         # Try to get user token from spotify_auth_manager
-        if spotify_auth_manager.get_access_token():
+        if await spotify_auth_manager.get_access_token_async():
             # This is a fallback - in production you'd want better user identification
             return "default_user"
             
@@ -111,34 +209,435 @@ def get_user_from_request(request: Request):
         print(f"[Backend] Error getting user from request: {e}")
         return None
 
-def get_or_create_user_data(user_id: str):
-    """Get or create user-specific data"""
+def new_recommender():
+    return Recommender(LastFMClient(), build_bandit())
+
+def load_user_state(user_id: str):
+    """
+    Fresh recommender and playlists built from storage, plus the version they reflect.
+    Blocking (storage reads, possibly a flush): run it in a worker thread.
+    """
+    recommender = new_recommender()
+    playlists = {str(i): [] for i in range(6)}  # 0-5 rating playlists
+    version = None
+    if storage:
+        # Writes for this user may still be buffered (e.g. right after eviction)
+        write_behind.flush_user(user_id)
+        # Read the version before the data: a change landing in between only causes one extra reload
+        version = shared_state.get(user_version_key(user_id)) or 0
+        rows = storage.load_arms(user_id)
+        if recommender.bandit.uses_artist_tags:
+            # The tags these arms were scored with, for artists this worker has not seen yet
+            remember_artist_tags(storage.load_artist_tags(
+                missing_artist_tags({artist_of(item_id).casefold() for item_id, _, _ in rows})
+            ))
+        recommender.bandit.restore_arms(rows)
+        playlists.update(storage.load_playlists(user_id) or {})
+    return recommender, playlists, version
+
+async def get_or_create_user_data(user_id: str):
+    """Get or create user-specific data, hydrating it from storage on first use"""
     if user_id not in user_data:
-        user_data[user_id] = {
-            "playlists": {str(i): [] for i in range(6)},  # 0-5 rating playlists
-            "recommender": Recommender(LastFMClient(), ThompsonSampling()),
-            "created_at": time.time(),
-            "last_active": time.time()
-        }
-        print(f"[Backend] Created new user data for {user_id}")
+        recommender, playlists, version = await asyncio.to_thread(load_user_state, user_id)
+        # A concurrent request for the same user may have finished loading first
+        if user_id not in user_data:
+            user_data[user_id] = {
+                "playlists": playlists,
+                "recommender": recommender,
+                "version": version,
+                "created_at": time.time(),
+                "last_active": time.time()
+            }
+            print(f"[Backend] Created new user data for {user_id}")
     else:
-        user_data[user_id]["last_active"] = time.time()
+        data = user_data[user_id]
+        data["last_active"] = time.time()
+        # Another worker (or node) rated or reset since we loaded this user: reload from storage
+        if storage and (await shared_state.run(shared_state.get, user_version_key(user_id)) or 0) != data["version"]:
+            data["recommender"], data["playlists"], data["version"] = await asyncio.to_thread(load_user_state, user_id)
+            print(f"[Backend] Reloaded user data for {user_id} (changed by another worker)")
     
     return user_data[user_id]
 
-def cleanup_old_users():
-    """Clean up old inactive user data (call periodically)"""
-    current_time = time.time()
-    cutoff_time = current_time - (24 * 60 * 60)  # 24 hours
-    
-    old_users = [
+def persist_playlists(user_id, playlists):
+    if write_behind:
+        write_behind.put_playlists(user_id, playlists)
+
+# Last maintenance pass, for logs and monitoring
+maintenance_stats = {"resident_users": 0, "evicted_idle": 0, "evicted_lru": 0, "expired_sessions": 0, "idle_rate_limit_clients": 0, "last_run": None}
+
+def cleanup_old_users(idle_timeout=USER_IDLE_TIMEOUT, max_resident=MAX_RESIDENT_USERS):
+    """
+    Drop idle users from memory, then the least recently active ones while more than
+    max_resident remain. Their state stays in storage (pending writes included) and
+    is hydrated again on the next request. Returns (evicted_idle, evicted_lru).
+    """
+    cutoff_time = time.time() - idle_timeout
+    idle_users = [
         user_id for user_id, data in user_data.items()
         if data.get("last_active", 0) < cutoff_time
     ]
-    
-    for user_id in old_users:
+    for user_id in idle_users:
         del user_data[user_id]
-        print(f"[Backend] Cleaned up old user data for {user_id}")
+
+    overflow = len(user_data) - max_resident
+    lru_users = []
+    if overflow > 0:
+        lru_users = heapq.nsmallest(overflow, user_data, key=lambda user_id: user_data[user_id].get("last_active", 0))
+        for user_id in lru_users:
+            del user_data[user_id]
+    return len(idle_users), len(lru_users)
+
+def get_track_names(track):
+    """Return (track_name, artist_name) from a Last.fm track dict"""
+    artist = track.get('artist', {})
+    if isinstance(artist, dict):
+        artist_name = artist.get('name', 'Unknown Artist')
+    else:
+        artist_name = str(artist) if artist else 'Unknown Artist'
+    return track.get('name', 'Unknown Track'), artist_name
+
+def build_recommendation_card(track_name, artist_name, spotify_info, recommend_request):
+    """Build the card the frontend renders, or None if the track was not found on Spotify"""
+    if not spotify_info or not spotify_info.get('id'):
+        if should_log_score(enrichment_logger):
+            enrichment_logger.debug("Could not find '%s' by '%s' on Spotify", track_name, artist_name)
+        return None
+
+    album_cover_url = "https://i.scdn.co/image/ab67616d0000b273b44de2c935f87a4734a09153"
+    if spotify_info.get('album', {}).get('images') and len(spotify_info['album']['images']) > 0:
+        album_cover_url = spotify_info['album']['images'][0]['url']
+
+    preview_url = spotify_info.get('preview_url')  # Get preview URL directly from Spotify
+
+    return {
+        "id": spotify_info['id'],
+        "name": track_name,
+        "artist": artist_name,
+        "album_cover_url": album_cover_url,
+        "uri": spotify_info['uri'],
+        "preview_url": preview_url,
+        "seed_track_name": recommend_request.track_name,
+        "seed_artist_name": recommend_request.artist_name
+    }
+
+async def search_spotify_info(track_name, artist_name, access_token, semaphore):
+    try:
+        async with semaphore:
+            spotify_info = await search_track_on_spotify_async(track_name, artist_name, access_token=access_token)
+        if should_log_score(enrichment_logger):
+            enrichment_logger.debug("Spotify search for '%s' by '%s': %s", track_name, artist_name, spotify_info is not None)
+        return spotify_info
+    except Exception as e:
+        enrichment_logger.warning("Error searching Spotify for '%s' by '%s': %s", track_name, artist_name, e)
+        return None
+
+async def resolve_spotify_batch(resolver):
+    try:
+        return await resolver.resolve_async()
+    except Exception as e:
+        print(f"[Backend] Error resolving Spotify tracks batch: {e}")
+        return {}
+
+async def resolve_spotify_infos(names, access_token, user_id):
+    """
+    Resolve (track_name, artist_name) pairs on Spotify; returns a list aligned with names
+    holding the slim Spotify track or None. Cached tracks cost nothing, tracks with a known
+    Spotify id are fetched together through /v1/tracks, and only the rest are searched, at
+    most ENRICHMENT_MAX_CONCURRENCY at a time. Lookups still pending when the budget runs
+    out are dropped instead of blocking the response.
+    """
+    if not access_token:
+        print(f"[Backend] No access token - skipping Spotify search for {len(names)} tracks")
+        return [None] * len(names)
+
+    spotify_infos = [None] * len(names)
+    known_ids = {}          # {index: spotify_id}
+    search_tasks = {}       # {index: task}
+    resolver = TrackBatchResolver(access_token)
+    semaphore = asyncio.Semaphore(ENRICHMENT_MAX_CONCURRENCY)
+
+    for i, (track_name, artist_name) in enumerate(names):
+        cached, spotify_id = find_cached_track(track_name, artist_name)
+        if cached is not MISSING:
+            spotify_infos[i] = cached
+        elif spotify_id:
+            known_ids[i] = spotify_id
+            resolver.add(spotify_id)
+        else:
+            search_tasks[i] = asyncio.create_task(search_spotify_info(track_name, artist_name, access_token, semaphore))
+
+    tasks = list(search_tasks.values())
+    batch_task = None
+    if resolver.pending:
+        batch_task = asyncio.create_task(resolve_spotify_batch(resolver))
+        tasks.append(batch_task)
+
+    done, not_done = await asyncio.wait(tasks, timeout=ENRICHMENT_BUDGET_SECONDS) if tasks else (set(), set())
+    for task in not_done:
+        task.cancel()
+    if not_done:
+        print(f"[Backend] Dropped {len(not_done)} slow Spotify lookups for user {user_id}")
+
+    for i, task in search_tasks.items():
+        if task in done:
+            spotify_infos[i] = task.result()
+    if batch_task in done:
+        resolved = batch_task.result()
+        for i, spotify_id in known_ids.items():
+            if spotify_id in resolved:
+                spotify_infos[i] = resolved[spotify_id]
+                remember_track(names[i][0], names[i][1], resolved[spotify_id])
+    return spotify_infos
+
+# Candidate pools per seed: Last.fm candidates already resolved on Spotify, shared by every user.
+# Requests for a warm seed only run the user's bandit over the pool.
+pool_lastfm = LastFMClient()
+pool_sources = build_sources()
+
+async def fetch_artist_tags(artists):
+    """
+    Top Last.fm tags of the artists whose tags the linear bandits do not know yet,
+    kept in storage too so a restarted worker rebuilds a user's model with the same features.
+    An artist whose lookup fails is left out and tried again on its next appearance.
+    """
+    missing = missing_artist_tags({artist.casefold() for artist in artists})
+    if not missing:
+        return
+    semaphore = asyncio.Semaphore(ENRICHMENT_MAX_CONCURRENCY)
+
+    async def top_tags(artist):
+        try:
+            async with semaphore:
+                tags = await asyncio.wait_for(pool_lastfm.get_artist_top_tags_async(artist), CANDIDATE_SOURCE_TIMEOUT)
+        except Exception:
+            return artist, None
+        return artist, [tag["name"] for tag in tags if tag.get("name")][:LINEAR_BANDIT_ARTIST_TAGS]
+
+    with span("artist_tags"):
+        results = await asyncio.gather(*(top_tags(artist) for artist in missing))
+    found = {artist: tags for artist, tags in results if tags is not None}
+    remember_artist_tags(found)
+    if write_behind and found:
+        write_behind.put_artist_tags(found)
+
+async def gather_seed_candidates(track_name, artist_name, tag=None):
+    """Deduplicated Last.fm candidates for a seed from every source, fetched concurrently"""
+    with span("candidate_gathering"):
+        tracks_per_source = await fetch_all_async(pool_sources, pool_lastfm, track_name, artist_name, tag)
+        tracks = dedupe_candidates(t for tracks in tracks_per_source for t in tracks)
+    if BANDIT_TYPES[BANDIT_MODE].uses_artist_tags:
+        # Features for the linear bandits, before anything is scored
+        await fetch_artist_tags(artist_of(t["id"]) for t in tracks)
+    return tracks
+
+async def build_candidate_pool(mode, track_name, artist_name, tag, access_token):
+    """CandidatePoolStore builder: gather candidates for a seed and attach their Spotify cards"""
+    started = time.perf_counter()
+    tracks = await gather_seed_candidates(track_name, artist_name, tag if mode == "tag" else None)
+
+    # Background rebuilds have no user: search with the app token (results are not user-specific)
+    if not access_token:
+        access_token = await get_spotify_access_token_for_sdk()
+    names = [get_track_names(track) for track in tracks]
+    with span("spotify_enrichment"):
+        spotify_infos = await resolve_spotify_infos(names, access_token, "candidate-pool")
+
+    seed_request = RecommendRequest(track_name=track_name, artist_name=artist_name)
+    candidates = []
+    for track, (name, artist), spotify_info in zip(tracks, names, spotify_infos):
+        card = build_recommendation_card(name, artist, spotify_info, seed_request)
+        if card:
+            candidates.append({"id": track["id"], "card": card})
+    print(f"[Backend] Built {mode} candidate pool for '{track_name}' / '{artist_name}': "
+          f"{len(candidates)}/{len(tracks)} on Spotify in {time.perf_counter() - started:.2f}s")
+    return candidates
+
+candidate_pools = CandidatePoolStore(build_candidate_pool)
+
+# Fire-and-forget work (pool warming); the loop only keeps weak references to tasks
+background_tasks = set()
+
+def run_in_background(coroutine):
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def session_access_token(request: Request):
+    """The logged-in user's Spotify token, or None"""
+    session_data = await shared_state.run(session_store.get, request.cookies.get("session_id"))
+    return session_data.get("access_token") if session_data else None
+
+def rank_pool(recommender, pool, seed_track_name, seed_artist_name, limit, exclude_card_ids=(), remember=True):
+    """Per-user part of a recommendation: bandit scoring and filtering over a shared pool"""
+    with span("ranking"):
+        ranked = recommender.rank_candidates(
+            # copies, the pool is shared
+            [dict(candidate) for candidate in pool.candidates if candidate["card"]["id"] not in exclude_card_ids],
+            limit=limit,
+            remember=remember
+        )
+    return [
+        {
+            **candidate["card"],
+            "seed_track_name": seed_track_name,
+            "seed_artist_name": seed_artist_name
+        }
+        for candidate in ranked
+    ]
+
+def served_ids(user_data_obj, seed, reset=False):
+    """Spotify ids already handed to this user for a seed (shown or rated), so refills skip them"""
+    served = user_data_obj.get("served")
+    if reset or served is None or served["seed"] != seed:
+        served = user_data_obj["served"] = {"seed": seed, "ids": set()}
+        user_data_obj.pop("next_batch", None)
+    return served["ids"]
+
+async def prefetch_next_batch(user_id, seed):
+    """
+    Rank the next batch for a seed with the user's current bandit and park it on the user,
+    so /recommendations/next can answer without doing any work. Runs after every feedback.
+    Nothing is recorded as recommended here: /recommendations/next does that for what it hands out.
+    """
+    user_data_obj = user_data.get(user_id)
+    if user_data_obj is None:
+        return
+    track_name, artist_name = seed
+    pool = await candidate_pools.get("track", track_name, artist_name)
+    if not pool.candidates:
+        pool = await candidate_pools.get("artist", artist_name=artist_name)
+    cards = rank_pool(
+        user_data_obj["recommender"], pool, track_name, artist_name,
+        limit=PREFETCH_BATCH_SIZE, exclude_card_ids=served_ids(user_data_obj, seed), remember=False
+    )
+    user_data_obj["next_batch"] = {"seed": seed, "cards": cards}
+
+def schedule_prefetch(user_id, user_data_obj, seed):
+    previous = user_data_obj.get("prefetch_task")
+    if previous is not None and not previous.done():
+        previous.cancel()  # ranked with an older bandit state
+    user_data_obj["prefetch_task"] = run_in_background(prefetch_next_batch(user_id, seed))
+
+async def resolve_ranked_as_completed(ranked, access_token):
+    """Yield (rank, spotify_info) for ranked Last.fm candidates as each lookup finishes, within the budget"""
+    semaphore = asyncio.Semaphore(ENRICHMENT_MAX_CONCURRENCY)
+
+    async def resolve(rank, track_name, artist_name):
+        cached, _ = find_cached_track(track_name, artist_name)
+        if cached is not MISSING:
+            return rank, cached
+        return rank, await search_spotify_info(track_name, artist_name, access_token, semaphore)
+
+    pending = {
+        asyncio.create_task(resolve(rank, *get_track_names(candidate)))
+        for rank, candidate in enumerate(ranked)
+    }
+    deadline = time.monotonic() + ENRICHMENT_BUDGET_SECONDS
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+def settled_top_ranks(n, cards, settled, limit):
+    """
+    Ranks (< n) certain to be among the first `limit` that resolve to a card, whatever the
+    lookups still in flight return: a rank with a card and fewer than `limit` ranks ahead
+    of it that have a card or are unsettled. cards is {rank: card}; settled the finished ranks.
+    """
+    ranks = []
+    ahead = 0
+    for rank in range(n):
+        if ahead >= limit:
+            break
+        if rank in cards:
+            ranks.append(rank)
+        if rank in cards or rank not in settled:
+            ahead += 1
+    return ranks
+
+async def stream_recommendations(user_data_obj, recommend_request, access_token, user_id):
+    """
+    NDJSON lines for /recommendations/stream: {"type": "track", "rank": n, "track": card} per
+    track, then {"type": "done", "count": n}. A warm seed is emitted at once from its pool; for
+    a cold seed the user's bandit ranks the raw Last.fm candidates and sends the best `limit`
+    of them found on Spotify, each as soon as its place in that set is certain (see
+    settled_top_ranks), while the pool for the seed is built in the background.
+    "rank" orders the cards, so the client can place those that arrive out of order.
+    """
+    def line(payload):
+        with span("serialization"):
+            return json.dumps(payload) + "\n"
+
+    recommender = user_data_obj["recommender"]
+    served = served_ids(user_data_obj, (recommend_request.track_name, recommend_request.artist_name), reset=True)
+    limit = recommend_request.num_recommendations
+    pool = candidate_pools.peek("track", recommend_request.track_name, recommend_request.artist_name)
+    if pool is None:
+        run_in_background(candidate_pools.get(
+            "track", recommend_request.track_name, recommend_request.artist_name, access_token=access_token
+        ))
+        candidates = await gather_seed_candidates(recommend_request.track_name, recommend_request.artist_name)
+        if not access_token:
+            access_token = await get_spotify_access_token_for_sdk()
+
+        if candidates:
+            # Rank more than needed: some candidates are not on Spotify. Only the tracks
+            # actually sent count as recommended for the bandit's repeat penalty.
+            with span("ranking"):
+                ranked = recommender.rank_candidates(candidates, limit=2 * limit, remember=False)
+            cards, settled, emitted = {}, set(), {}  # emitted: {rank: arm id}
+
+            def emit(settled_ranks):
+                """Lines for the ranks whose place in the top `limit` just became certain"""
+                lines = []
+                for rank in settled_top_ranks(len(ranked), cards, settled_ranks, limit):
+                    if rank not in emitted:
+                        served.add(cards[rank]["id"])
+                        emitted[rank] = ranked[rank]["id"]
+                        lines.append(line({"type": "track", "rank": rank, "track": cards[rank]}))
+                return lines
+
+            resolved = resolve_ranked_as_completed(ranked, access_token)
+            try:
+                async for rank, spotify_info in resolved:
+                    settled.add(rank)
+                    card = build_recommendation_card(*get_track_names(ranked[rank]), spotify_info, recommend_request)
+                    if card:
+                        cards[rank] = card
+                    for track_line in emit(settled):
+                        yield track_line
+                    if len(emitted) >= limit:
+                        break
+                # Out of budget: lookups still in flight count as not found
+                for track_line in emit(range(len(ranked))):
+                    yield track_line
+            finally:
+                await resolved.aclose()  # cancel lookups we no longer need
+                recommender.remember_recommended(emitted.values())
+            count = len(emitted)
+            print(f"[Backend] Streamed {count} recommendations for user {user_id} (cold seed)")
+            yield line({"type": "done", "count": count})
+            return
+
+    if pool is None or not pool.candidates:
+        pool = await candidate_pools.get("artist", artist_name=recommend_request.artist_name, access_token=access_token)
+    cards = rank_pool(recommender, pool, recommend_request.track_name, recommend_request.artist_name, limit) if pool.candidates else []
+    served.update(card["id"] for card in cards)
+    for rank, card in enumerate(cards):
+        yield line({"type": "track", "rank": rank, "track": card})
+    if not cards:
+        yield line({"type": "error", "detail": "Could not generate recommendations. Try different track/artist names."})
+    yield line({"type": "done", "count": len(cards)})
 
 # --- Initialization ---
 print(f"[Backend] Initializing with LASTFM_API_KEY: {bool(LASTFM_API_KEY)}")
@@ -148,13 +647,199 @@ print(f"[Backend] SPOTIFY_CLIENT_SECRET: {bool(SPOTIFY_CLIENT_SECRET)}")
 try:
     # Test initialization
     test_client = LastFMClient()
-    test_bandit = ThompsonSampling()
+    test_bandit = build_bandit()
     test_recommender = Recommender(test_client, test_bandit)
     print("[Backend] Recommender system components initialized successfully")
 except Exception as e:
     print(f"Error during initialization: {e}")
 
-app = FastAPI()
+async def run_maintenance():
+    """One maintenance pass: evict idle/LRU users, spill their writes, expire sessions"""
+    evicted_idle, evicted_lru = cleanup_old_users()
+    if write_behind and (evicted_idle or evicted_lru):
+        # Evicted users now exist only in storage, so don't leave their updates buffered
+        await asyncio.to_thread(write_behind.flush)
+    expired_sessions = await asyncio.to_thread(session_store.sweep)
+    if storage:
+        # Stored rows carry refresh tokens, so don't keep them past the session
+        expired_sessions += await asyncio.to_thread(storage.purge_expired_sessions)
+    # Rebuild busy pools that would go stale before the next pass
+    candidate_pools.refresh_expiring(margin=MAINTENANCE_INTERVAL)
+    idle_clients = sweep_rate_limiters()
+    spotify_client.sweep()
+
+    maintenance_stats.update({
+        "resident_users": len(user_data),
+        "evicted_idle": evicted_idle,
+        "evicted_lru": evicted_lru,
+        "expired_sessions": expired_sessions,
+        "idle_rate_limit_clients": idle_clients,
+        "last_run": time.time(),
+    })
+    if evicted_idle or evicted_lru or expired_sessions:
+        print(f"[Backend] Maintenance: evicted {evicted_idle} idle + {evicted_lru} LRU users, "
+              f"expired {expired_sessions} session entries, {len(user_data)} users resident")
+
+def sessions_expiring_within(seconds):
+    """
+    (session_id, session_data) for sessions whose Spotify token can and should be refreshed soon.
+    Sessions past their own expiry are deleted instead, and a token that outlives its
+    session is left alone.
+    """
+    now = time.time()
+    cutoff = now + seconds
+    expiring = []
+    for session_id in list(user_sessions):
+        session_data = user_sessions.get(session_id)  # may have expired since the key scan
+        if not session_data or not session_data.get("refresh_token"):
+            continue
+        session_expires_at = session_data.get("session_expires_at", float("inf"))  # set on the next create()
+        if session_expires_at <= now:
+            if session_store.delete(session_id) and write_behind:
+                write_behind.delete_session(session_id)
+        elif session_data.get("expires_at", 0) < min(cutoff, session_expires_at):
+            expiring.append((session_id, session_data))
+    return expiring
+
+async def refresh_session_token(session_id, session_data):
+    # One worker refreshes a given session; the others see the new token through shared state
+    if await shared_state.run(shared_state.incr, f"token_refresh_lock:{session_id}", ttl=30) != 1:
+        return False
+    try:
+        token_data = await refresh_spotify_token(session_data["refresh_token"])
+    except TokenRefreshError as e:
+        print(f"[Backend] Could not refresh Spotify token for session of {session_data.get('user_id')}: {e}")
+        return False
+    updated = await shared_state.run(
+        session_store.update_token,
+        session_id,
+        token_data["access_token"],
+        time.time() + token_data.get("expires_in", 3600),
+        token_data.get("refresh_token")
+    )
+    if updated and write_behind:
+        write_behind.put_session(session_id, updated)
+    return updated is not None
+
+async def refresh_tokens():
+    """Refresh every Spotify token that expires within SPOTIFY_TOKEN_REFRESH_MARGIN, off the request path"""
+    refreshed = 0
+    expiring = await asyncio.to_thread(sessions_expiring_within, SPOTIFY_TOKEN_REFRESH_MARGIN)
+    for session_id, session_data in expiring:
+        refreshed += await refresh_session_token(session_id, session_data)
+
+    if await shared_state.run(spotify_auth_manager.expires_within, SPOTIFY_TOKEN_REFRESH_MARGIN):
+        try:
+            await spotify_auth_manager.refresh_token_async()
+            refreshed += 1
+        except Exception as e:
+            print(f"[Backend] Could not refresh the app's Spotify token: {e}")
+
+    client_credentials_token = await shared_state.run(shared_state.get, CLIENT_CREDENTIALS_KEY)
+    if client_credentials_token and client_credentials_token.get("expires_at", 0) < time.time() + SPOTIFY_TOKEN_REFRESH_MARGIN:
+        if await fetch_client_credentials_token():
+            refreshed += 1
+
+    if refreshed:
+        print(f"[Backend] Refreshed {refreshed} Spotify tokens ahead of expiry")
+    return refreshed
+
+async def token_refresh_loop():
+    """Background task started in lifespan; requests never wait on a token refresh"""
+    while True:
+        await asyncio.sleep(SPOTIFY_TOKEN_REFRESH_INTERVAL)
+        try:
+            await refresh_tokens()
+        except Exception as e:
+            print(f"[Backend] Token refresh pass failed: {e}")
+
+async def maintenance_loop():
+    """Background task started in lifespan; keeps user_data and sessions bounded"""
+    while True:
+        await asyncio.sleep(MAINTENANCE_INTERVAL)
+        try:
+            await run_maintenance()
+        except Exception as e:
+            print(f"[Backend] Maintenance pass failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared keep-alive pools for Last.fm and Spotify, reused by every request
+    http_clients.startup()
+    if storage:
+        for session_id, session_data in storage.load_sessions().items():
+            session_store.create(session_id, session_data)
+        write_behind.start()
+        print(f"[Backend] Storage ready at {STORAGE_PATH} ({len(user_sessions)} sessions restored)")
+    maintenance = asyncio.create_task(maintenance_loop())
+    token_refresher = asyncio.create_task(token_refresh_loop())
+    yield
+    maintenance.cancel()
+    token_refresher.cancel()
+    await candidate_pools.aclose()
+    if write_behind:
+        write_behind.stop()
+        storage.close()
+    shared_state.close()
+    await http_clients.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+if RATE_LIMIT_ENABLED:
+    app.middleware("http")(rate_limit_middleware)
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    """Count and time every request by route template (not raw path, which would explode the label set)"""
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    route_path = route.path if route is not None else "unmatched"
+    http_requests.inc(route=route_path, method=request.method, status=response.status_code)
+    http_request_seconds.observe(time.perf_counter() - started, route=route_path)
+    return response
+
+@registry.register_collector
+def collect_metrics():
+    """Scrape-time gauges, and counters for totals that are already tracked elsewhere"""
+    pool_stats = candidate_pools.stats()
+    caches = {
+        "lastfm_memory": response_cache.memory.stats(),
+        "spotify_search": search_cache.stats(),
+        "spotify_id_index": spotify_id_index.stats(),
+        "candidate_pools": {name[len("cache_"):]: value for name, value in pool_stats.items() if name.startswith("cache_")},
+    }
+    if response_cache.disk is not None:
+        caches["lastfm_disk"] = response_cache.disk.stats()
+    flight_stats = {
+        lastfm_flight.name: lastfm_flight.stats(),
+        search_flight.name: search_flight.stats(),
+        "candidate_pool": {name[len("flight_"):]: value for name, value in pool_stats.items() if name.startswith("flight_")},
+    }
+    spotify_stats = spotify_client.stats()
+    return [
+        ("cache_hit_ratio", "Hit ratio since start", [({"cache": name}, stats["hit_ratio"]) for name, stats in caches.items()]),
+        ("cache_hits", "Cache hits since start", [({"cache": name}, stats["hits"]) for name, stats in caches.items()], "counter"),
+        ("cache_misses", "Cache misses since start", [({"cache": name}, stats["misses"]) for name, stats in caches.items()], "counter"),
+        ("cache_entries", "Entries held in memory caches", [({"cache": name}, stats.get("size")) for name, stats in caches.items()]),
+        ("singleflight_in_flight", "Upstream calls in flight", [({"flight": name}, stats["in_flight"]) for name, stats in flight_stats.items()]),
+        ("singleflight_shared", "Calls that joined an identical call in flight", [({"flight": name}, stats["shared"]) for name, stats in flight_stats.items()], "counter"),
+        ("candidate_pool_refreshing", "Candidate pools being rebuilt in the background", [({}, pool_stats["refreshing"])]),
+        ("candidate_pool_refreshes", "Background candidate pool rebuilds started", [({}, pool_stats["refreshes"])], "counter"),
+        ("spotify_rate_limited", "429 responses from Spotify", [({}, spotify_stats["rate_limited"])], "counter"),
+        ("spotify_retries", "Retried Spotify calls", [({}, spotify_stats["retries"])], "counter"),
+        ("spotify_tokens", "Access tokens with a scheduling gate", [({}, spotify_stats["tokens"])]),
+        ("queue_depth", "Work waiting to be processed", [
+            ({"queue": "write_behind"}, write_behind.depth() if write_behind else 0),
+            ({"queue": "background_tasks"}, len(background_tasks)),
+            ({"queue": "candidate_source_threads"}, source_queue_depth()),
+        ]),
+        ("resident_users", "Users whose bandit is loaded in this worker", [({}, len(user_data))]),
+        ("maintenance_evicted_users", "Users evicted by the last maintenance pass", [
+            ({"reason": "idle"}, maintenance_stats["evicted_idle"]),
+            ({"reason": "lru"}, maintenance_stats["evicted_lru"]),
+        ]),
+        ("maintenance_last_run_timestamp", "When maintenance last ran", [({}, maintenance_stats["last_run"])]),
+    ]
 
 # --- API Models ---
 class RecommendRequest(BaseModel):
@@ -174,6 +859,12 @@ class RecommendOneRequest(BaseModel):
     seed_artist_name: str
     exclude_ids: list[str] = []
 
+class NextRecommendationsRequest(BaseModel):
+    seed_track_name: str
+    seed_artist_name: str
+    count: int = 4
+    exclude_ids: list[str] = []
+
 class DeleteTrackRequest(BaseModel):
     playlist_id: str
     track_id: str
@@ -209,6 +900,11 @@ async def read_index():
         </html>
         """)
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition for this worker"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/config")
 async def get_config():
     """Provide frontend configuration"""
@@ -229,12 +925,11 @@ async def spotify_login():
 async def spotify_callback(request: Request, code: str = Query(...)):
     """Handles the callback from Spotify after user authorization."""
     try:
-        token_info = spotify_auth_manager.get_token(code)
+        token_info = await spotify_auth_manager.get_token_async(code)
         
         # Get user profile to get user ID
         access_token = token_info["access_token"]
-        from spotify_player import get_user_profile
-        user_profile = get_user_profile(access_token)
+        user_profile = await get_user_profile_async(access_token)
         
         if not user_profile:
             raise HTTPException(status_code=500, detail="Failed to get user profile")
@@ -243,20 +938,23 @@ async def spotify_callback(request: Request, code: str = Query(...)):
         
         # Create session
         session_id = str(uuid.uuid4())
-        user_sessions[session_id] = {
+        session_data = {
             "user_id": user_id,
             "access_token": access_token,
             "refresh_token": token_info.get("refresh_token"),
             "expires_at": time.time() + token_info.get("expires_in", 3600),
             "user_profile": user_profile
         }
+        await shared_state.run(session_store.create, session_id, session_data)
+        if write_behind:
+            write_behind.put_session(session_id, session_data)
         
         # Initialize user data
-        get_or_create_user_data(user_id)
+        await get_or_create_user_data(user_id)
         
         # Set session cookie and redirect
         response = RedirectResponse("/?logged_in=true")
-        response.set_cookie("session_id", session_id, httponly=True, max_age=86400)  # 24 hours
+        response.set_cookie("session_id", session_id, httponly=True, max_age=SESSION_TTL)
         return response
         
     except Exception as e:
@@ -266,8 +964,9 @@ async def spotify_callback(request: Request, code: str = Query(...)):
 async def logout(request: Request):
     """Logout user and clean up session"""
     session_id = request.cookies.get("session_id")
-    if session_id and session_id in user_sessions:
-        del user_sessions[session_id]
+    if session_id and await shared_state.run(session_store.delete, session_id):
+        if write_behind:
+            write_behind.delete_session(session_id)
     
     response = RedirectResponse("/")
     response.delete_cookie("session_id")
@@ -277,20 +976,19 @@ async def logout(request: Request):
 async def spotify_sdk_token(request: Request):
     """Provides the Spotify Web Playback SDK token and user product type to the frontend."""
     try:
-        user_id = get_user_from_request(request)
+        user_id = await get_user_from_request(request)
         if not user_id:
             # Try to get Client Credentials token for non-authenticated requests
-            access_token = get_spotify_access_token_for_sdk()
+            access_token = await get_spotify_access_token_for_sdk()
             if not access_token:
                 raise HTTPException(status_code=401, detail="Spotify access token not available. Please log in.")
             return {"access_token": access_token, "token_type": "Bearer", "expires_in": 3600, "product_type": "free"}
         
         # Get user session
-        session_id = request.cookies.get("session_id")
-        if not session_id or session_id not in user_sessions:
+        session_data = await shared_state.run(session_store.get, request.cookies.get("session_id"))
+        if not session_data:
             raise HTTPException(status_code=401, detail="Invalid session. Please log in.")
         
-        session_data = user_sessions[session_id]
         access_token = session_data["access_token"]
         user_profile = session_data.get("user_profile", {})
         product_type = user_profile.get('product', 'free')
@@ -308,15 +1006,14 @@ async def spotify_sdk_token(request: Request):
 @app.get("/user_profile")
 async def user_profile_endpoint(request: Request):
     """Fetches the current user's profile information."""
-    user_id = get_user_from_request(request)
+    user_id = await get_user_from_request(request)
     if not user_id:
         raise HTTPException(status_code=401, detail="User not authenticated")
     
-    session_id = request.cookies.get("session_id")
-    if not session_id or session_id not in user_sessions:
+    session_data = await shared_state.run(session_store.get, request.cookies.get("session_id"))
+    if not session_data:
         raise HTTPException(status_code=401, detail="Invalid session")
     
-    session_data = user_sessions[session_id]
     user_profile = session_data.get("user_profile", {})
     
     if not user_profile:
@@ -328,25 +1025,27 @@ async def user_profile_endpoint(request: Request):
 @app.get("/playlists")
 async def get_playlists(request: Request):
     """Get user's local playlists"""
-    user_id = get_user_from_request(request)
+    user_id = await get_user_from_request(request)
     if not user_id:
         # Return empty playlists for non-authenticated users
         return {str(i): [] for i in range(6)}
     
-    user_data_obj = get_or_create_user_data(user_id)
+    user_data_obj = await get_or_create_user_data(user_id)
     return user_data_obj["playlists"]
 
 # --- Missing Reset Bandit Endpoint ---
 @app.post("/reset_bandit")
 async def reset_bandit(request: Request):
     """Reset the bandit algorithm scores"""
-    user_id = get_user_from_request(request)
+    user_id = await get_user_from_request(request)
     if not user_id:
         raise HTTPException(status_code=401, detail="User not authenticated")
     
-    user_data_obj = get_or_create_user_data(user_id)
+    user_data_obj = await get_or_create_user_data(user_id)
     # Reset the bandit algorithm
-    user_data_obj["recommender"] = Recommender(LastFMClient(), ThompsonSampling())
+    user_data_obj["recommender"] = new_recommender()
+    if write_behind:
+        write_behind.reset_arms(user_id)
     
     return {"message": "Bandit scores have been reset successfully"}
 
@@ -354,11 +1053,11 @@ async def reset_bandit(request: Request):
 @app.post("/remove_local_playlist_track")
 async def remove_local_playlist_track(request: Request, delete_request: DeleteTrackRequest):
     """Remove track from local playlist"""
-    user_id = get_user_from_request(request)
+    user_id = await get_user_from_request(request)
     if not user_id:
         raise HTTPException(status_code=401, detail="User not authenticated")
     
-    user_data_obj = get_or_create_user_data(user_id)
+    user_data_obj = await get_or_create_user_data(user_id)
     playlists = user_data_obj["playlists"]
     
     playlist_id = delete_request.playlist_id
@@ -373,6 +1072,7 @@ async def remove_local_playlist_track(request: Request, delete_request: DeleteTr
                                 (isinstance(track, str) and track != track_id)]
 
     if len(playlists[playlist_id]) < initial_len:
+        persist_playlists(user_id, playlists)
         return {"message": "Track removed successfully from local playlist"}
     else:
         raise HTTPException(status_code=404, detail="Track not found in local playlist")
@@ -380,11 +1080,11 @@ async def remove_local_playlist_track(request: Request, delete_request: DeleteTr
 @app.post("/add_track_to_local_playlist")
 async def add_track_to_local_playlist(request: Request, add_request: AddTrackRequest):
     """Add track to local playlist"""
-    user_id = get_user_from_request(request)
+    user_id = await get_user_from_request(request)
     if not user_id:
         raise HTTPException(status_code=401, detail="User not authenticated")
     
-    user_data_obj = get_or_create_user_data(user_id)
+    user_data_obj = await get_or_create_user_data(user_id)
     playlists = user_data_obj["playlists"]
     
     playlist_id = add_request.playlist_id
@@ -406,105 +1106,58 @@ async def add_track_to_local_playlist(request: Request, add_request: AddTrackReq
         return {"message": "Track already exists in local playlist"}
 
     playlists[playlist_id].append(track)
+    persist_playlists(user_id, playlists)
     return {"message": "Track added successfully to local playlist"}
 
 # --- API Endpoints ---
 @app.post("/recommendations")
-def get_recommendations_api(request: Request, recommend_request: RecommendRequest):
+async def get_recommendations_api(request: Request, recommend_request: RecommendRequest):
     """The main recommendation endpoint."""
-    user_id = get_user_from_request(request)
+    user_id = await get_user_from_request(request)
     if not user_id:
         raise HTTPException(status_code=401, detail="User not authenticated")
     
-    user_data_obj = get_or_create_user_data(user_id)
+    user_data_obj = await get_or_create_user_data(user_id)
     recommender = user_data_obj["recommender"]
     
     print(f"[Backend] User {user_id} requested recommendations for: {recommend_request.track_name} - {recommend_request.artist_name}")
 
     try:
-        # Get track recommendations from the recommender module
-        lastfm_tracks = recommender.recommend_bulk(
-            mode="track",
-            track_name=recommend_request.track_name,
-            artist_name=recommend_request.artist_name,
-            limit=recommend_request.num_recommendations
-        )
-        print(f"[Backend] Last.fm returned {len(lastfm_tracks)} tracks for user {user_id}")
+        # Spotify token for cold seeds, preferring the user's own
+        access_token = await session_access_token(request)
 
-        if not lastfm_tracks:
-            print(f"[Backend] No tracks from Last.fm for user {user_id}, trying fallback...")
-            lastfm_tracks = recommender.recommend_bulk(
-                mode="artist",
-                track_name="",
+        # Ready-made candidates for this seed (built now only if the seed is cold)
+        with span("candidate_pool"):
+            pool = await candidate_pools.get(
+                "track",
+                track_name=recommend_request.track_name,
                 artist_name=recommend_request.artist_name,
-                limit=recommend_request.num_recommendations
+                access_token=access_token
             )
-            
-        if not lastfm_tracks:
-            raise HTTPException(status_code=404, detail="Could not generate recommendations from Last.fm. Try different track/artist names.")
+            if not pool.candidates:
+                print(f"[Backend] No candidates for the track seed for user {user_id}, trying artist fallback...")
+                pool = await candidate_pools.get(
+                    "artist",
+                    artist_name=recommend_request.artist_name,
+                    access_token=access_token
+                )
 
-        # Enrich with Spotify data
-        spotify_recommendations = []
-        access_token = get_spotify_access_token_for_sdk()
-        
-        # Try to get user's token if available
-        session_id = request.cookies.get("session_id")
-        if session_id and session_id in user_sessions:
-            user_token = user_sessions[session_id].get("access_token")
-            if user_token:
-                access_token = user_token
-        
-        print(f"[Backend] Using Spotify token for user {user_id}: {bool(access_token)}")
-        
-        for track in lastfm_tracks:
-            try:
-                artist = track.get('artist', {})
-                if isinstance(artist, dict):
-                    artist_name = artist.get('name', 'Unknown Artist')
-                else:
-                    artist_name = str(artist) if artist else 'Unknown Artist'
-                    
-                track_name = track.get('name', 'Unknown Track')
+        if not pool.candidates:
+            raise HTTPException(status_code=404, detail="Could not generate recommendations. Try different track/artist names.")
 
-                if access_token:
-                    spotify_info = search_track_on_spotify(track_name, artist_name, access_token=access_token)
-                    print(f"[Backend] Spotify search for '{track_name}' by '{artist_name}': {spotify_info is not None}")
-                else:
-                    print(f"[Backend] No access token - skipping Spotify search for '{track_name}'")
-                    spotify_info = None
-
-                if spotify_info and spotify_info.get('id'):
-                    album_cover_url = "https://i.scdn.co/image/ab67616d0000b273b44de2c935f87a4734a09153"
-                    if spotify_info.get('album', {}).get('images') and len(spotify_info['album']['images']) > 0:
-                        album_cover_url = spotify_info['album']['images'][0]['url']
-
-                    preview_url = spotify_info.get('preview_url')  # Get preview URL directly from Spotify
-                        
-                    spotify_recommendations.append({
-                        "id": spotify_info['id'],
-                        "name": track_name,
-                        "artist": artist_name,
-                        "album_cover_url": album_cover_url,
-                        "uri": spotify_info['uri'],
-                        "preview_url": preview_url,
-                        "seed_track_name": recommend_request.track_name,
-                        "seed_artist_name": recommend_request.artist_name
-                    })
-                else:
-                    print(f"[Backend] Could not find '{track_name}' by '{artist_name}' on Spotify")
-                    
-            except Exception as e:
-                print(f"[Backend] Error processing track {track}: {e}")
-                continue
-        
-        print(f"[Backend] Final Spotify recommendations count for user {user_id}: {len(spotify_recommendations)}")
-
-        final_recommendations = spotify_recommendations[:recommend_request.num_recommendations]
+        final_recommendations = rank_pool(
+            recommender, pool, recommend_request.track_name, recommend_request.artist_name,
+            limit=recommend_request.num_recommendations
+        )
+        seed = (recommend_request.track_name, recommend_request.artist_name)
+        served_ids(user_data_obj, seed, reset=True).update(card["id"] for card in final_recommendations)
+        print(f"[Backend] Final Spotify recommendations count for user {user_id}: {len(final_recommendations)} (pool of {len(pool.candidates)})")
 
         if not final_recommendations:
             raise HTTPException(status_code=404, detail="Could not find any of the recommended tracks on Spotify. Try different search terms.")
 
-        return {"recommendations": final_recommendations}
+        with span("serialization"):
+            return JSONResponse({"recommendations": final_recommendations})
 
     except HTTPException:
         raise
@@ -514,14 +1167,81 @@ def get_recommendations_api(request: Request, recommend_request: RecommendReques
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/recommendations/stream")
+async def stream_recommendations_api(request: Request, recommend_request: RecommendRequest):
+    """Streaming variant of /recommendations: newline-delimited JSON, one line per track as it resolves."""
+    user_id = await get_user_from_request(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="User not authenticated")
+
+    user_data_obj = await get_or_create_user_data(user_id)
+    print(f"[Backend] User {user_id} requested streamed recommendations for: {recommend_request.track_name} - {recommend_request.artist_name}")
+    return StreamingResponse(
+        stream_recommendations(user_data_obj, recommend_request, await session_access_token(request), user_id),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/recommendations/next")
+async def next_recommendations_api(request: Request, next_request: NextRecommendationsRequest):
+    """
+    Cheap refill for the feedback loop: hands out tracks from the batch prefetched after the
+    last feedback, ranking a new batch from the seed's pool only when that one has run out.
+    """
+    user_id = await get_user_from_request(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="User not authenticated")
+
+    user_data_obj = await get_or_create_user_data(user_id)
+    seed = (next_request.seed_track_name, next_request.seed_artist_name)
+
+    # Feedback usually lands a moment before this call; give its prefetch a moment to finish.
+    # asyncio.wait neither cancels the task on timeout nor raises its errors, while a
+    # cancellation of this request (client gone) still propagates.
+    prefetch_task = user_data_obj.get("prefetch_task")
+    if prefetch_task is not None and not prefetch_task.done():
+        done, _ = await asyncio.wait({prefetch_task}, timeout=PREFETCH_WAIT_TIMEOUT)
+        if not done:
+            print(f"[Backend] Prefetch for user {user_id} still running after {PREFETCH_WAIT_TIMEOUT}s, ranking directly")
+        elif not prefetch_task.cancelled() and prefetch_task.exception() is not None:
+            print(f"[Backend] Prefetch for user {user_id} failed: {prefetch_task.exception()!r}")
+
+    served = served_ids(user_data_obj, seed)
+    served.update(next_request.exclude_ids)
+    batch = user_data_obj.get("next_batch")
+    cards = [card for card in batch["cards"] if card["id"] not in served] if batch and batch["seed"] == seed else []
+
+    if len(cards) < next_request.count:
+        try:
+            await prefetch_next_batch(user_id, seed)
+        except Exception as e:
+            print(f"[Backend] Error ranking next batch for user {user_id}: {e}")
+        cards = user_data_obj.get("next_batch", {}).get("cards", [])
+
+    handed_out = cards[:next_request.count]
+    served.update(card["id"] for card in handed_out)
+    user_data_obj["recommender"].remember_recommended(track_arm_id(card["name"], card["artist"]) for card in handed_out)
+    user_data_obj["next_batch"] = {"seed": seed, "cards": cards[next_request.count:]}
+    return {"recommendations": handed_out}
+
+def feedback_arm_id(feedback_request: FeedbackRequest):
+    """
+    Bandit arm a rating is for. The player sends the Spotify id as track_id, but arms
+    (and the linear bandits' features) are keyed by "Track - Artist", so use the card's names.
+    """
+    track_info = feedback_request.track_info or {}
+    if track_info.get("name") and track_info.get("artist"):
+        return track_arm_id(track_info["name"], track_info["artist"])
+    return feedback_request.track_id
+
 @app.post("/feedback")
-def post_feedback(request: Request, feedback_request: FeedbackRequest):
+async def post_feedback(request: Request, feedback_request: FeedbackRequest):
     """Receives user feedback and updates the bandit algorithm."""
-    user_id = get_user_from_request(request)
+    user_id = await get_user_from_request(request)
     if not user_id:
         raise HTTPException(status_code=401, detail="User not authenticated")
     
-    user_data_obj = get_or_create_user_data(user_id)
+    user_data_obj = await get_or_create_user_data(user_id)
     recommender = user_data_obj["recommender"]
     playlists = user_data_obj["playlists"]
     
@@ -529,7 +1249,15 @@ def post_feedback(request: Request, feedback_request: FeedbackRequest):
         # Convert rating (0-5) to a reward (0.0-1.0)
         reward = feedback_request.rating / 5.0 if feedback_request.rating > 0 else 0.0
         
-        recommender.give_feedback(feedback_request.track_id, reward)
+        arm_id = feedback_arm_id(feedback_request)
+        recommender.give_feedback(arm_id, reward)
+        if write_behind:
+            write_behind.put_arm(user_id, arm_id, reward)
+
+        # Rank the next refill with the updated bandit while the user looks at the cards
+        seed = (feedback_request.seed_track_name, feedback_request.seed_artist_name)
+        served_ids(user_data_obj, seed).add(feedback_request.track_id)
+        schedule_prefetch(user_id, user_data_obj, seed)
         print(f"[Backend] User {user_id} gave feedback for {feedback_request.track_id} with rating {feedback_request.rating} (reward: {reward})")
 
         # Store in user's playlists
@@ -552,6 +1280,7 @@ def post_feedback(request: Request, feedback_request: FeedbackRequest):
             
             if track_id not in existing_track_ids:
                 playlists[rating_key].append(track_info)
+                persist_playlists(user_id, playlists)
         
         return {"message": "Feedback processed successfully"}
     except Exception as e:
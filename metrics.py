@@ -0,0 +1,195 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; tuned for the request path (sub-millisecond pool hits up to slow upstream calls)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # {label values: count}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, "") for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name + "_total", list(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram, rendered the way Prometheus expects"""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # {label values: [bucket counts..., sum, count]}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels.get(name, "") for name in self.labelnames))
+        return series[-1] if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(values)) for key, values in self._series.items()]
+        for key, values in series:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, values):
+                cumulative += bucket_count
+                yield self.name + "_bucket", pairs + [("le", _format_value(bound))], cumulative
+            yield self.name + "_bucket", pairs + [("le", "+Inf")], values[-1]
+            yield self.name + "_sum", pairs, values[-2]
+            yield self.name + "_count", pairs, values[-1]
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics in the Prometheus text format, without the client library.
+    Counters and histograms are updated on the hot path; everything that is already
+    tracked elsewhere (cache stats, queue depths) is read by collectors at scrape time.
+    Each worker exposes its own numbers, so scrape every worker or aggregate by instance.
+    """
+
+    def __init__(self, prefix="webplayer"):
+        self.prefix = prefix
+        self._metrics = {}
+        self._collectors = []  # [fn() -> [(name, documentation, [(labels dict, value), ...][, type]), ...]]
+        self._lock = threading.Lock()
+
+    def _register(self, metric_type, name, *args, **kwargs):
+        full_name = f"{self.prefix}_{name}"
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = metric_type(full_name, *args, **kwargs)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector):
+        """
+        collector() is called on every scrape and returns (name, documentation, samples) for gauges,
+        or (name, documentation, samples, "counter") for totals kept elsewhere (rendered as name_total)
+        """
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for sample_name, pairs, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(pairs)} {_format_value(value)}")
+        for collector in self._collectors:
+            try:
+                collected = collector()
+            except Exception as e:
+                print(f"[Metrics] Collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, documentation, samples, *metric_type in collected:
+                metric_type = metric_type[0] if metric_type else "gauge"
+                full_name = f"{self.prefix}_{name}"
+                sample_name = full_name + "_total" if metric_type == "counter" else full_name
+                lines.append(f"# HELP {full_name} {documentation}")
+                lines.append(f"# TYPE {full_name} {metric_type}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f"{sample_name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "stage_seconds", "Time spent in each stage of serving recommendations", ("stage",)
+)
+candidate_source_seconds = registry.histogram(
+    "candidate_source_seconds", "Time for one Last.fm candidate source to answer", ("source", "outcome")
+)
+upstream_requests = registry.counter(
+    "upstream_requests", "Requests sent to Last.fm and Spotify", ("host", "status")
+)
+upstream_request_seconds = registry.histogram(
+    "upstream_request_seconds", "Upstream request latency", ("host",)
+)
+http_requests = registry.counter(
+    "http_requests", "Requests served, by route template", ("route", "method", "status")
+)
+http_request_seconds = registry.histogram(
+    "http_request_seconds", "Time to produce a response (streams: until the headers)", ("route",)
+)
+
+
+def span(stage):
+    """with span("bandit_scoring"): ... records the block's duration under stage_seconds"""
+    return stage_seconds.time(stage=stage)
+
+
+def record_upstream(host, status, elapsed):
+    upstream_requests.inc(host=host, status=status)
+    upstream_request_seconds.observe(elapsed, host=host)
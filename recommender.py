@@ -1,12 +1,50 @@
 from lastfm_client import LastFMClient
+from candidate_sources import build_sources, fetch_all
+import heapq
 import random
 import math
+import numpy as np
 from collections import deque
+from metrics import span
+from config import BANDIT_MODE
+from bandit.thompson_sampling import HierarchicalThompsonSampling, ThompsonSampling
+from bandit.epsilon_greedy import EpsilonGreedy
+from bandit.linear import LinearThompsonSampling, LinUCB
+
+BANDIT_TYPES = {
+    "thompson": ThompsonSampling,
+    "hierarchical_thompson": HierarchicalThompsonSampling,
+    "epsilon_greedy": EpsilonGreedy,
+    "linucb": LinUCB,
+    "linear_thompson": LinearThompsonSampling,
+}
+
+def build_bandit(mode=None, **kwargs):
+    """Instantiate a bandit by name (defaults to config.BANDIT_MODE)"""
+    return BANDIT_TYPES[mode or BANDIT_MODE](**kwargs)
+
+def track_arm_id(track_name, artist_name):
+    """The bandit arm of a track: "Track - Artist", as Last.fm names it"""
+    return f"{track_name} - {artist_name}"
+
+def dedupe_candidates(tracks):
+    """Drop repeated "Track - Artist" ids across sources, giving each kept track an "id" """
+    seen_ids = set()
+    unique = []
+    for t in tracks:
+        tid = track_arm_id(t['name'], t['artist']['name'])
+        if tid not in seen_ids:
+            t = dict(t)  # 캐시된 Last.fm 응답을 공유하므로 복사본에만 id/score 기록
+            t["id"] = tid
+            seen_ids.add(tid)
+            unique.append(t)
+    return unique
 
 class Recommender:
-    def __init__(self, lastfm_client, bandit):
+    def __init__(self, lastfm_client, bandit, sources=None):
         self.bandit = bandit
         self.lastfm = lastfm_client
+        self.sources = sources if sources is not None else build_sources()
         self.previous_ids = set()
         self.recently_recommended = deque(maxlen=3)
 
@@ -15,90 +53,79 @@ class Recommender:
         # 또는 이전 사용 이력 기반으로 유사 트랙 수집
         # 예시로: 가장 최근 좋아요한 트랙 → 유사곡 탐색
 
-        if not hasattr(self.bandit, "rewards"):
+        if not hasattr(self.bandit, "best_arm"):
             return []
 
-        # Step 1: 가장 높은 보상을 받은 트랙 ID 찾기
-        best_items = sorted(
-            self.bandit.rewards.items(),
-            key=lambda x: x[1][0] / (x[1][0] + x[1][1] + 1e-9),
-            reverse=True
-        )
-        if not best_items:
+        # Step 1: 가장 높은 보상을 받은 트랙 ID 찾기 (bandit이 update 때마다 유지, O(1))
+        best_item = self.bandit.best_arm()  # e.g., "Gravity - John Mayer"
+        if not best_item:
             return []
 
-        best_item = best_items[0][0]  # e.g., "Gravity - John Mayer"
-        name, artist = best_item.split(" - ")
+        name, artist = best_item.rsplit(" - ", 1)
 
         # Step 2: 유사곡 후보 수집
         candidates = self.gather_candidates(name, artist)
 
-        # Step 3: 점수 계산
+        # Step 3: 점수 계산 (후보 전체를 한 번에)
+        self.bandit.register_candidates(candidates)
+        scores = self.bandit.score_many([t["id"] for t in candidates])
         results = []
-        for t in candidates:
-            tid = f"{t['name']} - {t['artist']['name']}"
-            t["id"] = tid
-            t["score"] = self.bandit.get_score(tid)
+        for t, score in zip(candidates, scores):
+            t["score"] = float(score)
             results.append(t)
 
-        # Step 4: 상위 추천 추출
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return results[:top_k]
+        # Step 4: 상위 추천 추출 (전체 정렬 대신 top-k만 선택)
+        return heapq.nlargest(top_k, results, key=lambda x: x["score"])
 
     def gather_candidates(self, track_name, artist_name, tag=None):
-        tracks = []
-        seen_ids = set()
-
-        sim_tracks = self.lastfm.get_similar_tracks(track_name, artist_name, limit=30)
-        tracks.extend(sim_tracks)
-
-        artist_tracks = self.lastfm.get_top_tracks_by_artist(artist_name, limit=20)
-        tracks.extend(artist_tracks)
-
-        if tag:
-            tag_tracks = self.lastfm.get_top_tracks_by_tag(tag, limit=20)
-            tracks.extend(tag_tracks)
-
-        unique = []
-        for t in tracks:
-            tid = f"{t['name']} - {t['artist']['name']}"
-            if tid not in seen_ids:
-                t["id"] = tid
-                seen_ids.add(tid)
-                unique.append(t)
-        return unique
+        # 소스들은 서로 독립적이므로 동시에 조회 (느린 소스는 타임아웃 후 빈 결과)
+        tracks_per_source = fetch_all(self.sources, self.lastfm, track_name, artist_name, tag)
+        return dedupe_candidates(t for tracks in tracks_per_source for t in tracks)
 
     def recommend_bulk(self, mode, track_name="", artist_name="", tag="", limit=10, exclude_ids=None):
-        if exclude_ids is None:
-            exclude_ids = []
-        
         candidates = self.gather_candidates(track_name, artist_name, tag if mode == "tag" else None)
+        return self.rank_candidates(candidates, limit, exclude_ids)
 
-        results = []
-        for t in candidates:
-            tid = t["id"]
-            if tid in exclude_ids: # Skip if ID is in exclude_ids
-                continue
-
-            t["score"] = self.bandit.get_score(tid)
+    def rank_candidates(self, candidates, limit=10, exclude_ids=None, remember=True):
+        """
+        Top `limit` candidates by bandit score. With remember=False the result is not recorded
+        as recommended; the caller then reports what it actually showed via remember_recommended().
+        """
+        if exclude_ids is None:
+            exclude_ids = []
 
-            if tid in self.recently_recommended:
-                t["score"] *= 0.5
+        exclude_ids = set(exclude_ids)
+        results = [t for t in candidates if t["id"] not in exclude_ids] # Skip if ID is in exclude_ids
 
-            t["score"] += random.uniform(-0.2, 0.2)
-            results.append(t)
+        # 후보 전체를 한 번의 벡터 연산으로 점수화
+        with span("bandit_scoring"):
+            self.bandit.register_candidates(results)
+            scores = np.asarray(self.bandit.score_many([t["id"] for t in results]), dtype=np.float64)
+        recent = np.fromiter((t["id"] in self.recently_recommended for t in results), dtype=bool, count=len(results))
+        scores = np.where(recent, scores * 0.5, scores)
+        scores += np.random.uniform(-0.2, 0.2, size=len(results))
+        for t, score in zip(results, scores):
+            t["score"] = float(score)
 
         epsilon = 0.2
         if random.random() < epsilon:
             selected = random.sample(results, k=min(limit, len(results)))
+        elif limit < len(results):
+            # 전체 정렬 대신 상위 limit개만 부분 선택한 뒤 그것만 정렬
+            top = np.argpartition(-scores, limit - 1)[:limit] if limit > 0 else []
+            selected = sorted((results[i] for i in top), key=lambda x: x["score"], reverse=True)
         else:
-            results.sort(key=lambda x: x["score"], reverse=True)
-            selected = results[:limit]
+            selected = sorted(results, key=lambda x: x["score"], reverse=True)
 
-        self.previous_ids = set(r["id"] for r in selected)
-        self.recently_recommended.extend(self.previous_ids)
+        if remember:
+            self.remember_recommended(r["id"] for r in selected)
 
         return selected
 
+    def remember_recommended(self, item_ids):
+        """Record item ids as shown: previous_ids, and the repeat penalty in rank_candidates"""
+        self.previous_ids = set(item_ids)
+        self.recently_recommended.extend(self.previous_ids)
+
     def give_feedback(self, track_id, reward):
         self.bandit.update(track_id, reward)
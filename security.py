@@ -4,47 +4,118 @@ from fastapi import Request, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+import ipaddress
+import threading
 import time
 import jwt
 import os
 from typing import Optional
+from fastapi.responses import JSONResponse
+from shared_state import shared_state
+from config import RATE_LIMIT_SHARED, RATE_LIMITS, SPOTIFY_TOKEN_URL, TRUSTED_PROXIES
+from metrics import registry
 
 # Security configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 JWT_SECRET = os.getenv("JWT_SECRET", "your-jwt-secret-change-in-production")
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 
-# Rate limiting storage (in production, use Redis)
-rate_limit_storage = {}
-
 class RateLimiter:
-    def __init__(self, max_requests: int = 100, window_seconds: int = 3600):
+    """
+    Sliding-window counter: the estimate is this window's count plus the previous
+    window's count weighted by how much of it still overlaps the sliding window.
+    Each client costs two counters no matter how many requests it sends, and a
+    check is O(1).
+
+    With state=None the counters live in this process; with a SharedState every
+    worker and node increments the same counters, so the limit holds cluster-wide.
+    """
+
+    def __init__(self, max_requests: int = 100, window_seconds: int = 3600, state=None):
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-    
+        self.state = state
+        self._counters = {}  # local mode: {identifier: [window, previous_count, current_count]}
+        self._lock = threading.Lock()
+
+    def _window(self, now):
+        window = int(now // self.window_seconds)
+        elapsed = (now - window * self.window_seconds) / self.window_seconds
+        return window, elapsed
+
+    def _hit_local(self, identifier, window):
+        with self._lock:
+            counter = self._counters.get(identifier)
+            if counter is None:
+                counter = self._counters[identifier] = [window, 0, 0]
+            elif counter[0] != window:
+                # Roll forward; a gap of more than one window means the previous one was empty
+                counter[1] = counter[2] if counter[0] == window - 1 else 0
+                counter[2] = 0
+                counter[0] = window
+            counter[2] += 1
+            return counter[1], counter[2]
+
+    def _hit_shared(self, identifier, window):
+        key = f"ratelimit:{identifier}:"
+        # Keep each counter for two windows so it can serve as the "previous" one
+        current = self.state.incr(key + str(window), ttl=2 * self.window_seconds)
+        previous = self.state.get(key + str(window - 1)) or 0
+        return previous, current
+
     def is_allowed(self, identifier: str) -> bool:
-        current_time = time.time()
-        window_start = current_time - self.window_seconds
-        
-        if identifier not in rate_limit_storage:
-            rate_limit_storage[identifier] = []
-        
-        # Clean old requests
-        rate_limit_storage[identifier] = [
-            req_time for req_time in rate_limit_storage[identifier] 
-            if req_time > window_start
-        ]
-        
-        # Check if under limit
-        if len(rate_limit_storage[identifier]) >= self.max_requests:
-            return False
-        
-        # Add current request
-        rate_limit_storage[identifier].append(current_time)
-        return True
-
-# Create rate limiter instance
-rate_limiter = RateLimiter(max_requests=1000, window_seconds=3600)  # 1000 requests per hour
+        window, elapsed = self._window(time.time())
+        if self.state is None:
+            previous, current = self._hit_local(identifier, window)
+        else:
+            previous, current = self._hit_shared(identifier, window)
+        return previous * (1.0 - elapsed) + current <= self.max_requests
+
+    async def is_allowed_async(self, identifier: str) -> bool:
+        """is_allowed() for async callers: shared counters are updated off the event loop"""
+        if self.state is None:
+            return self.is_allowed(identifier)
+        return await self.state.run(self.is_allowed, identifier)
+
+    def sweep(self):
+        """Forget clients idle for two full windows; returns how many were dropped"""
+        if self.state is not None:
+            return 0  # shared counters expire through their TTL
+        window, _ = self._window(time.time())
+        with self._lock:
+            idle = [identifier for identifier, counter in self._counters.items() if counter[0] < window - 1]
+            for identifier in idle:
+                del self._counters[identifier]
+        return len(idle)
+
+def build_rate_limiters(limits, state=None):
+    """{route prefix: RateLimiter} from {route prefix: (max_requests, window_seconds)}"""
+    return {
+        route: RateLimiter(max_requests=max_requests, window_seconds=window_seconds, state=state)
+        for route, (max_requests, window_seconds) in limits.items()
+    }
+
+# Create rate limiter instances: one per configured route prefix, "default" for everything else
+rate_limiters = build_rate_limiters(RATE_LIMITS, state=shared_state if RATE_LIMIT_SHARED else None)
+rate_limiter = rate_limiters.get("default") or RateLimiter(max_requests=1000, window_seconds=3600)  # 1000 requests per hour
+# Longest prefix first, so /recommendations/stream can override /recommendations
+_limited_routes = sorted((route for route in rate_limiters if route != "default"), key=len, reverse=True)
+
+rate_limited_requests = registry.counter("rate_limited_requests", "Requests rejected with 429, by limit", ("route",))
+
+def limiter_for_path(path: str):
+    """(route, RateLimiter) that applies to a request path"""
+    for route in _limited_routes:
+        if path.startswith(route):
+            return route, rate_limiters[route]
+    return "default", rate_limiter
+
+def sweep_rate_limiters():
+    """Drop idle clients from every limiter (call periodically)"""
+    limiters = list(rate_limiters.values())
+    if rate_limiter not in limiters:
+        limiters.append(rate_limiter)
+    return sum(limiter.sweep() for limiter in limiters)
 
 def add_security_middleware(app):
     """Add security middleware to FastAPI app"""
@@ -68,12 +139,30 @@ def add_security_middleware(app):
             allowed_hosts=["your-domain.com", "your-app-name.onrender.com"]
         )
 
+trusted_proxies = [ipaddress.ip_network(entry, strict=False) for entry in TRUSTED_PROXIES]
+
+def is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
 def get_client_ip(request: Request) -> str:
-    """Get client IP address for rate limiting"""
-    forwarded = request.headers.get("X-Forwarded-For")
-    if forwarded:
-        return forwarded.split(",")[0].strip()
-    return request.client.host
+    """
+    Get client IP address for rate limiting. X-Forwarded-For is written by the client
+    as much as by proxies, so it only counts when the peer is a trusted proxy, and then
+    the client is the right-most hop that is not one of our proxies.
+    """
+    client_ip = request.client.host if request.client else "unknown"
+    if not is_trusted_proxy(client_ip):
+        return client_ip
+    hops = [hop.strip() for hop in request.headers.get("X-Forwarded-For", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+    # Every hop is one of ours: the left-most is as close to the client as we can get
+    return hops[0] if hops else client_ip
 
 async def rate_limit_middleware(request: Request, call_next):
     """Rate limiting middleware"""
@@ -84,10 +173,14 @@ async def rate_limit_middleware(request: Request, call_next):
         response = await call_next(request)
         return response
     
-    if not rate_limiter.is_allowed(client_ip):
-        raise HTTPException(
-            status_code=429, 
-            detail="Too many requests. Please try again later."
+    route, limiter = limiter_for_path(request.url.path)
+    if not await limiter.is_allowed_async(f"{route}:{client_ip}"):
+        rate_limited_requests.inc(route=route)
+        # Exceptions raised inside middleware bypass FastAPI's handlers, so answer directly
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Too many requests. Please try again later."},
+            headers={"Retry-After": str(limiter.window_seconds)}
         )
     
     response = await call_next(request)
@@ -118,8 +211,8 @@ class TokenRefreshError(Exception):
 
 async def refresh_spotify_token(refresh_token: str) -> dict:
     """Refresh Spotify access token"""
-    import httpx
     import base64
+    from http_clients import SPOTIFY_ACCOUNTS_HOST, http_clients
     
     auth_str = f"{os.getenv('SPOTIFY_CLIENT_ID')}:{os.getenv('SPOTIFY_CLIENT_SECRET')}"
     b64_auth = base64.b64encode(auth_str.encode()).decode()
@@ -133,8 +226,8 @@ async def refresh_spotify_token(refresh_token: str) -> dict:
         "refresh_token": refresh_token
     }
     
-    async with httpx.AsyncClient() as client:
-        response = await client.post("https://accounts.spotify.com/api/token", headers=headers, data=data)
+    client = http_clients.async_client(SPOTIFY_ACCOUNTS_HOST)
+    response = await client.post(SPOTIFY_TOKEN_URL, headers=headers, data=data)
     
     if response.status_code != 200:
         raise TokenRefreshError("Failed to refresh Spotify token")
@@ -0,0 +1,86 @@
+import time
+from shared_state import SharedMapping
+
+
+class SessionStore:
+    """
+    Login sessions plus a secondary index from Spotify access token to session id,
+    so a Bearer token resolves to its session with one key lookup instead of a scan
+    over every session. Both live in shared state; index entries expire together
+    with the token they point at. A session lives ttl seconds from login
+    (session_expires_at): refreshing its Spotify token does not extend it.
+    """
+
+    def __init__(self, state, ttl):
+        self.state = state
+        self.ttl = ttl
+        # {session_id: {user_id, access_token, refresh_token, expires_at, session_expires_at}}
+        self.sessions = SharedMapping(state, "session", ttl=ttl)
+
+    def _token_key(self, access_token):
+        return f"session_token:{access_token}"
+
+    def _index_token(self, session_id, session_data, session_ttl):
+        access_token = session_data.get("access_token")
+        if not access_token:
+            return
+        token_ttl = session_data.get("expires_at", time.time() + session_ttl) - time.time()
+        if token_ttl > 0:
+            self.state.set(self._token_key(access_token), session_id, ttl=min(token_ttl, session_ttl))
+
+    def create(self, session_id, session_data):
+        """
+        Store a new session (login, or a session restored from storage) and index its token.
+        Returns False, storing nothing, when the session is already past session_expires_at.
+        """
+        session_data.setdefault("session_expires_at", time.time() + self.ttl)
+        session_ttl = session_data["session_expires_at"] - time.time()
+        if session_ttl <= 0:
+            return False
+        self.sessions.set(session_id, session_data, ttl=session_ttl)
+        self._index_token(session_id, session_data, session_ttl)
+        return True
+
+    def get(self, session_id):
+        return self.sessions.get(session_id) if session_id else None
+
+    def update_token(self, session_id, access_token, expires_at, refresh_token=None):
+        """
+        Swap in a refreshed access token; the old token stops resolving immediately.
+        The session keeps its remaining lifetime. None if it is gone or has expired.
+        """
+        session_data = self.sessions.get(session_id)
+        if session_data is None:
+            return None
+        if session_data.get("access_token"):
+            self.state.delete(self._token_key(session_data["access_token"]))
+        session_data["access_token"] = access_token
+        session_data["expires_at"] = expires_at
+        if refresh_token:
+            session_data["refresh_token"] = refresh_token
+        return session_data if self.create(session_id, session_data) else None
+
+    def delete(self, session_id):
+        """Logout: drop the session and its token index entry"""
+        session_data = self.sessions.get(session_id)
+        if session_data is None:
+            return False
+        if session_data.get("access_token"):
+            self.state.delete(self._token_key(session_data["access_token"]))
+        del self.sessions[session_id]
+        return True
+
+    def session_id_for_token(self, access_token):
+        """Session id owning a live access token, or None"""
+        session_id = self.state.get(self._token_key(access_token))
+        if session_id is None:
+            return None
+        # Guard against an index entry that outlived a refresh on another worker
+        session_data = self.sessions.get(session_id)
+        if session_data is None or session_data.get("access_token") != access_token:
+            return None
+        return session_id
+
+    def sweep(self):
+        """Remove expired sessions and token index entries; called from a background task"""
+        return self.state.purge_expired()
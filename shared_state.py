@@ -0,0 +1,268 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from urllib.parse import urlparse
+from config import SHARED_STATE_URL
+
+
+class SharedState(ABC):
+    """
+    Small key/value interface for state that every worker (and every node) must see:
+    sessions, rate-limit counters, the app-level Spotify token, per-user versions.
+    Values are JSON-serializable; mutating a value you read does not change the store.
+    """
+
+    # Calls do I/O (a network round trip, a file lock), so async code goes through run()
+    blocking = True
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Call fn(*args, **kwargs), which uses this store, from async code without blocking
+        the event loop: on a worker thread for stores that do I/O, inline otherwise.
+        """
+        if not self.blocking:
+            return fn(*args, **kwargs)
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    @abstractmethod
+    def get(self, key):
+        """Stored value, or None if missing or expired"""
+
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    @abstractmethod
+    def incr(self, key, amount=1, ttl=None):
+        """Atomically add to an integer counter and return the new value. ttl applies when the key is created."""
+
+    @abstractmethod
+    def keys(self, prefix):
+        """Every live key starting with prefix"""
+
+    def purge_expired(self):
+        """Drop expired keys now instead of on the next read; returns how many were removed"""
+        return 0
+
+    def close(self):
+        pass
+
+
+class InMemoryState(SharedState):
+    """Process-local implementation: the default for a single worker"""
+
+    blocking = False
+
+    def __init__(self):
+        self._data = {}  # {key: (json_value, expires_at or None)}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key, time.time())
+        return json.loads(entry[0]) if entry else None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        encoded = json.dumps(value)
+        with self._lock:
+            self._data[key] = (encoded, expires_at)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            entry = self._live(key, time.time())
+            if entry is None:
+                value, expires_at = amount, (time.time() + ttl if ttl else None)
+            else:
+                value, expires_at = int(json.loads(entry[0])) + amount, entry[1]
+            self._data[key] = (json.dumps(value), expires_at)
+        return value
+
+    def keys(self, prefix):
+        now = time.time()
+        with self._lock:
+            return [key for key in list(self._data) if key.startswith(prefix) and self._live(key, now)]
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]
+            for key in expired:
+                del self._data[key]
+        return len(expired)
+
+
+class SQLiteState(SharedState):
+    """
+    Shared by every worker on one machine through a WAL-mode SQLite file.
+    Stands in for a networked store when running `uvicorn --workers N` on a single box.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl if ttl else None),
+        )
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def incr(self, key, amount=1, ttl=None):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM kv WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?", (key, now))
+            (value,) = conn.execute(
+                "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + ? "
+                "RETURNING CAST(value AS INTEGER)",
+                (key, str(amount), now + ttl if ttl else None, amount),
+            ).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def keys(self, prefix):
+        rows = self._conn().execute(
+            "SELECT key FROM kv WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at > ?)",
+            (prefix, prefix + "\U0010ffff", time.time()),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def purge_expired(self):
+        return self._conn().execute(
+            "DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        ).rowcount
+
+
+class RedisState(SharedState):
+    """Networked implementation for several nodes. Needs the optional `redis` package."""
+
+    def __init__(self, url):
+        import redis  # optional dependency, only needed for redis:// URLs
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key):
+        value = self._redis.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self._redis.set(key, json.dumps(value), ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self._redis.delete(key)
+
+    def incr(self, key, amount=1, ttl=None):
+        pipe = self._redis.pipeline()
+        pipe.incrby(key, amount)
+        if ttl:
+            pipe.expire(key, int(ttl), nx=True)
+        return int(pipe.execute()[0])
+
+    def keys(self, prefix):
+        return list(self._redis.scan_iter(match=prefix.replace("*", r"\*") + "*", count=500))
+
+    def close(self):
+        self._redis.close()
+
+
+def create_shared_state(url):
+    """memory:// (default), sqlite:///path/to/file.db or redis://host:port/db"""
+    parsed = urlparse(url)
+    if parsed.scheme in ("", "memory"):
+        return InMemoryState()
+    if parsed.scheme == "sqlite":
+        # sqlite:///relative.db or sqlite:////absolute/path.db
+        return SQLiteState(parsed.path[1:])
+    if parsed.scheme in ("redis", "rediss"):
+        return RedisState(url)
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url}")
+
+
+class SharedMapping(MutableMapping):
+    """
+    dict-like view over one key namespace of a SharedState, so code written against
+    a module-level dict (user_sessions) keeps working.
+    Values are copies: write the whole value back after changing it.
+    """
+
+    def __init__(self, state, namespace, ttl=None):
+        self.state = state
+        self.prefix = namespace + ":"
+        self.ttl = ttl
+
+    def __getitem__(self, key):
+        value = self.state.get(self.prefix + key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.state.set(self.prefix + key, value, ttl=self.ttl)
+
+    def set(self, key, value, ttl=None):
+        """self[key] = value with its own ttl instead of the mapping's"""
+        self.state.set(self.prefix + key, value, ttl=ttl or self.ttl)
+
+    def __delitem__(self, key):
+        if self.state.get(self.prefix + key) is None:
+            raise KeyError(key)
+        self.state.delete(self.prefix + key)
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self.state.get(self.prefix + key) is not None
+
+    def __iter__(self):
+        return iter([key[len(self.prefix):] for key in self.state.keys(self.prefix)])
+
+    def __len__(self):
+        return len(self.state.keys(self.prefix))
+
+
+shared_state = create_shared_state(SHARED_STATE_URL)
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical upstream calls into one. The first caller for a
+    key runs the call; everyone who asks for the same key while it is in flight
+    waits for that result instead of sending their own request. Nothing is kept
+    after the call finishes - caching is the caller's job.
+
+    do() is for threads, do_async() for coroutines on the event loop; the two keep
+    separate in-flight tables.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}        # {key: concurrent.futures.Future}
+        self._async_calls = {}  # {key: asyncio.Task}
+        self.leaders = 0        # calls that actually went upstream
+        self.shared = 0         # calls that joined one already in flight
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def do_async(self, key, coroutine_fn):
+        task = self._async_calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coroutine_fn())
+            self._async_calls[key] = task
+            task.add_done_callback(lambda _: self._async_calls.pop(key, None))
+            self.leaders += 1
+        else:
+            self.shared += 1
+        # A caller that gives up (e.g. an enrichment budget running out) must not
+        # cancel the request the other waiters are sharing
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._calls) + len(self._async_calls)}
@@ -3,14 +3,31 @@ import base64
 import requests
 import json
 import time
+from http_clients import SPOTIFY_ACCOUNTS_HOST, http_clients
+from shared_state import shared_state
+from config import SPOTIFY_ACCOUNTS_URL, SPOTIFY_TOKEN_URL
+
+TOKEN_INFO_KEY = "spotify_auth:token_info"
 
 class SpotifyAuthManager:
-    def __init__(self, client_id, client_secret, redirect_uri, scope):
+    def __init__(self, client_id, client_secret, redirect_uri, scope, state=shared_state):
         self.client_id = client_id
         self.client_secret = client_secret
         self.redirect_uri = redirect_uri
         self.scope = scope
-        self.token_info = None # Stores access_token, refresh_token, expires_at
+        self.state = state
+
+    @property
+    def token_info(self):
+        # Stores access_token, refresh_token, expires_at; kept in shared state so every worker sees a refresh
+        return self.state.get(TOKEN_INFO_KEY)
+
+    @token_info.setter
+    def token_info(self, value):
+        if value is None:
+            self.state.delete(TOKEN_INFO_KEY)
+        else:
+            self.state.set(TOKEN_INFO_KEY, value)
 
     def get_authorize_url(self):
         params = {
@@ -19,48 +36,80 @@ class SpotifyAuthManager:
             "redirect_uri": self.redirect_uri,
             "scope": self.scope,
         }
-        return "https://accounts.spotify.com/authorize?" + requests.compat.urlencode(params)
+        return f"{SPOTIFY_ACCOUNTS_URL}/authorize?" + requests.compat.urlencode(params)
 
-    def get_token(self, code):
+    def _token_request(self, **data):
+        """POST arguments for the accounts token endpoint, the same for the sync and async clients"""
         auth_header = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
         headers = {
             "Authorization": f"Basic {auth_header}",
             "Content-Type": "application/x-www-form-urlencoded"
         }
-        data = {
-            "grant_type": "authorization_code",
-            "code": code,
-            "redirect_uri": self.redirect_uri
-        }
-        response = requests.post("https://accounts.spotify.com/api/token", headers=headers, data=data)
-        response.raise_for_status()
-        self.token_info = response.json()
-        self.token_info['expires_at'] = time.time() + self.token_info['expires_in']
-        return self.token_info
+        return {"url": SPOTIFY_TOKEN_URL, "headers": headers, "data": data}
 
-    def refresh_token(self):
-        if not self.token_info or 'refresh_token' not in self.token_info:
+    def _code_request(self, code):
+        return self._token_request(grant_type="authorization_code", code=code, redirect_uri=self.redirect_uri)
+
+    def _refresh_request(self, token_info):
+        if not token_info or 'refresh_token' not in token_info:
             raise Exception("No refresh token available.")
+        return self._token_request(grant_type="refresh_token", refresh_token=token_info['refresh_token'])
 
-        auth_header = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
-        headers = {
-            "Authorization": f"Basic {auth_header}",
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
-        data = {
-            "grant_type": "refresh_token",
-            "refresh_token": self.token_info['refresh_token']
-        }
-        response = requests.post("https://accounts.spotify.com/api/token", headers=headers, data=data)
+    @staticmethod
+    def _parse_token(response, token_info=None):
+        """Token response (requests or httpx) merged into token_info, with expires_at set"""
         response.raise_for_status()
-        new_token_info = response.json()
-        self.token_info.update(new_token_info)
-        self.token_info['expires_at'] = time.time() + self.token_info['expires_in']
-        return self.token_info
+        token_info = dict(token_info or {})
+        token_info.update(response.json())
+        token_info['expires_at'] = time.time() + token_info['expires_in']
+        return token_info
+
+    def get_token(self, code):
+        response = http_clients.session(SPOTIFY_ACCOUNTS_HOST).post(**self._code_request(code))
+        self.token_info = token_info = self._parse_token(response)
+        return token_info
+
+    async def get_token_async(self, code):
+        """get_token() without blocking the event loop; used by /callback"""
+        response = await http_clients.async_client(SPOTIFY_ACCOUNTS_HOST).post(**self._code_request(code))
+        token_info = self._parse_token(response)
+        await self.state.run(self.state.set, TOKEN_INFO_KEY, token_info)
+        return token_info
+
+    def refresh_token(self):
+        token_info = self.token_info
+        request = self._refresh_request(token_info)
+        response = http_clients.session(SPOTIFY_ACCOUNTS_HOST).post(**request)
+        self.token_info = token_info = self._parse_token(response, token_info)
+        return token_info
+
+    async def refresh_token_async(self):
+        """refresh_token() without blocking the event loop; used by the background refresher"""
+        token_info = await self.state.run(self.state.get, TOKEN_INFO_KEY)
+        request = self._refresh_request(token_info)
+        response = await http_clients.async_client(SPOTIFY_ACCOUNTS_HOST).post(**request)
+        token_info = self._parse_token(response, token_info)
+        await self.state.run(self.state.set, TOKEN_INFO_KEY, token_info)
+        return token_info
+
+    def expires_within(self, seconds):
+        """True when there is a refreshable token that expires in the next `seconds`"""
+        token_info = self.token_info
+        return bool(token_info and 'refresh_token' in token_info and token_info['expires_at'] - time.time() < seconds)
 
     def get_access_token(self):
-        if self.token_info and time.time() < self.token_info['expires_at']:
-            return self.token_info['access_token']
-        elif self.token_info and 'refresh_token' in self.token_info:
+        token_info = self.token_info
+        if token_info and time.time() < token_info['expires_at']:
+            return token_info['access_token']
+        elif token_info and 'refresh_token' in token_info:
             return self.refresh_token()['access_token']
+        return None
+
+    async def get_access_token_async(self):
+        """get_access_token() for request handlers: shared state off the loop, async refresh"""
+        token_info = await self.state.run(self.state.get, TOKEN_INFO_KEY)
+        if token_info and time.time() < token_info['expires_at']:
+            return token_info['access_token']
+        elif token_info and 'refresh_token' in token_info:
+            return (await self.refresh_token_async())['access_token']
         return None
\ No newline at end of file
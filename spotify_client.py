@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from urllib.parse import urlparse
+import httpx
+from http_clients import http_clients
+from config import (
+    SPOTIFY_BACKOFF_BASE,
+    SPOTIFY_MAX_CONCURRENCY_PER_TOKEN,
+    SPOTIFY_MAX_RETRIES,
+    SPOTIFY_MAX_RETRY_WAIT,
+)
+
+# Safe to send twice; anything else is never retried automatically
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class SpotifyRateLimited(Exception):
+    """Spotify asked us to back off for longer than a request is willing to wait"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Spotify rate limit, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenGate:
+    """Scheduling state for one access token: a Retry-After deadline and a concurrency cap"""
+
+    def __init__(self, max_concurrency):
+        self.blocked_until = 0.0
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.last_used = time.monotonic()
+
+    def block(self, retry_after):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def wait_time(self):
+        return max(0.0, self.blocked_until - time.monotonic())
+
+
+class SpotifyClient:
+    """
+    Every Spotify Web API call goes through here. Requests are scheduled per access token:
+    a 429 closes that token's gate for Retry-After seconds and the requests queued behind it
+    wait instead of hammering Spotify; a token never has more than max_concurrency calls in
+    flight. Idempotent calls that hit a 429, a 5xx or a network error are retried with
+    jittered exponential backoff. Waits longer than max_retry_wait raise SpotifyRateLimited
+    so callers with a time budget can give up early.
+    Accounts calls that authenticate with client credentials pass access_token=None and
+    share one gate.
+    """
+
+    def __init__(self, max_retries=SPOTIFY_MAX_RETRIES, backoff_base=SPOTIFY_BACKOFF_BASE,
+                 max_retry_wait=SPOTIFY_MAX_RETRY_WAIT, max_concurrency=SPOTIFY_MAX_CONCURRENCY_PER_TOKEN):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_retry_wait = max_retry_wait
+        self.max_concurrency = max_concurrency
+        self._gates = {}  # {token digest: TokenGate}
+        self._gates_lock = threading.Lock()  # request_sync runs in worker threads
+        self.rate_limited = 0
+        self.retries = 0
+
+    def _gate(self, access_token):
+        # Keyed by a digest so raw tokens are not kept around longer than needed
+        key = hashlib.sha1((access_token or "").encode()).hexdigest()
+        with self._gates_lock:
+            gate = self._gates.get(key)
+            if gate is None:
+                gate = self._gates[key] = TokenGate(self.max_concurrency)
+            gate.last_used = time.monotonic()
+        return gate
+
+    @staticmethod
+    def _auth_header(access_token):
+        return {"Authorization": f"Bearer {access_token}"} if access_token else {}
+
+    def _backoff(self, attempt):
+        # "Full jitter": spreads retries from many requests instead of synchronizing them
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    def _retry_after(self, response):
+        try:
+            return max(0.0, float(response.headers.get("Retry-After", "1")))
+        except ValueError:
+            return 1.0
+
+    def _check_wait(self, wait):
+        if wait > self.max_retry_wait:
+            raise SpotifyRateLimited(wait)
+
+    async def request(self, method, url, access_token, **kwargs):
+        gate = self._gate(access_token)
+        headers = {**self._auth_header(access_token), **kwargs.pop("headers", {})}
+        retryable = method.upper() in IDEMPOTENT_METHODS
+        client = http_clients.async_client(urlparse(url).netloc)
+
+        attempt = 0
+        while True:
+            wait = gate.wait_time()
+            if wait:
+                self._check_wait(wait)
+                await asyncio.sleep(wait)
+            try:
+                async with gate.semaphore:
+                    response = await client.request(method, url, headers=headers, **kwargs)
+            except httpx.TransportError:
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                response = None
+
+            if response is not None and response.status_code == 429:
+                self.rate_limited += 1
+                retry_after = self._retry_after(response)
+                gate.block(retry_after)
+                print(f"[Spotify] 429 from {url.split('?')[0]}, backing off {retry_after:.1f}s")
+                if not retryable or attempt >= self.max_retries:
+                    return response
+                self._check_wait(retry_after)
+            elif response is not None and response.status_code < 500:
+                return response
+            elif not retryable or attempt >= self.max_retries:
+                return response
+            else:
+                await asyncio.sleep(self._backoff(attempt))
+
+            attempt += 1
+            self.retries += 1
+
+    def request_sync(self, method, url, access_token, **kwargs):
+        """Blocking counterpart of request() for the sync helpers; shares the Retry-After deadlines"""
+        gate = self._gate(access_token)
+        headers = {**self._auth_header(access_token), **kwargs.pop("headers", {})}
+        retryable = method.upper() in IDEMPOTENT_METHODS
+        session = http_clients.session(urlparse(url).netloc)
+
+        attempt = 0
+        while True:
+            wait = gate.wait_time()
+            if wait:
+                self._check_wait(wait)
+                time.sleep(wait)
+            try:
+                response = session.request(method, url, headers=headers, **kwargs)
+            except Exception:
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                response = None
+
+            if response is not None and response.status_code == 429:
+                self.rate_limited += 1
+                retry_after = self._retry_after(response)
+                gate.block(retry_after)
+                if not retryable or attempt >= self.max_retries:
+                    return response
+                self._check_wait(retry_after)
+            elif response is not None and response.status_code < 500:
+                return response
+            elif not retryable or attempt >= self.max_retries:
+                return response
+            else:
+                time.sleep(self._backoff(attempt))
+
+            attempt += 1
+            self.retries += 1
+
+    async def get(self, url, access_token, **kwargs):
+        return await self.request("GET", url, access_token, **kwargs)
+
+    async def post(self, url, access_token, **kwargs):
+        return await self.request("POST", url, access_token, **kwargs)
+
+    def sweep(self, idle_seconds=3600):
+        """Forget gates of tokens unused for idle_seconds (call periodically)"""
+        cutoff = time.monotonic() - idle_seconds
+        with self._gates_lock:
+            idle = [key for key, gate in self._gates.items() if gate.last_used < cutoff and not gate.wait_time()]
+            for key in idle:
+                del self._gates[key]
+        return len(idle)
+
+    def stats(self):
+        with self._gates_lock:
+            tokens = len(self._gates)
+        return {"tokens": tokens, "rate_limited": self.rate_limited, "retries": self.retries}
+
+
+spotify_client = SpotifyClient()
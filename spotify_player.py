@@ -1,30 +1,211 @@
-import requests
+import asyncio
+import unicodedata
 import urllib.parse
+from cache import MISSING, TTLCache
+from singleflight import SingleFlight
+from spotify_client import spotify_client
+from config import (
+    SPOTIFY_API_URL,
+    SPOTIFY_ID_INDEX_SIZE,
+    SPOTIFY_ID_INDEX_TTL,
+    SPOTIFY_SEARCH_CACHE_SIZE,
+    SPOTIFY_SEARCH_CACHE_TTL,
+    SPOTIFY_SEARCH_NEGATIVE_TTL,
+)
 
-def search_track_on_spotify(track_name, artist_name=None, access_token=None):
-    if access_token is None:
-        print("Warning: Spotify access token not provided for search. Skipping Spotify search.")
-        return None
+# /v1/tracks accepts at most 50 ids per request
+SPOTIFY_TRACKS_BATCH_SIZE = 50
 
+# Search results are not user-specific, so one entry serves every session.
+# Misses are cached as None with a shorter TTL.
+search_cache = TTLCache(max_size=SPOTIFY_SEARCH_CACHE_SIZE, default_ttl=SPOTIFY_SEARCH_CACHE_TTL)
+# Outlives search_cache: once the full object expires, the id still lets us
+# refresh it through the batched /v1/tracks endpoint instead of a new search.
+spotify_id_index = TTLCache(max_size=SPOTIFY_ID_INDEX_SIZE, default_ttl=SPOTIFY_ID_INDEX_TTL)
+# Concurrent searches for the same normalized (track, artist) share one request
+search_flight = SingleFlight("spotify_search")
+
+def normalize_search_key(track_name, artist_name=None):
+    """Fold case, diacritics and whitespace so that "Beyoncé" and "beyonce " share a cache entry"""
+    def fold(text):
+        decomposed = unicodedata.normalize("NFKD", text or "")
+        stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+        return " ".join(stripped.casefold().split())
+    return (fold(track_name), fold(artist_name))
+
+def _slim_track(track_data):
+    """Keep only the fields the recommender and the frontend read from a track object"""
+    return {
+        "id": track_data.get("id"),
+        "uri": track_data.get("uri"),
+        "name": track_data.get("name"),
+        "artists": [{"id": a.get("id"), "name": a.get("name")} for a in track_data.get("artists", [])],
+        "album": {"images": track_data.get("album", {}).get("images", [])},
+        "preview_url": track_data.get("preview_url"),
+    }
+
+def find_cached_track(track_name, artist_name=None):
+    """
+    Returns (track, spotify_id) from the caches without any HTTP call.
+    track is MISSING unless the resolved object is still cached; spotify_id is
+    set when only the id mapping is left and the track can be batch-resolved.
+    """
+    cache_key = normalize_search_key(track_name, artist_name)
+    cached = search_cache.get(cache_key)
+    if cached is not MISSING:
+        return cached, cached["id"] if cached else None
+    spotify_id = spotify_id_index.get(cache_key)
+    return MISSING, None if spotify_id is MISSING else spotify_id
+
+def remember_track(track_name, artist_name, track_data):
+    """Store a resolved track under its (track, artist) key in both caches"""
+    cache_key = normalize_search_key(track_name, artist_name)
+    search_cache.set(cache_key, track_data)
+    spotify_id_index.set(cache_key, track_data["id"])
+
+def _search_url(track_name, artist_name):
     query = f"track:{track_name} artist:{artist_name}" if artist_name else f"track:{track_name}"
-    url = f"https://api.spotify.com/v1/search?q={urllib.parse.quote(query)}&type=track&limit=1"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(url, headers=headers)
+    return f"{SPOTIFY_API_URL}/search?q={urllib.parse.quote(query)}&type=track&limit=1"
+
+def _handle_search_response(track_name, artist_name, response):
     if response.status_code == 200:
         items = response.json().get("tracks", {}).get("items", [])
         if items:
-            track_data = items[0]
-            # Return the full track object which includes album info
-            return track_data 
+            track_data = _slim_track(items[0])
+            remember_track(track_name, artist_name, track_data)
+            return track_data
+        # Only a successful empty search is a real miss; errors are retried next time
+        search_cache.set(normalize_search_key(track_name, artist_name), None, ttl=SPOTIFY_SEARCH_NEGATIVE_TTL)
     return None
 
+def search_track_on_spotify(track_name, artist_name=None, access_token=None):
+    if access_token is None:
+        print("Warning: Spotify access token not provided for search. Skipping Spotify search.")
+        return None
+
+    search_key = normalize_search_key(track_name, artist_name)
+    cached = search_cache.get(search_key)
+    if cached is not MISSING:
+        return cached
+
+    def search():
+        response = spotify_client.request_sync("GET", _search_url(track_name, artist_name), access_token)
+        return _handle_search_response(track_name, artist_name, response)
+
+    return search_flight.do(search_key, search)
+
+async def search_track_on_spotify_async(track_name, artist_name=None, access_token=None):
+    if access_token is None:
+        print("Warning: Spotify access token not provided for search. Skipping Spotify search.")
+        return None
+
+    search_key = normalize_search_key(track_name, artist_name)
+    cached = search_cache.get(search_key)
+    if cached is not MISSING:
+        return cached
+
+    async def search():
+        response = await spotify_client.get(_search_url(track_name, artist_name), access_token)
+        return _handle_search_response(track_name, artist_name, response)
+
+    # Search results are not user-specific, so whichever user's token is in flight serves everyone
+    return await search_flight.do_async(search_key, search)
+
+class TrackBatchResolver:
+    """
+    Collects Spotify track ids and fetches their metadata through
+    /v1/tracks?ids= in groups of up to 50, instead of one request per track.
+    """
+
+    def __init__(self, access_token, batch_size=SPOTIFY_TRACKS_BATCH_SIZE):
+        self.access_token = access_token
+        self.batch_size = batch_size
+        self.pending = []
+        self._pending_set = set()
+        self.failed = []  # ids whose batch request failed, so callers can tell them from unknown ids
+
+    def add(self, track_id):
+        if track_id and track_id not in self._pending_set:
+            self._pending_set.add(track_id)
+            self.pending.append(track_id)
+
+    def batches(self):
+        return [self.pending[i:i + self.batch_size] for i in range(0, len(self.pending), self.batch_size)]
+
+    def _batch_url(self, track_ids):
+        return f"{SPOTIFY_API_URL}/tracks?ids={','.join(track_ids)}"
+
+    def _parse_batch(self, response, track_ids):
+        """Ids Spotify does not know come back as null and are left out of the result"""
+        if response.status_code != 200:
+            return self._batch_failed(track_ids, f"{response.status_code} - {response.text}")
+        return {
+            track_data["id"]: _slim_track(track_data)
+            for track_data in response.json().get("tracks", [])
+            if track_data
+        }
+
+    def _batch_failed(self, track_ids, error):
+        print(f"Error fetching tracks batch: {error}")
+        self.failed.extend(track_ids)
+        return {}
+
+    def fetch_batch(self, track_ids):
+        try:
+            response = spotify_client.request_sync("GET", self._batch_url(track_ids), self.access_token)
+        except Exception as e:
+            return self._batch_failed(track_ids, e)
+        return self._parse_batch(response, track_ids)
+
+    async def fetch_batch_async(self, track_ids):
+        try:
+            response = await spotify_client.get(self._batch_url(track_ids), self.access_token)
+        except Exception as e:
+            return self._batch_failed(track_ids, e)
+        return self._parse_batch(response, track_ids)
+
+    def _take_batches(self):
+        batches = self.batches()
+        self.pending = []
+        self._pending_set = set()
+        return batches
+
+    def resolve(self):
+        """Fetch every pending id and return {track_id: track}"""
+        resolved = {}
+        for batch in self._take_batches():
+            resolved.update(self.fetch_batch(batch))
+        return resolved
+
+    async def resolve_async(self):
+        """Like resolve(), with all groups of 50 requested concurrently"""
+        resolved = {}
+        results = await asyncio.gather(*(self.fetch_batch_async(batch) for batch in self._take_batches()))
+        for result in results:
+            resolved.update(result)
+        return resolved
+
+def get_several_tracks(track_ids, access_token):
+    """
+    Fetches track objects for many Spotify ids with as few requests as possible.
+    """
+    resolver = TrackBatchResolver(access_token)
+    for track_id in track_ids:
+        resolver.add(track_id)
+    return resolver.resolve()
+
+async def get_several_tracks_async(track_ids, access_token):
+    resolver = TrackBatchResolver(access_token)
+    for track_id in track_ids:
+        resolver.add(track_id)
+    return await resolver.resolve_async()
+
 def get_track_preview_url(track_id, access_token):
     """
     Fetches the preview URL for a given Spotify track ID.
     """
-    url = f"https://api.spotify.com/v1/tracks/{track_id}"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(url, headers=headers)
+    url = f"{SPOTIFY_API_URL}/tracks/{track_id}"
+    response = spotify_client.request_sync("GET", url, access_token)
     if response.status_code == 200:
         track_data = response.json()
         return track_data.get('preview_url')
@@ -34,22 +215,27 @@ def get_user_profile(access_token):
     """
     Fetches the current user's profile information, including product type (premium/free).
     """
-    url = "https://api.spotify.com/v1/me"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(url, headers=headers)
+    url = f"{SPOTIFY_API_URL}/me"
+    response = spotify_client.request_sync("GET", url, access_token)
     if response.status_code == 200:
         return response.json()
     else:
         print(f"Error fetching user profile: {response.status_code} - {response.text}")
         return None
 
+async def get_user_profile_async(access_token):
+    response = await spotify_client.get(f"{SPOTIFY_API_URL}/me", access_token)
+    if response.status_code == 200:
+        return response.json()
+    print(f"Error fetching user profile: {response.status_code} - {response.text}")
+    return None
+
 def create_spotify_playlist(user_id, playlist_name, access_token):
     """
     Creates a new Spotify playlist for the given user.
     """
-    url = f"https://api.spotify.com/v1/users/{user_id}/playlists"
+    url = f"{SPOTIFY_API_URL}/users/{user_id}/playlists"
     headers = {
-        "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json"
     }
     data = {
@@ -58,7 +244,7 @@ def create_spotify_playlist(user_id, playlist_name, access_token):
         "collaborative": False,
         "description": "Playlist created by Music Recommender"
     }
-    response = requests.post(url, headers=headers, json=data)
+    response = spotify_client.request_sync("POST", url, access_token, headers=headers, json=data)
     if response.status_code == 201:
         return response.json().get('id')
     else:
@@ -69,15 +255,14 @@ def add_tracks_to_playlist(playlist_id, track_uris, access_token):
     """
     Adds tracks to an existing Spotify playlist.
     """
-    url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
+    url = f"{SPOTIFY_API_URL}/playlists/{playlist_id}/tracks"
     headers = {
-        "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json"
     }
     data = {
         "uris": track_uris
     }
-    response = requests.post(url, headers=headers, json=data)
+    response = spotify_client.request_sync("POST", url, access_token, headers=headers, json=data)
     if response.status_code == 201:
         return True
     else:
@@ -0,0 +1,387 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+class StorageBackend(ABC):
+    """
+    Durable home for per-user state: bandit arms, rating playlists and login sessions,
+    plus the artist tags that linear bandits featurize those arms with.
+    Implementations must be safe to call from the write-behind thread and request
+    handlers at the same time.
+    """
+
+    @abstractmethod
+    def load_arms(self, user_id):
+        """[(item_id, reward_sum, count), ...] for one user"""
+
+    @abstractmethod
+    def add_arms(self, rows):
+        """
+        Add [(user_id, item_id, reward_delta, count_delta), ...] to the stored totals.
+        Deltas rather than totals, so workers updating the same user never overwrite each other.
+        """
+
+    @abstractmethod
+    def delete_arms(self, user_id):
+        pass
+
+    @abstractmethod
+    def load_playlists(self, user_id):
+        """{rating: [track, ...]} or None if the user has never been stored"""
+
+    @abstractmethod
+    def save_playlists(self, user_id, playlists):
+        pass
+
+    @abstractmethod
+    def load_artist_tags(self, artists):
+        """{artist: [tag, ...]} for the stored ones among artists"""
+
+    @abstractmethod
+    def save_artist_tags(self, tags_by_artist):
+        pass
+
+    @abstractmethod
+    def load_sessions(self):
+        """{session_id: session_data} for every session that has not expired"""
+
+    @abstractmethod
+    def save_session(self, session_id, session_data):
+        pass
+
+    @abstractmethod
+    def delete_session(self, session_id):
+        pass
+
+    @abstractmethod
+    def purge_expired_sessions(self):
+        """Delete stored sessions past their expiry and return how many were removed"""
+
+    def close(self):
+        pass
+
+
+class SQLiteStorage(StorageBackend):
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS bandit_arms (
+                user_id TEXT NOT NULL,
+                item_id TEXT NOT NULL,
+                reward_sum REAL NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (user_id, item_id)
+            );
+            CREATE TABLE IF NOT EXISTS playlists (
+                user_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS artist_tags (
+                artist TEXT PRIMARY KEY,
+                tags TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def load_arms(self, user_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT item_id, reward_sum, count FROM bandit_arms WHERE user_id = ?", (user_id,)
+            ).fetchall()
+
+    def add_arms(self, rows):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO bandit_arms (user_id, item_id, reward_sum, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(user_id, item_id) DO UPDATE SET "
+                "reward_sum = reward_sum + excluded.reward_sum, count = count + excluded.count",
+                rows,
+            )
+            self._conn.commit()
+
+    def delete_arms(self, user_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM bandit_arms WHERE user_id = ?", (user_id,))
+            self._conn.commit()
+
+    def load_playlists(self, user_id):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM playlists WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_playlists(self, user_id, playlists):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO playlists (user_id, data, updated_at) VALUES (?, ?, ?)",
+                (user_id, json.dumps(playlists), time.time()),
+            )
+            self._conn.commit()
+
+    def load_artist_tags(self, artists):
+        artists = list(artists)
+        rows = []
+        with self._lock:
+            # Chunked to stay under SQLite's bound-parameter limit
+            for start in range(0, len(artists), 500):
+                chunk = artists[start:start + 500]
+                rows += self._conn.execute(
+                    f"SELECT artist, tags FROM artist_tags WHERE artist IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+        return {artist: json.loads(tags) for artist, tags in rows}
+
+    def save_artist_tags(self, tags_by_artist):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO artist_tags (artist, tags, updated_at) VALUES (?, ?, ?)",
+                [(artist, json.dumps(tags), now) for artist, tags in tags_by_artist.items()],
+            )
+            self._conn.commit()
+
+    def load_sessions(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT session_id, data FROM sessions WHERE expires_at > ?", (time.time(),)
+            ).fetchall()
+        return {session_id: json.loads(data) for session_id, data in rows}
+
+    def save_session(self, session_id, session_data):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?)",
+                # The session's own expiry, not its Spotify token's: the token is refreshed hourly
+                (session_id, json.dumps(session_data), session_data.get("session_expires_at", time.time() + 86400)),
+            )
+            self._conn.commit()
+
+    def delete_session(self, session_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def purge_expired_sessions(self):
+        with self._lock:
+            purged = self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+            self._conn.commit()
+        return purged
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+STORAGE_BACKENDS = {
+    "sqlite": SQLiteStorage,
+}
+
+
+def create_storage(backend, path):
+    """Build the configured backend, or None when persistence is turned off"""
+    if not backend or backend == "none":
+        return None
+    return STORAGE_BACKENDS[backend](path)
+
+
+class WriteBehindQueue:
+    """
+    Buffers writes in memory and flushes them to a StorageBackend in batches on a
+    background thread, so request handlers never wait on disk. Writes to the same
+    key are coalesced: arm deltas are summed and only the latest playlist snapshot
+    is kept. on_flush(user_ids) runs after every successful batch with the users
+    whose arms or playlists changed.
+    """
+
+    def __init__(self, storage, interval=1.0, on_flush=None):
+        self.storage = storage
+        self.interval = interval
+        self.on_flush = on_flush
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # keeps batches in order when two threads flush
+        self._writing = set()   # users whose taken writes have not reached storage yet
+        self._written = threading.Condition(self._lock)
+        self._arms = {}         # {(user_id, item_id): (reward_delta, count_delta)}
+        self._playlists = {}    # {user_id: json snapshot}
+        self._resets = set()    # user_ids whose arms must be wiped
+        self._sessions = {}     # {session_id: session_data or None for delete}
+        self._artist_tags = {}  # {artist: [tag, ...]}, not per user
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.flushed_batches = 0
+
+    def put_arm(self, user_id, item_id, reward, count=1):
+        """Record one bandit update (a delta, not the arm's new totals)"""
+        with self._lock:
+            self._add_arm((user_id, item_id), reward, count)
+
+    def _add_arm(self, key, reward, count):
+        reward_sum, total = self._arms.get(key, (0.0, 0))
+        self._arms[key] = (reward_sum + reward, total + count)
+
+    def put_playlists(self, user_id, playlists):
+        snapshot = json.dumps(playlists)  # snapshot now; the live dict keeps changing
+        with self._lock:
+            self._playlists[user_id] = snapshot
+
+    def reset_arms(self, user_id):
+        with self._lock:
+            self._resets.add(user_id)
+            for key in [key for key in self._arms if key[0] == user_id]:
+                del self._arms[key]
+
+    def put_session(self, session_id, session_data):
+        with self._lock:
+            self._sessions[session_id] = dict(session_data)
+
+    def delete_session(self, session_id):
+        with self._lock:
+            self._sessions[session_id] = None
+
+    def put_artist_tags(self, tags_by_artist):
+        with self._lock:
+            self._artist_tags.update(tags_by_artist)
+
+    def has_pending(self, user_id):
+        # A batch being written right now has already left the buffers; treat it as pending
+        with self._lock:
+            return (
+                user_id in self._writing
+                or user_id in self._playlists
+                or user_id in self._resets
+                or any(key[0] == user_id for key in self._arms)
+            )
+
+    def depth(self):
+        with self._lock:
+            return (len(self._arms) + len(self._playlists) + len(self._resets)
+                    + len(self._sessions) + len(self._artist_tags))
+
+    def flush(self):
+        """Write everything buffered so far. Safe to call from any thread."""
+        with self._flush_lock:
+            with self._lock:
+                # Users being flushed on their own stay buffered, so their writes keep their order
+                arms, playlists, resets = self._take(lambda user_id: user_id not in self._writing)
+                sessions, self._sessions = self._sessions, {}
+                artist_tags, self._artist_tags = self._artist_tags, {}
+            self._write(arms, playlists, resets, sessions, artist_tags)
+
+    def flush_user(self, user_id):
+        """
+        Write one user's buffered changes now, e.g. before loading that user from storage.
+        Waits only for a batch that holds this user's writes, not for unrelated users' batches.
+        """
+        with self._lock:
+            while user_id in self._writing:
+                self._written.wait()
+            arms, playlists, resets = self._take(lambda buffered_user_id: buffered_user_id == user_id)
+        self._write(arms, playlists, resets, {}, {})
+
+    def _take(self, selected):
+        """Remove the buffered writes of users for which selected(user_id) holds; call with _lock held"""
+        arms = {key: delta for key, delta in self._arms.items() if selected(key[0])}
+        playlists = {user_id: snapshot for user_id, snapshot in self._playlists.items() if selected(user_id)}
+        resets = {user_id for user_id in self._resets if selected(user_id)}
+        for key in arms:
+            del self._arms[key]
+        for user_id in playlists:
+            del self._playlists[user_id]
+        self._resets -= resets
+        self._writing |= resets | set(playlists) | {user_id for user_id, _ in arms}
+        return arms, playlists, resets
+
+    def _write(self, arms, playlists, resets, sessions, artist_tags):
+        changed = set(resets) | set(playlists) | {user_id for user_id, _ in arms}
+        try:
+            self._write_batch(arms, playlists, resets, sessions, artist_tags, changed)
+        finally:
+            with self._lock:
+                self._writing -= changed
+                self._written.notify_all()
+
+    def _write_batch(self, arms, playlists, resets, sessions, artist_tags, changed):
+        if not (arms or playlists or resets or sessions or artist_tags):
+            return
+        written_arms = False
+        try:
+            for user_id in resets:
+                self.storage.delete_arms(user_id)
+            if arms:
+                self.storage.add_arms([
+                    (user_id, item_id, reward_sum, count)
+                    for (user_id, item_id), (reward_sum, count) in arms.items()
+                ])
+            written_arms = True
+            for user_id, snapshot in playlists.items():
+                self.storage.save_playlists(user_id, json.loads(snapshot))
+            for session_id, session_data in sessions.items():
+                if session_data is None:
+                    self.storage.delete_session(session_id)
+                else:
+                    self.storage.save_session(session_id, session_data)
+            if artist_tags:
+                self.storage.save_artist_tags(artist_tags)
+        except Exception:
+            # Arm deltas are not idempotent: never re-add ones that already reached storage
+            if written_arms:
+                arms, resets = {}, set()
+            self._requeue(arms, playlists, resets, sessions, artist_tags)
+            raise
+        self.flushed_batches += 1
+
+        if self.on_flush and changed:
+            try:
+                self.on_flush(changed)
+            except Exception as e:
+                print(f"[Storage] on_flush callback failed: {e}")
+
+    def _requeue(self, arms, playlists, resets, sessions, artist_tags):
+        """Put a failed batch back without overwriting anything written since"""
+        with self._lock:
+            for key, (reward_sum, count) in arms.items():
+                if key[0] not in self._resets:
+                    self._add_arm(key, reward_sum, count)
+            for user_id, snapshot in playlists.items():
+                self._playlists.setdefault(user_id, snapshot)
+            self._resets |= resets
+            for session_id, session_data in sessions.items():
+                self._sessions.setdefault(session_id, session_data)
+            for artist, tags in artist_tags.items():
+                self._artist_tags.setdefault(artist, tags)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[Storage] Write-behind flush failed: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write whatever is still buffered"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# main.py reads its configuration at import time: keep the tests off disk and shared services
+os.environ.setdefault("STORAGE_BACKEND", "none")
+os.environ.setdefault("SHARED_STATE_URL", "memory://")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
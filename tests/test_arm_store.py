@@ -0,0 +1,78 @@
+import random
+
+import numpy as np
+import pytest
+
+from bandit import arm_store
+from bandit.arm_store import ArmStore, _HashIndex
+
+
+@pytest.fixture(params=["hash", "colliding"])
+def hash_mode(request, monkeypatch):
+    if request.param == "colliding":
+        # A handful of distinct hashes, so nearly every lookup walks a probe chain past other ids
+        monkeypatch.setattr(arm_store, "_hash_id", lambda item_id: 1 + len(item_id) % 5)
+    return request.param
+
+
+def best_means(model):
+    means = {item_id: reward_sum / count if count else 0.0 for item_id, (reward_sum, count) in model.items()}
+    return means, max(means.values()) if means else None
+
+
+def test_matches_a_dict_under_random_operations(hash_mode):
+    rng = random.Random(7)
+    ids = [f"Track {i} - Artist {i % 37}" for i in range(400)]
+    store = ArmStore(capacity=1)  # start tiny so the arrays and the index keep growing
+    model = {}
+
+    for step in range(5000):
+        op = rng.random()
+        if op < 0.5:
+            item_id = rng.choice(ids)
+            # Halves and small counts keep the float32 sums exact
+            reward, count = rng.randint(-4, 4) / 2, rng.randint(0, 2)
+            store.add(item_id, reward, count)
+            reward_sum, total = model.get(item_id, (0.0, 0))
+            model[item_id] = (reward_sum + reward, total + count)
+        elif op < 0.7:
+            item_id = rng.choice(ids)
+            assert store.get(item_id) == model.get(item_id, (0.0, 0))
+            assert (item_id in store) == (item_id in model)
+        elif op < 0.9:
+            batch = rng.sample(ids, rng.randint(0, 30))
+            sums, counts = store.gather(batch, default_sum=-1.0, default_count=-1)
+            expected = [model.get(item_id, (-1.0, -1)) for item_id in batch]
+            assert sums.tolist() == [reward_sum for reward_sum, _ in expected]
+            assert counts.tolist() == [count for _, count in expected]
+        else:
+            means, best = best_means(model)
+            if best is None:
+                assert store.best_id() is None
+            else:
+                # Ties may go to any of the leaders
+                assert means[store.best_id()] == pytest.approx(best)
+
+    assert len(store) == len(model)
+    assert dict(store.items()) == model
+    assert sorted(store.ids) == sorted(model)
+
+
+def test_hash_index_rehash_keeps_every_entry():
+    rng = np.random.default_rng(3)
+    index = _HashIndex(capacity=2)
+    ids, hashes = [], []
+    for row in range(2000):
+        # Small hash range: plenty of duplicates and wrap-around probes across rehashes
+        h = int(rng.integers(1, 300))
+        ids.append(f"id{row}")
+        hashes.append(h)
+        index.insert(h, row)
+    assert index.size == 2000 and 2 * index.size <= len(index.keys)
+    for row, (h, item_id) in enumerate(zip(hashes, ids)):
+        assert index.find(h, item_id, ids) == row
+    assert index.find(1, "missing", ids) == -1
+    # find_many returns some row with a matching hash; callers verify the id
+    candidates = index.find_many(np.array(hashes, dtype=np.int32))
+    assert all(hashes[row] == h for row, h in zip(candidates, hashes))
+    assert (index.find_many(np.array([300, 1000], dtype=np.int32)) == -1).all()
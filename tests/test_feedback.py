@@ -0,0 +1,53 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from bandit.linear import LinUCB
+from bandit.thompson_sampling import HierarchicalThompsonSampling
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """POST /feedback as a fresh user, without a session or any upstream call"""
+    async def user_from_request(request):
+        return "test-user"
+
+    monkeypatch.setattr(main, "get_user_from_request", user_from_request)
+    monkeypatch.setattr(main, "schedule_prefetch", lambda *args: None)
+    main.user_data.pop("test-user", None)
+    yield TestClient(main.app)
+    main.user_data.pop("test-user", None)
+
+
+def post_feedback(client, spotify_id, name, artist, rating=5):
+    # What the player sends: the Spotify id, and the card it rated
+    response = client.post("/feedback", json={
+        "track_id": spotify_id,
+        "rating": rating,
+        "seed_track_name": "Seed",
+        "seed_artist_name": "Seed Artist",
+        "track_info": {"id": spotify_id, "name": name, "artist": artist},
+    })
+    assert response.status_code == 200, response.text
+    return main.user_data["test-user"]["recommender"].bandit
+
+
+def test_feedback_raises_same_artist_score_linucb(client, monkeypatch):
+    monkeypatch.setattr(main, "build_bandit", lambda: LinUCB())
+
+    bandit = post_feedback(client, "4uLU6hMCjMI75M1A2tKUQC", "Gravity", "John Mayer")
+
+    same_artist = bandit.get_value("Daughters - John Mayer")
+    other_artist = bandit.get_value("Creep - Radiohead")
+    assert same_artist > other_artist
+
+
+def test_feedback_sets_artist_prior_hierarchical_thompson(client, monkeypatch):
+    monkeypatch.setattr(main, "build_bandit", lambda: HierarchicalThompsonSampling())
+
+    bandit = post_feedback(client, "4uLU6hMCjMI75M1A2tKUQC", "Gravity", "John Mayer")
+
+    # Neither track has been rated; only the first shares an artist with the one that was
+    alpha, beta = bandit._beta_params(["Daughters - John Mayer", "Creep - Radiohead"])
+    prior_means = alpha / (alpha + beta)
+    assert prior_means[0] > prior_means[1]
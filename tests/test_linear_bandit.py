@@ -0,0 +1,63 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import main
+from bandit.linear import LinUCB, artist_tags, remember_artist_tags, track_features
+from storage import SQLiteStorage, WriteBehindQueue
+
+
+@pytest.fixture(autouse=True)
+def clear_artist_tags():
+    artist_tags.clear()
+    yield
+    artist_tags.clear()
+
+
+def test_features_depend_only_on_artist_and_its_tags():
+    remember_artist_tags({"radiohead": ["alternative", "rock"]})
+    # Same vector whatever track, seed or user it is scored for
+    assert np.array_equal(track_features("Creep - Radiohead"), track_features("Reckoner - Radiohead"))
+    assert not np.array_equal(track_features("Creep - Radiohead"), track_features("Creep - Portishead"))
+
+
+def test_shared_tags_generalize_across_artists():
+    remember_artist_tags({"radiohead": ["alternative"], "muse": ["alternative"], "adele": ["soul"]})
+    bandit = LinUCB()
+    for _ in range(5):
+        bandit.update("Creep - Radiohead", 1.0)
+    assert bandit.get_value("Uprising - Muse") > bandit.get_value("Hello - Adele")
+
+
+@pytest.fixture
+def stored(tmp_path, monkeypatch):
+    storage = SQLiteStorage(str(tmp_path / "webplayer.db"))
+    write_behind = WriteBehindQueue(storage)
+    monkeypatch.setattr(main, "storage", storage)
+    monkeypatch.setattr(main, "write_behind", write_behind)
+    monkeypatch.setattr(main, "build_bandit", lambda: LinUCB())
+    yield storage, write_behind
+    storage.close()
+
+
+def test_restore_rebuilds_the_model_with_the_scored_features(stored, monkeypatch):
+    storage, write_behind = stored
+
+    async def top_tags(artist):
+        return [{"name": "alternative"}, {"name": "rock"}] if artist == "radiohead" else [{"name": "alternative"}]
+
+    monkeypatch.setattr(main.pool_lastfm, "get_artist_top_tags_async", top_tags)
+    asyncio.run(main.fetch_artist_tags(["Radiohead", "Muse"]))
+
+    live = LinUCB()
+    for item_id, reward in [("Creep - Radiohead", 1.0), ("Creep - Radiohead", 0.0), ("Uprising - Muse", 1.0)]:
+        live.update(item_id, reward)
+        write_behind.put_arm("u1", item_id, reward)
+    write_behind.flush()
+
+    artist_tags.clear()  # a fresh worker
+    recommender, _, _ = main.load_user_state("u1")
+
+    assert np.allclose(recommender.bandit.theta, live.theta)
+    assert np.allclose(recommender.bandit.A_inv, live.A_inv)
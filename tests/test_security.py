@@ -0,0 +1,76 @@
+import ipaddress
+import time
+
+import pytest
+from starlette.requests import Request
+
+import security
+from security import RateLimiter, get_client_ip
+from shared_state import InMemoryState
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]  # start of a 10s window
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize("state", [None, InMemoryState()], ids=["local", "shared"])
+def test_previous_window_is_weighted_by_overlap(clock, state):
+    limiter = RateLimiter(max_requests=10, window_seconds=10, state=state)
+    assert all(limiter.is_allowed("ip") for _ in range(10))
+    assert not limiter.is_allowed("ip")
+
+    # Halfway through the next window: 11 previous hits (the denied one included) weigh 5.5
+    clock[0] += 15
+    assert [limiter.is_allowed("ip") for _ in range(5)] == [True] * 4 + [False]
+    # A window later the burst no longer counts
+    clock[0] += 20
+    assert limiter.is_allowed("ip")
+
+
+def test_clients_have_separate_buckets(clock):
+    limiter = RateLimiter(max_requests=1, window_seconds=10)
+    assert limiter.is_allowed("a")
+    assert not limiter.is_allowed("a")
+    assert limiter.is_allowed("b")
+
+
+def test_sweep_forgets_idle_clients(clock):
+    limiter = RateLimiter(max_requests=1, window_seconds=10)
+    limiter.is_allowed("a")
+    clock[0] += 10
+    assert limiter.sweep() == 0  # its count is still the previous window
+    clock[0] += 10
+    assert limiter.sweep() == 1
+
+
+def request_from(peer, forwarded_for=None):
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 12345)})
+
+
+@pytest.fixture
+def behind_proxy(monkeypatch):
+    monkeypatch.setattr(security, "trusted_proxies", [ipaddress.ip_network("10.0.0.0/8")])
+
+
+def test_forwarded_for_ignored_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(security, "trusted_proxies", [])
+    assert get_client_ip(request_from("10.0.0.1", "203.0.113.7")) == "10.0.0.1"
+
+
+def test_spoofed_forwarded_for_from_direct_client_is_ignored(behind_proxy):
+    assert get_client_ip(request_from("198.51.100.9", "203.0.113.7")) == "198.51.100.9"
+
+
+def test_right_most_untrusted_hop_is_the_client(behind_proxy):
+    # The client prepended a fake hop; our proxy appended the address it actually saw
+    assert get_client_ip(request_from("10.0.0.1", "1.2.3.4, 198.51.100.9")) == "198.51.100.9"
+    assert get_client_ip(request_from("10.0.0.1", "198.51.100.9, 10.0.0.2")) == "198.51.100.9"
+
+
+def test_all_trusted_hops_fall_back_to_left_most(behind_proxy):
+    assert get_client_ip(request_from("10.0.0.1", "10.0.0.3, 10.0.0.2")) == "10.0.0.3"
+    assert get_client_ip(request_from("10.0.0.1")) == "10.0.0.1"
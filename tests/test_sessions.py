@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+import main
+from sessions import SessionStore
+from shared_state import InMemoryState
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+def login(store, session_id="s1", token="t0", token_ttl=3600):
+    store.create(session_id, {
+        "user_id": "u1", "access_token": token, "refresh_token": "r", "expires_at": time.time() + token_ttl,
+    })
+
+
+def test_token_refresh_does_not_extend_session(clock):
+    store = SessionStore(InMemoryState(), ttl=3)
+    login(store, token_ttl=1)
+    for i in range(1, 3):
+        clock[0] += 1
+        assert store.update_token("s1", f"t{i}", time.time() + 1) is not None
+    clock[0] += 1.5
+    assert store.update_token("s1", "t3", time.time() + 1) is None
+    assert store.get("s1") is None
+    assert store.session_id_for_token("t2") is None
+
+
+def test_restored_session_past_expiry_is_dropped(clock):
+    store = SessionStore(InMemoryState(), ttl=60)
+    assert not store.create("old", {"user_id": "u1", "session_expires_at": time.time() - 1})
+    assert store.get("old") is None
+
+
+def test_refresh_pass_skips_and_deletes_expired_sessions(clock, monkeypatch):
+    store = SessionStore(InMemoryState(), ttl=3600)
+    monkeypatch.setattr(main, "session_store", store)
+    monkeypatch.setattr(main, "user_sessions", store.sessions)
+    monkeypatch.setattr(main, "write_behind", None)
+    login(store, "expiring", token_ttl=60)
+    login(store, "fresh", token_ttl=3600)
+    login(store, "ending", token_ttl=60)
+    ending = store.get("ending")
+    ending["session_expires_at"] = ending["expires_at"] - 1  # the session ends before its token
+    store.sessions.set("ending", ending, ttl=3600)
+    gone = store.get("expiring")
+    gone["session_expires_at"] = time.time() - 1  # expiry passed, entry not yet collected
+    store.sessions.set("gone", gone, ttl=3600)
+
+    expiring = main.sessions_expiring_within(300)
+
+    assert [session_id for session_id, _ in expiring] == ["expiring"]
+    assert store.get("gone") is None
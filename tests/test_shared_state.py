@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from shared_state import InMemoryState, SharedMapping, SQLiteState
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryState()
+    return SQLiteState(str(tmp_path / "state.db"))
+
+
+def test_sqlite_incr_is_atomic_across_connections(tmp_path):
+    path = str(tmp_path / "state.db")
+    # Two instances stand in for two workers; each thread also gets its own connection
+    workers = [SQLiteState(path), SQLiteState(path)]
+    seen, seen_lock = [], threading.Lock()
+
+    def hammer(state):
+        values = [state.incr("hits", ttl=60) for _ in range(100)]
+        with seen_lock:
+            seen.extend(values)
+
+    threads = [threading.Thread(target=hammer, args=(workers[i % 2],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(seen) == list(range(1, 801))
+    assert workers[0].get("hits") == workers[1].get("hits") == 800
+
+
+def test_values_expire(state, clock):
+    state.set("k", {"a": 1}, ttl=10)
+    state.set("forever", 1)
+    clock[0] += 9.9
+    assert state.get("k") == {"a": 1}
+    clock[0] += 0.1
+    assert state.get("k") is None
+    assert state.keys("") == ["forever"]
+
+
+def test_incr_ttl_starts_when_the_counter_is_created(state, clock):
+    assert state.incr("c", ttl=10) == 1
+    clock[0] += 6
+    assert state.incr("c", 2, ttl=10) == 3  # does not push the expiry back
+    clock[0] += 4
+    assert state.get("c") is None
+    assert state.incr("c", ttl=10) == 1
+
+
+def test_purge_expired(state, clock):
+    state.set("a", 1, ttl=5)
+    state.incr("b", ttl=15)
+    state.set("c", 1)
+    clock[0] += 10
+    assert state.purge_expired() == 1
+    clock[0] += 10
+    assert state.purge_expired() == 1
+    assert state.keys("") == ["c"]
+
+
+def test_shared_mapping_ttl(state, clock):
+    sessions = SharedMapping(state, "session", ttl=10)
+    sessions["short"] = {"user_id": "u1"}
+    sessions.set("long", {"user_id": "u2"}, ttl=30)
+    state.set("other:x", 1)
+    assert sorted(sessions) == ["long", "short"]
+
+    clock[0] += 10
+    assert "short" not in sessions
+    with pytest.raises(KeyError):
+        sessions["short"]
+    with pytest.raises(KeyError):
+        del sessions["short"]
+    assert list(sessions) == ["long"] and len(sessions) == 1
+
+    clock[0] += 20
+    assert sessions.get("long") is None
+    assert len(sessions) == 0
@@ -0,0 +1,163 @@
+import threading
+import time
+
+import pytest
+
+from storage import SQLiteStorage, WriteBehindQueue
+
+
+class FlakyStorage(SQLiteStorage):
+    """Raises from the methods named in fail, and can hold add_arms until released"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.fail = set()
+        self.hold_arms = None
+
+    def _check(self, name):
+        if name in self.fail:
+            raise OSError(f"{name} failed")
+
+    def delete_arms(self, user_id):
+        self._check("delete_arms")
+        super().delete_arms(user_id)
+
+    def add_arms(self, rows):
+        self._check("add_arms")
+        if self.hold_arms is not None:
+            self.hold_arms.wait(5)
+        super().add_arms(rows)
+
+    def save_playlists(self, user_id, playlists):
+        self._check("save_playlists")
+        super().save_playlists(user_id, playlists)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = FlakyStorage(str(tmp_path / "test.db"))
+    yield storage
+    storage.close()
+
+
+def stored_arms(storage, user_id):
+    return {item_id: (reward_sum, count) for item_id, reward_sum, count in storage.load_arms(user_id)}
+
+
+def test_session_row_outlives_its_spotify_token(storage):
+    now = time.time()
+    storage.save_session("s1", {"user_id": "u1", "expires_at": now - 60, "session_expires_at": now + 60})
+    assert storage.purge_expired_sessions() == 0
+    assert list(storage.load_sessions()) == ["s1"]
+
+
+def test_purge_expired_sessions(storage):
+    now = time.time()
+    storage.save_session("old", {"user_id": "u1", "session_expires_at": now - 1})
+    storage.save_session("live", {"user_id": "u2", "session_expires_at": now + 60})
+    assert storage.purge_expired_sessions() == 1
+    assert list(storage.load_sessions()) == ["live"]
+    assert storage.purge_expired_sessions() == 0
+
+
+def test_writes_are_coalesced_per_key(storage):
+    flushed = []
+    queue = WriteBehindQueue(storage, on_flush=flushed.append)
+    for reward in (1.0, 0.5, -0.25):
+        queue.put_arm("u1", "a", reward)
+    queue.put_arm("u2", "a", 1.0)
+    queue.put_playlists("u1", {"5": ["old"]})
+    queue.put_playlists("u1", {"5": ["new"]})
+    assert queue.depth() == 3
+
+    queue.flush()
+    assert queue.flushed_batches == 1
+    assert flushed == [{"u1", "u2"}]
+    assert stored_arms(storage, "u1") == {"a": (1.25, 3)}
+    assert stored_arms(storage, "u2") == {"a": (1.0, 1)}
+    assert storage.load_playlists("u1") == {"5": ["new"]}
+    assert queue.depth() == 0
+
+
+def test_reset_drops_buffered_deltas(storage):
+    queue = WriteBehindQueue(storage)
+    queue.put_arm("u1", "a", 1.0)
+    queue.flush()
+    queue.put_arm("u1", "b", 1.0)
+    queue.reset_arms("u1")
+    queue.put_arm("u1", "c", 0.5)
+    queue.flush()
+    assert stored_arms(storage, "u1") == {"c": (0.5, 1)}
+
+
+def test_flush_user_leaves_other_users_buffered(storage):
+    queue = WriteBehindQueue(storage)
+    queue.put_arm("u1", "a", 1.0)
+    queue.put_arm("u2", "a", 1.0)
+    queue.put_playlists("u2", {"5": []})
+    queue.put_session("s1", {"user_id": "u1", "session_expires_at": time.time() + 60})
+
+    queue.flush_user("u1")
+    assert stored_arms(storage, "u1") == {"a": (1.0, 1)}
+    assert stored_arms(storage, "u2") == {}
+    assert not queue.has_pending("u1")
+    assert queue.has_pending("u2")
+    assert storage.load_sessions() == {}  # sessions and tags wait for the next full flush
+
+    queue.flush()
+    assert stored_arms(storage, "u2") == {"a": (1.0, 1)}
+    assert list(storage.load_sessions()) == ["s1"]
+
+
+def test_failed_batch_is_requeued(storage):
+    queue = WriteBehindQueue(storage)
+    queue.put_arm("u1", "a", 1.0)
+    queue.put_playlists("u1", {"5": ["first"]})
+    queue.put_artist_tags({"Radiohead": ["rock"]})
+    storage.fail = {"add_arms"}
+    with pytest.raises(OSError):
+        queue.flush()
+    assert queue.has_pending("u1")
+
+    # Writes made since the failure win over the requeued ones
+    queue.put_arm("u1", "a", 0.5)
+    queue.put_playlists("u1", {"5": ["second"]})
+    storage.fail = set()
+    queue.flush()
+    assert stored_arms(storage, "u1") == {"a": (1.5, 2)}
+    assert storage.load_playlists("u1") == {"5": ["second"]}
+    assert storage.load_artist_tags(["Radiohead"]) == {"Radiohead": ["rock"]}
+
+
+def test_written_arm_deltas_are_not_requeued(storage):
+    queue = WriteBehindQueue(storage)
+    queue.put_arm("u1", "a", 1.0)
+    queue.put_playlists("u1", {"5": ["x"]})
+    storage.fail = {"save_playlists"}
+    with pytest.raises(OSError):
+        queue.flush()
+    storage.fail = set()
+    queue.flush()
+    assert stored_arms(storage, "u1") == {"a": (1.0, 1)}
+    assert storage.load_playlists("u1") == {"5": ["x"]}
+
+
+def test_flush_user_waits_for_the_batch_holding_its_writes(storage):
+    queue = WriteBehindQueue(storage)
+    queue.put_arm("u1", "a", 1.0)
+    storage.hold_arms = threading.Event()
+    flusher = threading.Thread(target=queue.flush)
+    flusher.start()
+    while not queue._writing:
+        time.sleep(0.001)
+    assert queue.has_pending("u1")
+
+    waiter = threading.Thread(target=queue.flush_user, args=("u1",))
+    waiter.start()
+    waiter.join(0.05)
+    assert waiter.is_alive()
+    storage.hold_arms.set()
+    flusher.join()
+    waiter.join(1)
+    assert not waiter.is_alive()
+    assert stored_arms(storage, "u1") == {"a": (1.0, 1)}
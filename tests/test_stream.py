@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+import main
+
+
+def test_settled_top_ranks_waits_for_unsettled_ranks_ahead():
+    # Rank 0 still in flight: rank 2 is certainly in the top 2, rank 3 is not yet
+    assert main.settled_top_ranks(5, {2: "c", 3: "d"}, {1, 2, 3}, limit=2) == [2]
+    # Rank 0 came back empty: now rank 3 is in too
+    assert main.settled_top_ranks(5, {2: "c", 3: "d"}, {0, 1, 2, 3}, limit=2) == [2, 3]
+    # A found rank ahead pushes the later ones out
+    assert main.settled_top_ranks(5, {0: "a", 2: "c", 3: "d"}, {0, 1, 2, 3}, limit=2) == [0, 2]
+
+
+class RankedAsGiven:
+    def __init__(self):
+        self.remembered = []
+
+    def rank_candidates(self, candidates, limit, remember=True):
+        return candidates[:limit]
+
+    def remember_recommended(self, item_ids):
+        self.remembered.extend(item_ids)
+
+
+class NoPool:
+    def peek(self, *args):
+        return None
+
+    async def get(self, *args, **kwargs):
+        raise AssertionError("the cold path must not wait for the pool")
+
+
+def test_cold_stream_sends_the_top_ranks_found_not_the_fastest(monkeypatch):
+    candidates = [{"id": f"Song {i} - Artist {i}", "name": f"Song {i}", "artist": {"name": f"Artist {i}"}} for i in range(6)]
+    # Lookups finish slowest-first for the best ranks; rank 1 is not on Spotify
+    arrivals = [5, 4, 1, 3, 2, 0]
+
+    async def gather(track_name, artist_name, tag=None):
+        return candidates
+
+    async def resolve(ranked, access_token):
+        for rank in arrivals:
+            yield rank, None if rank == 1 else {"id": f"sp{rank}", "uri": f"spotify:track:sp{rank}"}
+
+    monkeypatch.setattr(main, "candidate_pools", NoPool())
+    monkeypatch.setattr(main, "run_in_background", lambda coroutine: coroutine.close())
+    monkeypatch.setattr(main, "gather_seed_candidates", gather)
+    monkeypatch.setattr(main, "resolve_ranked_as_completed", resolve)
+    recommender = RankedAsGiven()
+    request = main.RecommendRequest(track_name="Seed", artist_name="Seed Artist", num_recommendations=3)
+
+    async def stream():
+        return [json.loads(line) async for line in main.stream_recommendations({"recommender": recommender}, request, "token", "u1")]
+
+    lines = asyncio.run(stream())
+
+    tracks = [message for message in lines if message["type"] == "track"]
+    # Emitted as soon as certain (3 before 2 before 0), but only the best three found
+    assert [message["rank"] for message in tracks] == [3, 2, 0]
+    assert lines[-1] == {"type": "done", "count": 3}
+    assert sorted(recommender.remembered) == ["Song 0 - Artist 0", "Song 2 - Artist 2", "Song 3 - Artist 3"]
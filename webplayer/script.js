@@ -12,6 +12,8 @@ let activeDeviceId = null;
 let playbackUpdateInterval = null;
 let currentDisplayedRecommendations = [];
 let recommendationPool = [];
+// Stream ranks by track id, kept off the track objects (those are sent back as track_info and saved in playlists)
+let streamedRanks = new Map();
 let currentSeedTrackName = '';
 let currentSeedArtistName = '';
 let audioPreview = null;
@@ -518,7 +520,8 @@ async function getRecommendations(trackName, artistName) {
     showLoader(true);
     
     try {
-        const response = await fetch('/recommendations', {
+        // Streamed as newline-delimited JSON: each card is rendered as soon as it arrives
+        const response = await fetch('/recommendations/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
@@ -535,10 +538,38 @@ async function getRecommendations(trackName, artistName) {
             throw new Error(error.detail || 'Failed to get recommendations');
         }
 
-        const data = await response.json();
-        console.log('Parsed data:', data);
-        
-        displayRecommendations(data.recommendations);
+        beginRecommendations();
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        let received = 0;
+
+        const handleLine = (line) => {
+            if (!line.trim()) return;
+            const message = JSON.parse(line);
+            if (message.type === 'track') {
+                addStreamedRecommendation(message.track, message.rank);
+                received++;
+                showLoader(false);  // first card is on screen
+            } else if (message.type === 'error') {
+                throw new Error(message.detail || 'Failed to get recommendations');
+            }
+        };
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffered += decoder.decode(value, { stream: true });
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            lines.forEach(handleLine);
+        }
+        handleLine(buffered + decoder.decode());
+
+        console.log(`Streamed ${received} recommendations`);
+        if (received === 0) {
+            throw new Error('Could not find any recommended tracks on Spotify. Try different search terms.');
+        }
         
     } catch (error) {
         console.error('Error getting recommendations:', error);
@@ -548,6 +579,55 @@ async function getRecommendations(trackName, artistName) {
     }
 }
 
+// Reset the grid before a streamed response starts filling it
+function beginRecommendations() {
+    const resultsContainer = document.getElementById('results');
+    if (resultsContainer) resultsContainer.innerHTML = '';
+    currentDisplayedRecommendations = [];
+    recommendationPool = [];
+    streamedRanks = new Map();
+}
+
+function streamedRank(track) {
+    return streamedRanks.has(track.id) ? streamedRanks.get(track.id) : Number.MAX_SAFE_INTEGER;
+}
+
+// Place one streamed track. Tracks arrive out of rank order, so the grid keeps the 12 best
+// ranked so far: a late card that outranks one on the grid takes its slot, and the displaced
+// card goes back to the front of the pool
+function addStreamedRecommendation(track, rank) {
+    const resultsContainer = document.getElementById('results');
+    if (!resultsContainer) return;
+    streamedRanks.set(track.id, rank);
+    const byRank = (a, b) => streamedRank(a) - streamedRank(b);
+
+    let index = currentDisplayedRecommendations.length;
+    if (index >= 12) {
+        const worst = currentDisplayedRecommendations.reduce((a, b) => (byRank(a, b) >= 0 ? a : b));
+        if (streamedRank(worst) < rank) {
+            recommendationPool.push(track);
+            recommendationPool.sort(byRank);
+            return;
+        }
+        index = currentDisplayedRecommendations.indexOf(worst);
+        const worstElement = Array.from(resultsContainer.children).find(child => Number(child.dataset.rank) === streamedRank(worst));
+        if (worstElement) worstElement.remove();
+        recommendationPool.push(worst);
+        recommendationPool.sort(byRank);
+    }
+    currentDisplayedRecommendations[index] = track;
+
+    const template = document.createElement('template');
+    template.innerHTML = createTrackCard(track, index).trim();
+    const cardElement = template.content.firstElementChild;
+    cardElement.dataset.rank = rank;
+
+    // Insert before the first card ranked below this one
+    const next = Array.from(resultsContainer.children).find(child => Number(child.dataset.rank) > rank);
+    resultsContainer.insertBefore(cardElement, next || null);
+    addTrackCardListeners(cardElement);
+}
+
 function displayRecommendations(tracks) {
     const resultsContainer = document.getElementById('results');
     if (!resultsContainer) return;
@@ -601,9 +681,9 @@ function createTrackCard(track, index) {
     `;
 }
 
-function addTrackCardListeners() {
+function addTrackCardListeners(root = document) {
     // Play track on card click
-    document.querySelectorAll('.card[data-track-uri]').forEach(card => {
+    root.querySelectorAll('.card[data-track-uri]').forEach(card => {
         card.addEventListener('click', (e) => {
             if (e.target.closest('.feedback-btn')) return;
             
@@ -614,7 +694,7 @@ function addTrackCardListeners() {
     });
 
     // Feedback buttons
-    document.querySelectorAll('.feedback-btn').forEach(button => {
+    root.querySelectorAll('.feedback-btn').forEach(button => {
         button.addEventListener('click', (e) => {
             e.stopPropagation();
             const rating = parseInt(e.target.dataset.rating);
@@ -643,7 +723,7 @@ async function sendFeedback(track, rating, cardElement) {
 
         if (!response.ok) throw new Error('Failed to send feedback');
 
-        const newTrack = getNewRecommendationFromPool();
+        const newTrack = await getNewRecommendationFromPool();
         if (newTrack) {
             replaceTrackCard(cardElement, newTrack);
         } else {
@@ -659,8 +739,41 @@ async function sendFeedback(track, rating, cardElement) {
     }
 }
 
-function getNewRecommendationFromPool() {
-    return recommendationPool.length > 0 ? recommendationPool.shift() : null;
+async function getNewRecommendationFromPool() {
+    if (recommendationPool.length === 0) {
+        await fetchNextRecommendations();
+    }
+    const track = recommendationPool.length > 0 ? recommendationPool.shift() : null;
+    if (recommendationPool.length < 2) {
+        fetchNextRecommendations();  // top up in the background for the next rating
+    }
+    return track;
+}
+
+// The server ranks the next batch right after each feedback, so this is a cheap call
+let nextRecommendationsRequest = null;
+function fetchNextRecommendations() {
+    if (nextRecommendationsRequest) return nextRecommendationsRequest;
+
+    const excludeIds = [...currentDisplayedRecommendations, ...recommendationPool].map(track => track.id);
+    nextRecommendationsRequest = fetch('/recommendations/next', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            seed_track_name: currentSeedTrackName,
+            seed_artist_name: currentSeedArtistName,
+            count: 4,
+            exclude_ids: excludeIds
+        })
+    })
+        .then(response => response.ok ? response.json() : { recommendations: [] })
+        .then(data => {
+            const known = new Set([...currentDisplayedRecommendations, ...recommendationPool].map(track => track.id));
+            recommendationPool.push(...data.recommendations.filter(track => !known.has(track.id)));
+        })
+        .catch(error => console.error('Error fetching next recommendations:', error))
+        .finally(() => { nextRecommendationsRequest = null; });
+    return nextRecommendationsRequest;
 }
 
 function replaceTrackCard(cardElement, newTrack) {